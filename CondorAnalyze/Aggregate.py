@@ -0,0 +1,237 @@
+#!/usr/bin/python
+
+#
+# Partial aggregates of the analysis of one submit host (--summarize), to
+# be merged with those of the other hosts into one report (--merge).
+#
+# A partial holds everything the report needs and nothing more: the
+# Metrics totals of every transition (also per site), the evictions per
+# site, the quantile sketches of the job durations, the time span and, for
+# every site, the cells its running jobs were folded into (SiteCells, see
+# Occupancy.py).  The whole partial is written as a compressed numpy
+# archive: the cell columns as plain arrays and everything else as a JSON
+# header.  A partial comes from
+# another host, so it is only ever read as data (no pickles), and anything
+# else is rejected with an AggregateError.
+#
+
+import json
+import zipfile
+
+import numpy
+
+from Metrics import Metrics
+from Quantiles import QuantileSketch, Distributions
+
+
+# Bump when the layout of a partial changes
+aggregate_version = 5
+
+# Arrays of the cells of a site, in SiteCells.Cells order
+cell_columns = ('columns', 'ups', 'downs', 'peaks')
+
+
+class AggregateError(Exception):
+    """
+    A file is not a partial aggregate this version can read.
+    """
+    pass
+
+
+def PairItems(totals):
+    """
+    Turn {(eventa, eventb): value} into a [[eventa, eventb, value]] list.
+    """
+    return [[pair[0], pair[1], value] for pair, value in totals.items()]
+
+
+def ItemPairs(items):
+    """
+    Inverse of PairItems.
+    """
+    return dict([((eventa, eventb), value) for (eventa, eventb, value) in items])
+
+
+def Text(value):
+    """
+    Return a string read from JSON as the str it was written from.
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def EncodeMetrics(metrics):
+    """
+    Return the Metrics 'metrics' as a JSON compatible dictionary.
+    """
+    data = {'evict_event': metrics.evict_event,
+            'pair_time': PairItems(metrics.pair_time),
+            'last_pair_time': PairItems(metrics.last_pair_time),
+            'pair_occurances': PairItems(metrics.pair_occurances),
+            'occurances': metrics.occurances.items(),
+            'evict_places': metrics.evict_places.items(),
+            'num_jobs': metrics.num_jobs,
+            'sites': None}
+    sites = metrics.sites
+    if sites is not None:
+        data['sites'] = {'names': sites.names,
+                         'pair_time': sites.pair_time,
+                         'last_pair_time': sites.last_pair_time,
+                         'pair_occurances': sites.pair_occurances,
+                         'occurances': sites.occurances,
+                         'num_jobs': sites.num_jobs}
+    return data
+
+
+def DecodeMetrics(data, metrics=None):
+    """
+    Return the Metrics of an EncodeMetrics dictionary, read into the empty
+    'metrics' if given (a StreamingMetrics).
+    """
+    if metrics is None:
+        metrics = Metrics(data['evict_event'], breakdown=data['sites'] is not None)
+    metrics.pair_time = ItemPairs(data['pair_time'])
+    metrics.last_pair_time = ItemPairs(data['last_pair_time'])
+    metrics.pair_occurances = ItemPairs(data['pair_occurances'])
+    metrics.occurances = dict(data['occurances'])
+    metrics.evict_places = dict([(Text(site), count) for (site, count) in data['evict_places']])
+    metrics.num_jobs = data['num_jobs']
+    if data['sites'] is not None:
+        sites = metrics.sites
+        sites.names = [Text(site) for site in data['sites']['names']]
+        sites.ids = dict([(site, site_id) for site_id, site in enumerate(sites.names)])
+        for name in ('pair_time', 'last_pair_time', 'pair_occurances', 'occurances', 'num_jobs'):
+            setattr(sites, name, list(data['sites'][name]))
+    return metrics
+
+
+def EncodeSketch(sketch):
+    """
+    Return the QuantileSketch 'sketch' as a JSON compatible dictionary.
+    """
+    return {'accuracy': sketch.accuracy,
+            'buckets': sketch.buckets.items(),
+            'zeros': sketch.zeros,
+            'count': sketch.count,
+            'max': sketch.max}
+
+
+def DecodeSketch(data):
+    """
+    Return the QuantileSketch of an EncodeSketch dictionary.
+    """
+    sketch = QuantileSketch(data['accuracy'])
+    sketch.buckets = dict(data['buckets'])
+    sketch.zeros = data['zeros']
+    sketch.count = data['count']
+    sketch.max = data['max']
+    return sketch
+
+
+def EncodeDistributions(distributions):
+    """
+    Return the Distributions 'distributions' as a JSON compatible
+    dictionary.
+    """
+    return {'metrics': [[name, [list(pair) for pair in pairs]] for (name, pairs) in distributions.metrics],
+            'accuracy': distributions.accuracy,
+            'jobs': [[name, EncodeSketch(sketch)] for name, sketch in distributions.jobs.items()],
+            'sites': [[name, site, EncodeSketch(sketch)] for (name, site), sketch in distributions.sites.items()]}
+
+
+def DecodeDistributions(data):
+    """
+    Return the Distributions of an EncodeDistributions dictionary.
+    """
+    metrics = [(Text(name), [tuple(pair) for pair in pairs]) for (name, pairs) in data['metrics']]
+    distributions = Distributions(metrics, data['accuracy'])
+    for name, sketch in data['jobs']:
+        distributions.jobs[Text(name)] = DecodeSketch(sketch)
+    for name, site, sketch in data['sites']:
+        distributions.sites[(Text(name), Text(site))] = DecodeSketch(sketch)
+    return distributions
+
+
+def MakeAggregate(metrics, distributions, cells, min_time, max_time):
+    """
+    Return the partial aggregate of a host.
+
+    Arguments:
+    metrics - Metrics totals of all the jobs of the host
+    distributions - Distributions of the durations of all the jobs
+    cells - SiteCells of the running jobs of the sites (Analyzer.cells)
+    min_time, max_time - span of the events of the host
+    """
+    totals = Metrics(metrics.evict_event)
+    totals.Merge(metrics)
+    sites = {}
+    for site_id, site in enumerate(cells.names):
+        sites[site] = (cells.Cells(site_id), cells.last[site_id])
+    return {'version': aggregate_version,
+            'metrics': totals,
+            'distributions': distributions,
+            'resolution': cells.resolution,
+            'sites': sites,
+            'min_time': min_time,
+            'max_time': max_time}
+
+
+def WriteAggregate(path, aggregate):
+    """
+    Write a partial aggregate to the file 'path'.
+    """
+    site_names = aggregate['sites'].keys()
+    header = {'version': aggregate['version'],
+              'metrics': EncodeMetrics(aggregate['metrics']),
+              'distributions': EncodeDistributions(aggregate['distributions']),
+              'resolution': aggregate['resolution'],
+              'sites': site_names,
+              'last': [aggregate['sites'][site][1] for site in site_names],
+              'min_time': aggregate['min_time'],
+              'max_time': aggregate['max_time']}
+    arrays = {'header': numpy.frombuffer(json.dumps(header), dtype=numpy.uint8)}
+    for index, site in enumerate(site_names):
+        for name, column in zip(cell_columns, aggregate['sites'][site][0]):
+            arrays['%s%i' % (name, index)] = column
+    f = open(path, 'wb')
+    try:
+        numpy.savez_compressed(f, **arrays)
+    finally:
+        f.close()
+
+
+def ReadAggregate(path):
+    """
+    Read a partial aggregate written by WriteAggregate.
+    """
+    f = open(path, 'rb')
+    try:
+        try:
+            archive = numpy.load(f, allow_pickle=False)
+            header = json.loads(archive['header'].tostring())
+        except (IOError, ValueError, KeyError, zipfile.BadZipfile):
+            raise AggregateError("%s is not a partial aggregate" % path)
+        if type(header) is not dict:
+            raise AggregateError("%s is not a partial aggregate" % path)
+        if header.get('version') != aggregate_version:
+            raise AggregateError("%s is a partial aggregate of version %s, only version %i can be read" % (path, header.get('version'), aggregate_version))
+        try:
+            sites = {}
+            for index, site in enumerate(header['sites']):
+                cells = tuple([archive['%s%i' % (name, index)].astype(numpy.int64) for name in cell_columns])
+                if len(set([len(column) for column in cells])) != 1:
+                    raise ValueError("Site columns of different lengths")
+                sites[Text(site)] = (cells, int(header['last'][index]))
+            aggregate = {'version': header['version'],
+                         'metrics': DecodeMetrics(header['metrics']),
+                         'distributions': DecodeDistributions(header['distributions']),
+                         'resolution': int(header['resolution']),
+                         'sites': sites,
+                         'min_time': header['min_time'],
+                         'max_time': header['max_time']}
+        except (ValueError, KeyError, TypeError), e:
+            raise AggregateError("%s is a damaged partial aggregate: %s" % (path, e))
+    finally:
+        f.close()
+    return aggregate
@@ -0,0 +1,183 @@
+#!/usr/bin/python
+
+#
+# Scaling benchmark of the analysis on synthetic userlogs.
+#
+# For every log size a log is written with GenerateLog (or reused from the
+# work directory), then parsed, summarized and reported in a fresh worker
+# process, so the peak memory of each size is measured on its own.  The
+# stages are timed by a Profiler: the wall time of every stage, how much it
+# raised the peak memory, the events parsed per second and the peak
+# resident memory of the worker are printed as a table, or as JSON.
+#
+
+import os
+import sys
+import optparse
+import multiprocessing
+import tempfile
+import json
+from time import time
+
+from GenerateLog import LogGenerator
+from Profile import Profiler, PeakMemory
+
+
+# Sizes (in events) benchmarked by default, up to production logs
+default_sizes = [1000, 10000, 100000, 1000000, 10000000]
+
+# Stages measured for every size, in order
+stages = ['parse', 'summarize', 'totals', 'report']
+
+
+def LogPath(directory, events, seed, reconnect_rate=0.1):
+    """
+    Return the path of the synthetic log of 'events' events in 'directory'.
+    """
+    return os.path.join(directory, "synthetic-%i-%i-%g.log" % (events, seed, reconnect_rate))
+
+
+def MakeLog(directory, events, seed, reconnect_rate=0.1):
+    """
+    Write the synthetic log of 'events' events, with 'reconnect_rate' of
+    the evictions failed reconnects, unless it already exists, and return
+    its path.
+    """
+    path = LogPath(directory, events, seed, reconnect_rate)
+    if not os.path.exists(path):
+        partial = path + ".partial"
+        out = open(partial, 'w')
+        try:
+            LogGenerator(reconnect_rate=reconnect_rate, seed=seed).Write(out, events=events)
+        finally:
+            out.close()
+        os.rename(partial, path)
+    return path
+
+
+def Measure(task):
+    """
+    Worker entry point: run every stage over one log and return its
+    measurements as a dictionary.
+    """
+    (path, events, columnar, streaming) = task
+    from ParseLog import Analyzer
+    profiler = Profiler()
+    analyzer = Analyzer(columnar, streaming)
+
+    profiler.Start('parse')
+    analyzer.ParseFile(path)
+    profiler.Stop('parse', analyzer.num_events, os.path.getsize(path))
+
+    profiler.Start('summarize')
+    analyzer.SummarizeSites(60*5)
+    profiler.Stop('summarize')
+
+    profiler.Start('totals')
+    analyzer.GetTotalRemoteQueueTime()
+    analyzer.GetTotalMatchingTime()
+    analyzer.GetTotalQueueTime()
+    analyzer.GetTotalRunningTime()
+    analyzer.GetTotalWastedTime()
+    analyzer.GetTotalGoodRunningTime()
+    analyzer.GetTotalPreemptions()
+    analyzer.GetEvictPlaces()
+    profiler.Stop('totals')
+
+    directory = tempfile.mkdtemp(prefix="benchmark")
+    out = open(os.devnull, 'w')
+    try:
+        profiler.Start('report')
+        analyzer.Report(out, os.path.join(directory, "sites.png"), os.path.join(directory, "SubHist.png"))
+        profiler.Stop('report')
+    finally:
+        out.close()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    times = dict([(stage['stage'], stage['wall']) for stage in profiler.stages])
+    memory = dict([(stage['stage'], stage['peak_memory_growth']) for stage in profiler.stages])
+    # The throughput is of the events parsed, not of the size asked for:
+    # the holds and releases in the log are skipped by the parser
+    return {'events': events,
+            'parsed_events': analyzer.num_events,
+            'bytes': os.path.getsize(path),
+            'jobs': len(analyzer.jobs),
+            'times': times,
+            'peak_memory_growth': memory,
+            'events_per_second': analyzer.num_events / max(times['parse'], 1e-9),
+            'peak_memory': PeakMemory()}
+
+
+def Run(sizes, directory, seed=1, columnar=False, streaming=False, reconnect_rate=0.1):
+    """
+    Benchmark every size in 'sizes', each in its own worker process, and
+    return the list of Measure results.
+    """
+    results = []
+    for events in sizes:
+        path = MakeLog(directory, events, seed, reconnect_rate)
+        pool = multiprocessing.Pool(1)
+        try:
+            results.append(pool.apply(Measure, [(path, events, columnar, streaming)]))
+        finally:
+            pool.close()
+            pool.join()
+    return results
+
+
+def PrintTable(results, out=sys.stdout):
+    """
+    Print the Run results as a table, times in seconds, then how many MB
+    each stage raised the peak memory by, and the peak memory.
+    """
+    print >>out, "%10s %12s" % ("events", "parsed/s") + "".join(["%11s" % stage for stage in stages]) + \
+                 "".join(["%13s" % ("%s MB" % stage) for stage in stages]) + "%11s" % "peak MB"
+    for result in results:
+        line = "%10i %12.0f" % (result['events'], result['events_per_second'])
+        line += "".join(["%11.3f" % result['times'][stage] for stage in stages])
+        line += "".join(["%13.1f" % (result['peak_memory_growth'][stage] / (1024.0 * 1024.0)) for stage in stages])
+        line += "%11.1f" % (result['peak_memory'] / (1024.0 * 1024.0))
+        print >>out, line
+
+
+def AddOptions(parser):
+    parser.add_option('--sizes', help="Comma separated numbers of events to benchmark (default %s)" % ",".join(map(str, default_sizes)), default=",".join(map(str, default_sizes)), dest="sizes")
+    parser.add_option('--dir', help="Directory the synthetic logs are written to and reused from (default a temporary one)", default=None, dest="directory")
+    parser.add_option('--seed', help="Seed of the synthetic logs (default 1)", default=1, dest="seed", type="int")
+    parser.add_option('--reconnect-rate', help="Chance that an eviction in the synthetic logs is a failed reconnect (default 0.1)", default=0.1, dest="reconnect_rate", type="float")
+    parser.add_option('-c', '--columnar', help="Benchmark the columnar backend", default=False, dest="columnar", action="store_true")
+    parser.add_option('-s', '--streaming', help="Benchmark the streaming backend", default=False, dest="streaming", action="store_true")
+    parser.add_option('--json', help="Print the results as JSON", default=False, dest="json", action="store_true")
+
+
+def main():
+    parser = optparse.OptionParser()
+    AddOptions(parser)
+    (opts, args) = parser.parse_args()
+
+    sizes = [int(size) for size in opts.sizes.split(',')]
+    directory = opts.directory
+    temporary = directory is None
+    if temporary:
+        directory = tempfile.mkdtemp(prefix="benchmark")
+    elif not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    try:
+        results = Run(sizes, directory, opts.seed, opts.columnar, opts.streaming, opts.reconnect_rate)
+    finally:
+        if temporary:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    if opts.json:
+        print json.dumps(results, indent=2, sort_keys=True)
+    else:
+        PrintTable(results)
+
+
+if __name__ == "__main__":
+    main()
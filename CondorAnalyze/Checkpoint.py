@@ -0,0 +1,142 @@
+#!/usr/bin/python
+
+#
+# Checkpoints of a streaming Analyzer following growing logs (--follow,
+# --serve), so a restarted follower continues where it stopped instead of
+# parsing every log again from the start.
+#
+# A checkpoint holds, for every log, the offset it was read up to and a
+# Fingerprint of the log there (see EventCache), and everything the
+# streaming Analyzer keeps: the StreamingMetrics totals, the state of every
+# active job, the quantile sketches, the site cells and the time span.  Its
+# size grows with the active jobs and the sites, not with the events read.
+# It is written like a partial aggregate: a numpy archive of the cell
+# columns with everything else in a JSON header, only ever read as data.
+#
+
+import os
+import json
+import zipfile
+
+import numpy
+
+from Metrics import JobState, StreamingMetrics
+from Aggregate import EncodeMetrics, DecodeMetrics, EncodeDistributions, DecodeDistributions, Text, cell_columns
+
+
+# Bump when the layout of a checkpoint changes
+checkpoint_version = 1
+
+
+class CheckpointError(Exception):
+    """
+    A file is not a checkpoint this version can resume from.
+    """
+    pass
+
+
+def EncodeJob(job):
+    """
+    Return the StreamingJob 'job' as a JSON compatible list.
+    """
+    state = job.state
+    pending = None
+    if state.pending is not None:
+        (pair, slot) = state.pending
+        pending = [pair[0], pair[1], slot]
+    last = [[pair[0], pair[1], delta, slot] for pair, (delta, slot) in state.last.items()]
+    totals = []
+    for key, duration in job.totals.items():
+        if type(key) is tuple:
+            totals.append([key[0], key[1], duration])
+        else:
+            totals.append([key, None, duration])
+    return [job.jobid, job.last_site, state.event, state.time, state.site, pending, last, totals]
+
+
+def DecodeJob(job, data):
+    """
+    Restore the StreamingJob 'job' from an EncodeJob list.
+    """
+    (jobid, last_site, event, time, site, pending, last, totals) = data
+    job.last_site = Text(last_site)
+    state = job.state = JobState()
+    state.event = event
+    state.time = time
+    state.site = site
+    if pending is not None:
+        state.pending = ((pending[0], pending[1]), pending[2])
+    state.last = dict([((eventa, eventb), (delta, slot)) for (eventa, eventb, delta, slot) in last])
+    job.totals = {}
+    for (name, site, duration) in totals:
+        if site is None:
+            job.totals[Text(name)] = duration
+        else:
+            job.totals[(Text(name), Text(site))] = duration
+
+
+def WriteCheckpoint(path, checkpoint):
+    """
+    Write the checkpoint 'checkpoint' (Analyzer.Checkpoint) to the file
+    'path', replacing it only once the new one is complete.
+    """
+    cells = checkpoint['cells']
+    header = {'version': checkpoint_version,
+              'logs': checkpoint['logs'],
+              'window': checkpoint['window'],
+              'min_time': checkpoint['min_time'],
+              'max_time': checkpoint['max_time'],
+              'num_events': checkpoint['num_events'],
+              'stream': EncodeMetrics(checkpoint['stream']),
+              'jobs': [EncodeJob(job) for job in checkpoint['jobs']],
+              'distributions': EncodeDistributions(checkpoint['distributions']),
+              'resolution': cells.resolution,
+              'sites': cells.names,
+              'last': cells.last}
+    arrays = {'header': numpy.frombuffer(json.dumps(header), dtype=numpy.uint8)}
+    for site_id in range(len(cells.names)):
+        for name, column in zip(cell_columns, cells.Cells(site_id)):
+            arrays['%s%i' % (name, site_id)] = column
+    temp_path = "%s.%i.tmp" % (path, os.getpid())
+    f = open(temp_path, 'wb')
+    try:
+        numpy.savez(f, **arrays)
+    finally:
+        f.close()
+    os.rename(temp_path, path)
+
+
+def ReadCheckpoint(path):
+    """
+    Read a checkpoint written by WriteCheckpoint.  Returns a dictionary of
+    the header, with 'stream' (a StreamingMetrics) and 'distributions'
+    decoded, the jobs as EncodeJob lists and the cells of every site in
+    'cells' as site -> ((columns, ups, downs, peaks), last).
+    """
+    f = open(path, 'rb')
+    try:
+        try:
+            archive = numpy.load(f, allow_pickle=False)
+            header = json.loads(archive['header'].tostring())
+        except (IOError, ValueError, KeyError, zipfile.BadZipfile):
+            raise CheckpointError("%s is not a checkpoint" % path)
+        if type(header) is not dict:
+            raise CheckpointError("%s is not a checkpoint" % path)
+        if header.get('version') != checkpoint_version:
+            raise CheckpointError("%s is a checkpoint of version %s, only version %i can be read" % (path, header.get('version'), checkpoint_version))
+        try:
+            cells = {}
+            for index, site in enumerate(header['sites']):
+                columns = tuple([archive['%s%i' % (name, index)].astype(numpy.int64) for name in cell_columns])
+                if len(set([len(column) for column in columns])) != 1:
+                    raise ValueError("Site columns of different lengths")
+                cells[Text(site)] = (columns, int(header['last'][index]))
+            header['cells'] = cells
+            header['stream'] = DecodeMetrics(header['stream'], StreamingMetrics(header['stream']['evict_event']))
+            header['distributions'] = DecodeDistributions(header['distributions'])
+            header['logs'] = [(Text(log), offset, Text(fingerprint)) for (log, offset, fingerprint) in header['logs']]
+        except (ValueError, KeyError, TypeError), e:
+            raise CheckpointError("%s is a damaged checkpoint: %s" % (path, e))
+    finally:
+        f.close()
+    return header
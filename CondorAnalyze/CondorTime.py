@@ -0,0 +1,128 @@
+#!/usr/bin/python
+
+#
+# Conversion of condor EventTime stamps to seconds since the unix epoch.
+#
+# The ClassAd userlog writes every EventTime in the same fixed width layout,
+# "2011-06-14T02:29:31" (quotes included).  strptime + mktime for every event
+# is slow, so the local time of midnight is computed once for each date (the
+# UTC offset is only looked up once per day) and the time of day added to it.
+#
+
+import re
+from time import strptime, mktime
+
+
+minute_layout = re.compile(r'"(\d\d\d\d-\d\d-\d\d)T([01]\d|2[0-3]):([0-5]\d):\Z')
+
+# "YYYY-MM-DD" -> epoch of local midnight, None when the UTC offset
+# changes during that day (DST switch)
+day_start = {}
+
+# '"YYYY-MM-DDTHH:MM:' -> epoch of the start of that minute
+minute_start = {}
+
+# '29"' -> 29, the seconds and closing quote of a stamp
+second_value = dict(('%02d"' % second, second) for second in range(62))
+
+
+def DayStart(date):
+    """
+    Return the epoch of local midnight of 'date' ("YYYY-MM-DD").
+
+    None is returned (and cached) for days where the local UTC offset changes,
+    the time of those days has to go through mktime.
+    """
+    try:
+        return day_start[date]
+    except KeyError:
+        pass
+    t = strptime(date, "%Y-%m-%d")
+    start = int(mktime(t))
+    end = int(mktime(t[:3] + (23, 59, 59) + t[6:8] + (-1,)))
+    if end - start != 86399:
+        start = None
+    day_start[date] = start
+    return start
+
+
+def MinuteStart(prefix):
+    """
+    Return the epoch of the minute in 'prefix' ('"YYYY-MM-DDTHH:MM:'), or
+    None if it is not a well formed stamp.
+    """
+    match = minute_layout.match(prefix)
+    if not match:
+        return None
+    date, hour, minute = match.groups()
+    start = DayStart(date)
+    if start is None:
+        # The offset changes sometime today, let mktime sort it out
+        start = int(mktime(strptime(prefix[1:] + "00", "%Y-%m-%dT%H:%M:%S")))
+    else:
+        start += int(hour) * 3600 + int(minute) * 60
+    minute_start[prefix] = start
+    return start
+
+
+def SlowEpochTime(ts):
+    """
+    Convert 'ts' the way getTime always did, strptime followed by mktime.
+    """
+    t = strptime(ts, "\"%Y-%m-%dT%H:%M:%S\"")
+    return int(mktime(t))
+
+
+def EpochTime(ts):
+    """
+    Get a condor timestamp, and translate to seconds since unix epoch.
+
+    Arguments:
+    ts - EventTime value, including the quotes: "2011-06-14T02:29:31"
+
+    Returns the same integer as int(mktime(strptime(ts, ...))), and raises
+    the same ValueError for a malformed stamp.
+    """
+    try:
+        return minute_start[ts[:18]] + second_value[ts[18:]]
+    except KeyError:
+        pass
+    if ts[18:] in second_value:
+        start = MinuteStart(ts[:18])
+        if start is not None:
+            return start + second_value[ts[18:]]
+    return SlowEpochTime(ts)
+
+
+def ClassicEpochTime(year, month, day, clock):
+    """
+    Translate the date and "HH:MM:SS" time of day of a classic format event
+    to seconds since the unix epoch.
+    """
+    date = "%04i-%02i-%02i" % (year, month, day)
+    start = DayStart(date)
+    if start is None:
+        return int(mktime(strptime(date + " " + clock, "%Y-%m-%d %H:%M:%S")))
+    hour, minute, second = clock.split(':')
+    return start + int(hour) * 3600 + int(minute) * 60 + int(second)
+
+
+# Layouts ParseTime accepts
+time_layouts = ["%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]
+
+
+def ParseTime(text):
+    """
+    Translate a local time given on the command line ("2011-06-14 02:00",
+    "2011-06-14T02:29:31", "2011-06-14" or seconds since epoch) to seconds
+    since the unix epoch.  Raises ValueError for anything else.
+    """
+    if text.isdigit():
+        return int(text)
+    for layout in time_layouts:
+        try:
+            return int(mktime(strptime(text, layout)))
+        except ValueError:
+            pass
+    raise ValueError("Unknown time %s, use YYYY-MM-DD HH:MM[:SS]" % text)
+
@@ -0,0 +1,326 @@
+#!/usr/bin/python
+
+#
+# Persistent cache of the decoded events of userlogs.
+#
+# Tokenizing a userlog and converting its timestamps is most of the time of
+# a run, and the same (often still growing) logs are analyzed again and
+# again.  The events DecodeEvent returns are saved in a cache file as packed
+# columns: int8 type, int64 epoch time, int32 job and int32 site, with the
+# strings interned in tables.  The cache is keyed by the path, size and
+# mtime of the log plus a fingerprint of its content, and remembers the byte
+# offset it parsed up to, so a log that only grew has just its new events
+# parsed.
+#
+# A cache directory may be shared ($CONDOR_LOG_CACHE), so a cache file is
+# only ever read as data: a numpy archive of the columns with everything
+# else in a JSON header, loaded without pickles.
+#
+
+import os
+import sys
+import json
+import hashlib
+from array import array
+from itertools import izip
+
+import numpy
+
+from UserLogReader import LogTail, IsCompressed, decoded_attributes
+from Aggregate import Text
+
+
+# Bump when the layout of a cache file changes
+cache_version = 2
+
+# The columns of a cache file, as named in the archive
+cache_columns = ('type', 'time', 'job', 'site')
+
+# Bytes of the log hashed at the start, and just before the parsed offset
+fingerprint_size = 64 * 1024
+
+
+def Fingerprint(file, offset):
+    """
+    Return a hash of the first bytes of 'file' and of the bytes just before
+    'offset', enough to tell whether the part already parsed was replaced.
+    """
+    digest = hashlib.md5()
+    f = open(file, 'rb')
+    try:
+        digest.update(f.read(min(fingerprint_size, offset)))
+        f.seek(max(0, offset - fingerprint_size))
+        digest.update(f.read(offset - f.tell()))
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+
+class CachedLog:
+    """
+    The decoded events of one log, and what they were decoded from.
+
+    Attributes:
+    path - absolute path of the log
+    size, mtime - size and modification time of the log when last parsed
+    offset - byte offset just after the last complete event parsed
+    fingerprint - Fingerprint of the log at 'offset'
+    """
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.mtime = 0
+        self.offset = 0
+        self.fingerprint = None
+
+        self.type = array('b')
+        self.time = array('l')
+        self.job = array('i')
+        self.site = array('i')
+
+        self.types = []
+        self.jobids = []
+        self.sites = []
+        self.type_ids = {}
+        self.job_ids = {}
+        self.site_ids = {}
+
+    def Intern(self, table, ids, value):
+        """
+        Return the index of 'value' in 'table' (whose index is 'ids'),
+        adding it if needed.
+        """
+        try:
+            return ids[value]
+        except KeyError:
+            ids[value] = len(table)
+            table.append(value)
+            return ids[value]
+
+    def AddEvent(self, mytype, time, jobid, site):
+        """
+        Append one event, as returned by DecodeEvent.
+        """
+        self.type.append(self.Intern(self.types, self.type_ids, mytype))
+        self.time.append(time)
+        self.job.append(self.Intern(self.jobids, self.job_ids, jobid))
+        if site is None:
+            self.site.append(-1)
+        else:
+            self.site.append(self.Intern(self.sites, self.site_ids, site))
+
+    def Events(self):
+        """
+        Yield every event as the (MyType, time, jobid, site) of DecodeEvent.
+        """
+        types = self.types
+        jobids = self.jobids
+        sites = self.sites
+        for (mytype, time, job, site) in izip(self.type, self.time, self.job, self.site):
+            if site < 0:
+                yield (types[mytype], time, jobids[job], None)
+            else:
+                yield (types[mytype], time, jobids[job], sites[site])
+
+    def Dump(self, f):
+        """
+        Write the cache to the open file 'f'.
+        """
+        header = {'version': cache_version,
+                  'path': self.path,
+                  'size': self.size,
+                  'mtime': self.mtime,
+                  'offset': self.offset,
+                  'fingerprint': self.fingerprint,
+                  'types': self.types,
+                  'jobids': self.jobids,
+                  'sites': self.sites}
+        arrays = {'header': numpy.frombuffer(json.dumps(header), dtype=numpy.uint8)}
+        for name in cache_columns:
+            column = getattr(self, name)
+            dtype = "i%i" % column.itemsize
+            if len(column):
+                arrays[name] = numpy.frombuffer(column, dtype=dtype)
+            else:
+                arrays[name] = numpy.zeros(0, dtype=dtype)
+        numpy.savez(f, **arrays)
+
+    def Load(self, f):
+        """
+        Read a cache written by Dump from the open file 'f'.  Returns False
+        if it is not a cache of this log in the current layout.
+        """
+        archive = numpy.load(f, allow_pickle=False)
+        header = json.loads(archive['header'].tostring())
+        if (type(header) is not dict) or (header.get('version') != cache_version) or (Text(header.get('path')) != self.path):
+            return False
+        for key in ('size', 'mtime', 'offset'):
+            setattr(self, key, header[key])
+        self.fingerprint = Text(header['fingerprint'])
+        for key in ('types', 'jobids', 'sites'):
+            setattr(self, key, [Text(value) for value in header[key]])
+        lengths = []
+        for name in cache_columns:
+            column = array(getattr(self, name).typecode)
+            column.fromstring(archive[name].astype("i%i" % column.itemsize).tostring())
+            setattr(self, name, column)
+            lengths.append(len(column))
+        if len(set(lengths)) != 1:
+            return False
+        for (table, ids) in ((self.types, self.type_ids), (self.jobids, self.job_ids), (self.sites, self.site_ids)):
+            for index, value in enumerate(table):
+                ids[value] = index
+        return True
+
+
+class EventCache:
+    """
+    Store of CachedLog files, either next to each log or in one directory.
+    """
+    def __init__(self, directory=None, max_size=1024 * 1024 * 1024):
+        """Initializer
+
+        Arguments:
+        directory - directory holding the cache files, None to keep the
+                    cache of a log in "<log>.evcache" next to it
+        max_size - with a directory, the least recently used cache files
+                   are removed when they add up to more bytes than this
+
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+    def CachePath(self, path):
+        """
+        Return the cache file of the log at absolute 'path'.
+        """
+        if self.directory is None:
+            return path + ".evcache"
+        return os.path.join(self.directory, hashlib.md5(path).hexdigest() + ".evcache")
+
+    def CheckpointPath(self, files):
+        """
+        Return the Checkpoint file of a follower of the logs 'files', next
+        to the cache files of the logs.
+        """
+        paths = [os.path.abspath(file) for file in files]
+        if self.directory is None:
+            return paths[0] + ".follow"
+        return os.path.join(self.directory, hashlib.md5("\n".join(paths)).hexdigest() + ".follow")
+
+    def Open(self, path):
+        """
+        Return the CachedLog of the log at absolute 'path', empty if there is
+        no usable cache file.
+        """
+        cached = CachedLog(path)
+        try:
+            f = open(self.CachePath(path), 'rb')
+        except IOError:
+            return cached
+        try:
+            try:
+                if cached.Load(f):
+                    return cached
+            except Exception:
+                # Truncated or otherwise unreadable, parse again
+                pass
+        finally:
+            f.close()
+        return CachedLog(path)
+
+    def Events(self, file):
+        """
+        Return the decoded events of 'file', an iterator of the (MyType,
+        time, jobid, site) of DecodeEvent, from the cache where possible.
+
+        Only the events after the cached offset are parsed when the log grew
+        and its already parsed part is unchanged, otherwise (and always for a
+        compressed log) the whole log is parsed.  The cache is saved again
+        whenever something was parsed.
+        """
+        path = os.path.abspath(file)
+        cached = self.Open(path)
+        stat = os.stat(path)
+        if cached.fingerprint is not None:
+            if (stat.st_size < cached.offset) or (Fingerprint(path, cached.offset) != cached.fingerprint):
+                cached = CachedLog(path)
+
+        if (cached.fingerprint is not None) and (stat.st_size == cached.size) and (stat.st_mtime == cached.mtime):
+            self.Touch(path)
+            return cached.Events()
+        if IsCompressed(path):
+            # A compressed log can not be read from an offset
+            cached = CachedLog(path)
+
+        tail = LogTail(path, cached.offset, decoded_attributes)
+        for decoded in tail.ReadDecoded():
+            cached.AddEvent(*decoded)
+        cached.offset = tail.offset
+        cached.size = stat.st_size
+        cached.mtime = stat.st_mtime
+        cached.fingerprint = Fingerprint(path, cached.offset)
+        self.Save(cached)
+        return cached.Events()
+
+    def Touch(self, path):
+        """
+        Mark the cache of 'path' as recently used.
+        """
+        try:
+            os.utime(self.CachePath(path), None)
+        except OSError:
+            pass
+
+    def Save(self, cached):
+        """
+        Write 'cached' to its cache file, and keep the cache directory under
+        max_size.  A cache that can not be written is only a warning.
+        """
+        cache_path = self.CachePath(cached.path)
+        temp_path = "%s.%i.tmp" % (cache_path, os.getpid())
+        try:
+            if (self.directory is not None) and not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            f = open(temp_path, 'wb')
+            try:
+                cached.Dump(f)
+            finally:
+                f.close()
+            os.rename(temp_path, cache_path)
+        except (IOError, OSError), e:
+            sys.stderr.write("Unable to write the event cache %s: %s\n" % (cache_path, e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        if self.directory is not None:
+            self.Evict(cache_path)
+
+    def Evict(self, keep=None):
+        """
+        Remove the least recently used cache files of the directory until
+        they add up to at most max_size bytes, 'keep' is never removed.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".evcache"):
+                continue
+            cache_path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(cache_path)
+            except OSError:
+                continue
+            entries.append( (stat.st_mtime, stat.st_size, cache_path) )
+            total += stat.st_size
+        entries.sort()
+        for (mtime, size, cache_path) in entries:
+            if total <= self.max_size:
+                break
+            if cache_path == keep:
+                continue
+            try:
+                os.remove(cache_path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,362 @@
+#!/usr/bin/python
+
+#
+# Columnar storage for the events of every job in a workflow.
+#
+# Instead of a list of (event, time, site) tuples per job, every event is a
+# row in four packed columns: int8 event code, int64 epoch time, int32 job
+# index and int16 site id.  Queries over consecutive events of a job are
+# done with numpy over the whole column instead of python loops.
+#
+
+from array import array
+
+import numpy
+
+from Metrics import Metrics, event_slots, pair_slots
+from Quantiles import QuantileSketch
+
+
+def _ToNumpy(column, dtype):
+    """
+    Copy an array.array column into a numpy array of type 'dtype'.
+    """
+    if len(column) == 0:
+        return numpy.zeros(0, dtype=dtype)
+    raw = numpy.frombuffer(column, dtype="i%i" % column.itemsize)
+    return raw.astype(dtype)
+
+
+def PairCode(eventa, eventb):
+    """
+    Single integer code for the sequence eventa -> eventb.
+    """
+    return eventa * 16 + eventb
+
+
+class EventStore:
+    """
+    Packed event columns for all the jobs of a workflow.
+
+    Events are appended in log order.  Before a query the columns are
+    (stable) sorted by job, so the events of one job are a contiguous,
+    time ordered range [offsets[job], offsets[job+1]).
+    """
+    def __init__(self):
+        self.event = array('b')
+        self.time = array('l')
+        self.job = array('i')
+        self.site = array('h')
+
+        self.jobids = []
+        self.sites = [""]
+        self.site_ids = {"": 0}
+        self.last_event = []
+
+        self.dirty = True
+
+    def AddJob(self, jobid):
+        """
+        Register a new job, and return its index in the store.
+        """
+        self.jobids.append(jobid)
+        self.last_event.append(None)
+        return len(self.jobids) - 1
+
+    def SiteId(self, site):
+        """
+        Return the interned integer id of 'site'.
+        """
+        try:
+            return self.site_ids[site]
+        except KeyError:
+            if len(self.sites) > 32767:
+                raise Exception("Too many sites for the event store")
+            self.site_ids[site] = len(self.sites)
+            self.sites.append(site)
+            return self.site_ids[site]
+
+    def AddEvent(self, index, event, time, site):
+        """
+        Append an event for the job at 'index'.
+
+        Arguments:
+        index - job index returned by AddJob
+        event - One of the Job.* constants.
+        time - time of the event, usually in seconds since epoch
+        site - site the event is attributed to
+        """
+        self.event.append(event)
+        self.time.append(time)
+        self.job.append(index)
+        self.site.append(self.SiteId(site))
+        self.last_event[index] = event
+        self.dirty = True
+
+    def LastEvent(self, index):
+        """
+        Return the code of the last event added for the job at 'index'.
+        """
+        return self.last_event[index]
+
+    def __len__(self):
+        return len(self.event)
+
+    def Freeze(self):
+        """
+        Build the job ordered numpy columns and the consecutive pair arrays.
+        """
+        if not self.dirty:
+            return
+        job = _ToNumpy(self.job, numpy.int32)
+        order = numpy.argsort(job, kind='mergesort')
+        self.s_job = job[order]
+        self.s_event = _ToNumpy(self.event, numpy.int8)[order]
+        self.s_time = _ToNumpy(self.time, numpy.int64)[order]
+        self.s_site = _ToNumpy(self.site, numpy.int16)[order]
+
+        counts = numpy.bincount(self.s_job, minlength=len(self.jobids))
+        self.offsets = numpy.zeros(len(self.jobids) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=self.offsets[1:])
+
+        # Pair i is (event i, event i+1), coded as PairCode, -1 when the
+        # two events belong to different jobs
+        self.same_job = self.s_job[1:] == self.s_job[:-1]
+        self.pair = PairCode(self.s_event[:-1].astype(numpy.int16), self.s_event[1:])
+        self.pair[~self.same_job] = -1
+        self.delta = numpy.diff(self.s_time)
+        self.dirty = False
+
+    def Range(self, index):
+        """
+        Return the (start, end) rows of the job at 'index'.
+        """
+        self.Freeze()
+        return int(self.offsets[index]), int(self.offsets[index + 1])
+
+    def PairMask(self, eventa, eventb, start=0, end=None):
+        """
+        Boolean mask over the pairs [start, end): eventa directly followed by
+        eventb in the same job.
+        """
+        self.Freeze()
+        return self.pair[start:end] == PairCode(eventa, eventb)
+
+    # Per job kernels
+
+    def GetEvents(self, index, event):
+        """
+        Return the (event, time, site) tuples of job 'index' that match 'event'
+        """
+        start, end = self.Range(index)
+        rows = numpy.nonzero(self.s_event[start:end] == event)[0] + start
+        return [(int(self.s_event[row]), int(self.s_time[row]), self.sites[self.s_site[row]]) for row in rows]
+
+    def GetTimeOfLast(self, index, eventa, eventb=None):
+        """
+        Time of the last eventa of job 'index', or the duration of the last
+        eventa -> eventb pair.  0 if there is none.
+        """
+        start, end = self.Range(index)
+        if eventb == None:
+            rows = numpy.nonzero(self.s_event[start:end] == eventa)[0]
+            if len(rows) == 0:
+                return 0
+            return int(self.s_time[start + rows[-1]])
+        if end - start < 2:
+            return 0
+        rows = numpy.nonzero(self.PairMask(eventa, eventb, start, end - 1))[0]
+        if len(rows) == 0:
+            return 0
+        return int(self.delta[start + rows[-1]])
+
+    def GetTimeOfFirst(self, index, event):
+        """ Get the time of the first 'event' of job 'index', or None """
+        start, end = self.Range(index)
+        rows = numpy.nonzero(self.s_event[start:end] == event)[0]
+        if len(rows) == 0:
+            return None
+        return int(self.s_time[start + rows[0]])
+
+    def GetTimeBetween(self, index, eventa, eventb):
+        """
+        Sum of the time between sequential eventa & eventb of job 'index'.
+        """
+        start, end = self.Range(index)
+        if end - start < 2:
+            return 0
+        mask = self.PairMask(eventa, eventb, start, end - 1)
+        return int(self.delta[start:end - 1][mask].sum())
+
+    def GetEventOccurances(self, index, eventa, eventb=None):
+        """
+        Number of eventa, or of the sequence eventa & eventb, of job 'index'.
+
+        Like Job.GetMultEventOccurances, a sequence formed by the last two
+        events of the job is not counted.
+        """
+        start, end = self.Range(index)
+        if eventb == None:
+            return int(numpy.count_nonzero(self.s_event[start:end] == eventa))
+        if end - start < 3:
+            return 0
+        return int(numpy.count_nonzero(self.PairMask(eventa, eventb, start, end - 2)))
+
+    # Kernels over every job at once
+
+    def TotalTimeBetween(self, eventa, eventb):
+        """
+        Sum over all jobs of the time between sequential eventa & eventb.
+        """
+        self.Freeze()
+        if len(self.delta) == 0:
+            return 0
+        return int(self.delta[self.PairMask(eventa, eventb)].sum())
+
+    def TotalTimeOfLast(self, eventa, eventb):
+        """
+        Sum over all jobs of the duration of their last eventa -> eventb pair.
+        """
+        self.Freeze()
+        rows = numpy.nonzero(self.PairMask(eventa, eventb))[0]
+        if len(rows) == 0:
+            return 0
+        pair_job = self.s_job[rows]
+        last = numpy.ones(len(rows), dtype=bool)
+        last[:-1] = pair_job[1:] != pair_job[:-1]
+        return int(self.delta[rows[last]].sum())
+
+    def TotalEventOccurances(self, eventa, eventb=None):
+        """
+        Number of eventa, or of the sequence eventa & eventb, over all jobs
+        (with the same last-pair rule as GetEventOccurances).
+        """
+        self.Freeze()
+        if eventb == None:
+            return int(numpy.count_nonzero(self.s_event == eventa))
+        if len(self.s_event) < 3:
+            return 0
+        # The event after the pair has to belong to the same job as well
+        counted = self.PairMask(eventa, eventb)[:-1] & self.same_job[1:]
+        return int(numpy.count_nonzero(counted))
+
+    def EventPlaces(self, event):
+        """
+        Return a dictionary of site -> number of 'event' at that site.
+        """
+        self.Freeze()
+        ids = self.s_site[self.s_event == event]
+        counts = numpy.bincount(ids.astype(numpy.int64), minlength=len(self.sites))
+        places = {}
+        for site_id in numpy.nonzero(counts)[0]:
+            places[self.sites[site_id]] = int(counts[site_id])
+        return places
+
+    def Metrics(self, evict_event):
+        """
+        Fill a Metrics object with the totals of every transition, using one
+        bincount over the pair codes instead of a walk per job.
+        """
+        self.Freeze()
+        metrics = Metrics(evict_event)
+        metrics.num_jobs = len(self.jobids)
+        self.FillSites(metrics.sites)
+
+        counts = numpy.bincount(self.s_event.astype(numpy.int64))
+        for event in numpy.nonzero(counts)[0]:
+            metrics.occurances[int(event)] = int(counts[event])
+        metrics.evict_places = self.EventPlaces(evict_event)
+
+        rows = numpy.nonzero(self.same_job)[0]
+        if len(rows) == 0:
+            return metrics
+        codes = self.pair[rows].astype(numpy.int64)
+        deltas = self.delta[rows]
+        totals = numpy.bincount(codes, weights=deltas)
+        # A pair followed by a third event of the same job
+        inner = numpy.zeros(len(self.same_job), dtype=bool)
+        inner[:-1] = self.same_job[:-1] & self.same_job[1:]
+        occurances = numpy.bincount(self.pair[inner].astype(numpy.int64), minlength=len(totals))
+
+        # Last occurrence of every (job, pair code)
+        key = self.s_job[rows].astype(numpy.int64) * 256 + codes
+        unique, first_reversed = numpy.unique(key[::-1], return_index=True)
+        last_rows = len(key) - 1 - first_reversed
+        last_totals = numpy.bincount(codes[last_rows], weights=deltas[last_rows], minlength=len(totals))
+
+        for code in numpy.nonzero(numpy.bincount(codes))[0]:
+            pair = (int(code) // 16, int(code) % 16)
+            metrics.pair_time[pair] = int(totals[code])
+            metrics.last_pair_time[pair] = int(last_totals[code])
+            if occurances[code]:
+                metrics.pair_occurances[pair] = int(occurances[code])
+        return metrics
+
+    def AddDistributions(self, distributions):
+        """
+        Add the totals of every job to the Distributions 'distributions', one
+        bincount over the jobs (and over the jobs and sites) per metric
+        instead of a walk per job.
+        """
+        self.Freeze()
+        num_jobs = len(self.jobids)
+        num_sites = len(self.sites)
+        rows = numpy.nonzero(self.same_job)[0]
+        codes = self.pair[rows]
+        deltas = self.delta[rows]
+        jobs = self.s_job[rows].astype(numpy.int64)
+        # A transition counts for the site of the event ending it
+        sites = self.s_site[rows + 1].astype(numpy.int64)
+        for (name, pairs) in distributions.metrics:
+            mask = numpy.in1d(codes, [PairCode(eventa, eventb) for (eventa, eventb) in pairs])
+            totals = numpy.bincount(jobs[mask], weights=deltas[mask], minlength=num_jobs)
+            distributions.jobs[name].AddValues(totals.astype(numpy.int64))
+
+            # Every (job, site) with a transition of the metric
+            keys, inverse = numpy.unique(jobs[mask] * num_sites + sites[mask], return_inverse=True)
+            site_totals = numpy.bincount(inverse, weights=deltas[mask]).astype(numpy.int64)
+            site_ids = keys % num_sites
+            for site_id in numpy.unique(site_ids):
+                key = (name, self.sites[site_id])
+                if not distributions.sites.has_key(key):
+                    distributions.sites[key] = QuantileSketch(distributions.accuracy)
+                distributions.sites[key].AddValues(site_totals[site_ids == site_id])
+
+    def FillSites(self, sites):
+        """
+        Fill the empty SiteBreakdown 'sites' with the totals of every site,
+        one bincount over (site id, pair code) per kind of total.
+        """
+        self.Freeze()
+        for site in self.sites:
+            sites.SiteId(site)
+        num_sites = len(self.sites)
+        site = self.s_site.astype(numpy.int64)
+        event = self.s_event.astype(numpy.int64)
+
+        sites.occurances[:] = numpy.bincount(site * event_slots + event, minlength=num_sites * event_slots).tolist()
+
+        # Every job with events is counted at its last site
+        ends = self.offsets[1:][self.offsets[1:] > self.offsets[:-1]] - 1
+        sites.num_jobs[:] = numpy.bincount(site[ends], minlength=num_sites).tolist()
+
+        rows = numpy.nonzero(self.same_job)[0]
+        if len(rows) == 0:
+            return
+        # A transition counts for the site of the event ending it
+        slots = site[rows + 1] * pair_slots + self.pair[rows].astype(numpy.int64)
+        deltas = self.delta[rows]
+        length = num_sites * pair_slots
+        sites.pair_time[:] = numpy.bincount(slots, weights=deltas, minlength=length).astype(numpy.int64).tolist()
+
+        inner = numpy.zeros(len(self.same_job), dtype=bool)
+        inner[:-1] = self.same_job[:-1] & self.same_job[1:]
+        inner_rows = numpy.nonzero(inner)[0]
+        sites.pair_occurances[:] = numpy.bincount(site[inner_rows + 1] * pair_slots + self.pair[inner_rows].astype(numpy.int64), minlength=length).tolist()
+
+        # Last occurrence of every (job, pair code)
+        codes = self.pair[rows].astype(numpy.int64)
+        key = self.s_job[rows].astype(numpy.int64) * pair_slots + codes
+        unique, first_reversed = numpy.unique(key[::-1], return_index=True)
+        last_rows = len(key) - 1 - first_reversed
+        sites.last_pair_time[:] = numpy.bincount(slots[last_rows], weights=deltas[last_rows], minlength=length).astype(numpy.int64).tolist()
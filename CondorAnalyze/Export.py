@@ -0,0 +1,96 @@
+#!/usr/bin/python
+
+#
+# Export of the analysis results as tables for downstream tools.
+#
+# A table is a list of named, equally long columns.  It is written either
+# as a CSV file, built in memory and written at once, or as a directory of
+# numpy .npy files, one per column, which can be loaded memory mapped with
+# numpy.load(path, mmap_mode='r') instead of reparsing the logs.
+#
+
+import os
+
+import numpy
+
+
+# Formats Export can write, and the suffix of their file (or directory)
+export_formats = {'csv': '.csv', 'columns': '.cols'}
+
+
+def WriteCSV(path, names, columns):
+    """
+    Write the table 'columns' (with the header 'names') to the CSV file
+    'path' in one write.
+    """
+    lines = [",".join([CSVField(name) for name in names])]
+    rows = zip(*[CSVColumn(column) for column in columns])
+    lines.extend([",".join(row) for row in rows])
+    lines.append("")
+    f = open(path, 'w')
+    try:
+        f.write("\n".join(lines))
+    finally:
+        f.close()
+
+
+def CSVColumn(column):
+    """
+    Return the fields of a numpy 'column' as CSV strings.
+    """
+    if column.dtype.kind == 'S':
+        return [CSVField(value) for value in column.tolist()]
+    return [str(value) for value in column.tolist()]
+
+
+def CSVField(value):
+    """
+    Quote a string field if it needs to be.
+    """
+    if ('"' in value) or (',' in value) or ('\n' in value):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def WriteColumns(path, names, columns):
+    """
+    Write the table 'columns' to the directory 'path', every column in
+    <name>.npy.  The column names, in order, are listed in 'columns.txt'.
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for name, column in zip(names, columns):
+        numpy.save(os.path.join(path, name + ".npy"), column)
+    f = open(os.path.join(path, "columns.txt"), 'w')
+    try:
+        f.write("\n".join(names) + "\n")
+    finally:
+        f.close()
+
+
+def ReadColumns(path):
+    """
+    Return {name: column} of a table written by WriteColumns, every column
+    memory mapped.
+    """
+    f = open(os.path.join(path, "columns.txt"))
+    try:
+        names = f.read().split()
+    finally:
+        f.close()
+    columns = {}
+    for name in names:
+        columns[name] = numpy.load(os.path.join(path, name + ".npy"), mmap_mode='r')
+    return columns
+
+
+def WriteTable(prefix, table, names, columns, formats):
+    """
+    Write a table to <prefix>-<table>.<suffix> in each of 'formats'.
+    """
+    for format in formats:
+        path = "%s-%s%s" % (prefix, table, export_formats[format])
+        if format == 'csv':
+            WriteCSV(path, names, columns)
+        else:
+            WriteColumns(path, names, columns)
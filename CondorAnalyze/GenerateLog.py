@@ -0,0 +1,207 @@
+#!/usr/bin/python
+
+#
+# Generator of synthetic ClassAd format userlogs, to test and benchmark the
+# analysis at production scale without shipping real logs around.
+#
+# Jobs are submitted at a steady rate, may be held and released, wait in
+# the queue and run at one of the configured sites, are evicted any number
+# of times and finally terminate.  The events of all active jobs are merged in time
+# order, like a schedd writes them, so only the active jobs are in memory
+# whatever the size of the log.
+#
+
+import sys
+import optparse
+import random
+import heapq
+from time import strftime, localtime
+
+
+# Attributes written with every event, like a real schedd does, so the
+# parser has to skip over them
+padding_attributes = [
+    'Environment = "PATH=/usr/bin:/bin HOME=/home/user OSG_APP=/osg/app OSG_DATA=/osg/data"',
+    'Args = "--input input.dat --output output.dat --seed 12345 --verbose"',
+]
+
+
+class LogGenerator:
+    """
+    Writes the events of a synthetic workflow.
+
+    Attributes:
+    sites - list of (site, weight) the jobs run at
+    evict_rate - chance that a run ends in an eviction
+    hold_rate - chance that a job is held (and later released) before it runs
+    reconnect_rate - chance that an eviction is a failed reconnect instead
+    submit_interval - seconds between two submissions
+    queue_time, run_time - mean seconds in the queue and running
+    start_time - time of the first submission, in seconds since epoch
+    """
+    def __init__(self, sites=None, evict_rate=0.1, hold_rate=0.02, reconnect_rate=0.1, submit_interval=10, queue_time=600, run_time=3600, start_time=1308009600, seed=None):
+        if sites is None:
+            sites = [("site%i.example.org" % i, 1.0) for i in range(5)]
+        self.sites = sites
+        self.total_weight = sum([weight for (site, weight) in sites])
+        self.evict_rate = evict_rate
+        self.hold_rate = hold_rate
+        self.reconnect_rate = reconnect_rate
+        self.submit_interval = submit_interval
+        self.queue_time = queue_time
+        self.run_time = run_time
+        self.start_time = start_time
+        self.random = random.Random(seed)
+
+    def PickSite(self):
+        """
+        Return a site, chosen by the site weights.
+        """
+        point = self.random.uniform(0, self.total_weight)
+        for site, weight in self.sites:
+            point -= weight
+            if point <= 0:
+                return site
+        return self.sites[-1][0]
+
+    def JobEvents(self, cluster, submit_time):
+        """
+        Yield the (time, MyType, site) of every event of one job.
+        """
+        rand = self.random
+        time = submit_time
+        yield (time, "SubmitEvent", None)
+        if rand.random() < self.hold_rate:
+            time += int(rand.expovariate(1.0 / self.queue_time)) + 1
+            yield (time, "JobHeldEvent", None)
+            time += int(rand.expovariate(1.0 / self.queue_time)) + 1
+            yield (time, "JobReleaseEvent", None)
+        while 1:
+            site = self.PickSite()
+            time += int(rand.expovariate(1.0 / self.queue_time)) + 1
+            yield (time, "ExecuteEvent", site)
+            time += int(rand.expovariate(1.0 / self.run_time)) + 1
+            if rand.random() >= self.evict_rate:
+                yield (time, "JobTerminatedEvent", site)
+                return
+            if rand.random() < self.reconnect_rate:
+                yield (time, "JobReconnectFailedEvent", site)
+            else:
+                yield (time, "JobEvictedEvent", site)
+
+    def Events(self, jobs=None, events=None):
+        """
+        Yield (time, MyType, cluster, site) in time order, for 'jobs' jobs or
+        until 'events' events were generated (whichever comes first).
+        """
+        heap = []
+        cluster = 0
+        generated = 0
+        next_submit = self.start_time
+        while (events is None) or (generated < events):
+            # Submit the next job if it comes before the next event of the
+            # active jobs
+            if ((jobs is None) or (cluster < jobs)) and ((not heap) or (next_submit <= heap[0][0])):
+                job = self.JobEvents(cluster, next_submit)
+                (time, mytype, site) = job.next()
+                heapq.heappush(heap, (time, cluster, mytype, site, job))
+                cluster += 1
+                next_submit += self.submit_interval
+                continue
+            if not heap:
+                return
+            (time, job_cluster, mytype, site, job) = heapq.heappop(heap)
+            yield (time, mytype, job_cluster, site)
+            generated += 1
+            for (time, mytype, site) in job:
+                heapq.heappush(heap, (time, job_cluster, mytype, site, job))
+                break
+
+    def Write(self, out, jobs=None, events=None):
+        """
+        Write the events to the open file 'out' in the ClassAd userlog
+        format, and return how many were written.
+        """
+        written = 0
+        stamps = {}
+        for (time, mytype, cluster, site) in self.Events(jobs, events):
+            try:
+                stamp = stamps[time]
+            except KeyError:
+                stamps.clear()
+                stamp = stamps[time] = strftime('"%Y-%m-%dT%H:%M:%S"', localtime(time))
+            lines = ['MyType = "%s"' % mytype,
+                     'EventTime = %s' % stamp,
+                     'Cluster = %i' % cluster,
+                     'Proc = 0',
+                     'Subproc = 0']
+            if site is not None:
+                lines.append('GLIDEIN_GatekeeperB = "%s"' % site)
+            lines.extend(padding_attributes)
+            lines.append('...\n')
+            out.write('\n'.join(lines))
+            written += 1
+        return written
+
+
+def ParseSites(text):
+    """
+    Turn "site:weight,site:weight" (weights default to 1) into the 'sites'
+    of a LogGenerator.
+    """
+    sites = []
+    for item in text.split(','):
+        name, colon, weight = item.partition(':')
+        if colon:
+            sites.append((name, float(weight)))
+        else:
+            sites.append((name, 1.0))
+    return sites
+
+
+def AddOptions(parser):
+    parser.add_option('-o', '--output', help="Log to write (default stdout)", default=None, dest="output")
+    parser.add_option('-n', '--events', help="Number of events to write", default=None, dest="events", type="int")
+    parser.add_option('--jobs', help="Number of jobs to write", default=None, dest="jobs", type="int")
+    parser.add_option('--sites', help="Sites the jobs run at, as site:weight,site:weight", default=None, dest="sites")
+    parser.add_option('--evict-rate', help="Chance that a run is evicted (default 0.1)", default=0.1, dest="evict_rate", type="float")
+    parser.add_option('--hold-rate', help="Chance that a job is held before it runs (default 0.02)", default=0.02, dest="hold_rate", type="float")
+    parser.add_option('--reconnect-rate', help="Chance that an eviction is a failed reconnect instead (default 0.1)", default=0.1, dest="reconnect_rate", type="float")
+    parser.add_option('--submit-interval', help="Seconds between submissions (default 10)", default=10, dest="submit_interval", type="int")
+    parser.add_option('--queue-time', help="Mean queue time in seconds (default 600)", default=600, dest="queue_time", type="int")
+    parser.add_option('--run-time', help="Mean running time in seconds (default 3600)", default=3600, dest="run_time", type="int")
+    parser.add_option('--seed', help="Seed of the random generator", default=None, dest="seed", type="int")
+
+
+def GeneratorFromOptions(opts):
+    """
+    Return the LogGenerator configured by the AddOptions options.
+    """
+    sites = None
+    if opts.sites:
+        sites = ParseSites(opts.sites)
+    return LogGenerator(sites, opts.evict_rate, opts.hold_rate, opts.reconnect_rate, submit_interval=opts.submit_interval, queue_time=opts.queue_time, run_time=opts.run_time, seed=opts.seed)
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] (--events N | --jobs N)")
+    AddOptions(parser)
+    (opts, args) = parser.parse_args()
+    if (opts.events is None) and (opts.jobs is None):
+        parser.error("--events or --jobs is needed")
+
+    generator = GeneratorFromOptions(opts)
+    if opts.output is None:
+        out = sys.stdout
+    else:
+        out = open(opts.output, 'w')
+    try:
+        written = generator.Write(out, opts.jobs, opts.events)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    sys.stderr.write("Wrote %i events\n" % written)
+
+
+if __name__ == "__main__":
+    main()
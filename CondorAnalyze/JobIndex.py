@@ -0,0 +1,279 @@
+#!/usr/bin/python
+
+#
+# Persistent index of the event blocks of every job in a userlog.
+#
+# Looking at one job should not mean parsing the whole log.  The index
+# records the byte offset of every event block with its job, as two int64
+# columns sorted by job key (cluster << 32 | proc): the key of each block
+# and its offset.  The columns follow a fixed size JSON header in the index
+# file and are memory mapped, so a lookup is a binary search touching a few
+# pages, and then a read of only the blocks of the jobs asked for.  When the
+# log grows, only the new blocks are indexed and merged in.  A compressed
+# log can not be read at an offset, its jobs are found by a scan instead
+# (ScanEvents).
+#
+
+import os
+import sys
+import re
+import json
+import hashlib
+import mmap
+
+import numpy
+
+from UserLogReader import LogTail, Projection, ParseBlock, ReadBlocks, ReadDecoded, IsCompressed, IsClassicLog, ClassicDecoder, DecodeEvent, decoded_attributes
+from EventCache import Fingerprint
+
+
+# Bump when the layout of an index file changes
+index_version = 1
+
+# Bytes reserved for the JSON header at the start of an index file
+header_size = 4096
+
+# The attributes a ClassAd event block is indexed by
+job_attributes = Projection(["Cluster", "Proc"])
+
+# Cluster and proc of a classic event block
+classic_job = re.compile(r"\d\d\d \((\d+)\.(\d+)\.")
+
+# A job "1234.0", a cluster "1234" or a cluster range "1200-1300"
+job_range = re.compile(r"^(\d+)(?:\.(\d+)|-(\d+))?$")
+
+
+class JobIndexError(Exception):
+    """
+    A log can not be indexed, or its index not written.
+    """
+    pass
+
+
+class JobRangeError(ValueError):
+    """
+    A job, cluster or cluster range is not written as ParseJobRange expects.
+    """
+    pass
+
+
+def JobKey(cluster, proc):
+    """
+    Return the integer key of the job cluster.proc.
+    """
+    return (int(cluster) << 32) | int(proc)
+
+
+def KeyJob(key):
+    """
+    Return the "Cluster.Proc" jobid of an integer key.
+    """
+    return "%i.%i" % (key >> 32, key & 0xffffffff)
+
+
+def ParseJobRange(text):
+    """
+    Return the (first, last) keys of "1234.0" (one job), "1234" (a cluster)
+    or "1200-1300" (a range of clusters).  Raises JobRangeError for
+    anything else.
+    """
+    match = job_range.match(text.strip())
+    if match is None:
+        raise JobRangeError("%s is not a job (1234.0), cluster (1234) or cluster range (1200-1300)" % text)
+    (cluster, proc, last) = match.groups()
+    if last is not None:
+        (first, last) = (JobKey(cluster, 0), JobKey(last, 0xffffffff))
+    elif proc is not None:
+        first = last = JobKey(cluster, proc)
+    else:
+        (first, last) = (JobKey(cluster, 0), JobKey(cluster, 0xffffffff))
+    if (first > last) or (last >> 32 > 0x7fffffff) or (int(proc or 0) > 0xffffffff):
+        raise JobRangeError("%s is not a valid job range" % text)
+    return first, last
+
+
+def ScanEvents(file, first, last=None):
+    """
+    Yield the (MyType, time, jobid, site) of DecodeEvent of every event of
+    the jobs with keys in [first, last], reading the whole log.  For the
+    logs that can not be indexed.
+    """
+    if last is None:
+        last = first
+    for decoded in ReadDecoded(file):
+        (cluster, proc) = decoded[2].split('.')
+        if first <= JobKey(cluster, proc) <= last:
+            yield decoded
+
+
+class JobIndex:
+    """
+    The job index of one log, kept in "<log>.jobidx" next to it or in a
+    directory.
+
+    Attributes:
+    path - absolute path of the log
+    keys - job key of every indexed block, sorted
+    offsets - byte offset of the block of each key, in log order per job
+    offset - byte offset just after the last block indexed
+    """
+    def __init__(self, file, directory=None):
+        """Initializer
+
+        Arguments:
+        file - path of the (uncompressed) userlog
+        directory - directory holding the index files, None to keep the
+                    index next to the log
+
+        """
+        self.path = os.path.abspath(file)
+        if IsCompressed(self.path):
+            raise JobIndexError("%s is compressed, only uncompressed logs can be indexed" % file)
+        self.directory = directory
+        self.keys = numpy.zeros(0, dtype=numpy.int64)
+        self.offsets = numpy.zeros(0, dtype=numpy.int64)
+        self.offset = 0
+        self.fingerprint = None
+
+    def IndexPath(self):
+        """
+        Return the index file of the log.
+        """
+        if self.directory is None:
+            return self.path + ".jobidx"
+        return os.path.join(self.directory, hashlib.md5(self.path).hexdigest() + ".jobidx")
+
+    def Load(self):
+        """
+        Memory map the index file.  Returns False if there is no usable
+        index of this log.
+        """
+        try:
+            f = open(self.IndexPath(), 'rb')
+        except IOError:
+            return False
+        try:
+            try:
+                header = json.loads(f.read(header_size))
+            except ValueError:
+                return False
+        finally:
+            f.close()
+        if (header.get('version') != index_version) or (header.get('path') != self.path):
+            return False
+        count = header['count']
+        if count:
+            self.keys = numpy.memmap(self.IndexPath(), dtype=numpy.int64, mode='r', offset=header_size, shape=(count,))
+            self.offsets = numpy.memmap(self.IndexPath(), dtype=numpy.int64, mode='r', offset=header_size + 8 * count, shape=(count,))
+        self.offset = header['offset']
+        self.fingerprint = header['fingerprint']
+        return True
+
+    def Save(self):
+        """
+        Write the index file, through a temporary file.
+        """
+        index_path = self.IndexPath()
+        temp_path = "%s.%i.tmp" % (index_path, os.getpid())
+        header = json.dumps({'version': index_version,
+                             'path': self.path,
+                             'count': len(self.keys),
+                             'offset': self.offset,
+                             'fingerprint': self.fingerprint})
+        if len(header) >= header_size:
+            raise JobIndexError("Index header of %s too long" % self.path)
+        if (self.directory is not None) and not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        f = open(temp_path, 'wb')
+        try:
+            f.write(header.ljust(header_size))
+            numpy.asarray(self.keys, dtype=numpy.int64).tofile(f)
+            numpy.asarray(self.offsets, dtype=numpy.int64).tofile(f)
+        finally:
+            f.close()
+        os.rename(temp_path, index_path)
+
+    def Update(self):
+        """
+        Load the index, and bring it up to date with the log: index the
+        blocks appended since, or everything if the log was replaced.
+        Returns self.
+        """
+        if self.Load():
+            size = os.path.getsize(self.path)
+            if (size < self.offset) or (Fingerprint(self.path, self.offset) != self.fingerprint):
+                self.keys = numpy.zeros(0, dtype=numpy.int64)
+                self.offsets = numpy.zeros(0, dtype=numpy.int64)
+                self.offset = 0
+            elif size == self.offset:
+                return self
+
+        classic = IsClassicLog(self.path)
+        tail = LogTail(self.path, self.offset)
+        keys = []
+        offsets = []
+        start = tail.offset
+        for block in tail.ReadBlocks():
+            if classic:
+                match = classic_job.match(block)
+                if match is not None:
+                    keys.append(JobKey(*match.groups()))
+                    offsets.append(start)
+            else:
+                job_event = ParseBlock(block, job_attributes)
+                if job_event.has_key("Cluster") and job_event.has_key("Proc"):
+                    keys.append(JobKey(job_event["Cluster"], job_event["Proc"]))
+                    offsets.append(start)
+            start = tail.offset
+        if keys or (tail.offset != self.offset):
+            all_keys = numpy.concatenate((self.keys, numpy.array(keys, dtype=numpy.int64)))
+            all_offsets = numpy.concatenate((self.offsets, numpy.array(offsets, dtype=numpy.int64)))
+            # Stable, so the blocks of a job stay in log order
+            order = numpy.argsort(all_keys, kind='mergesort')
+            self.keys = all_keys[order]
+            self.offsets = all_offsets[order]
+            self.offset = tail.offset
+            self.fingerprint = Fingerprint(self.path, self.offset)
+            try:
+                self.Save()
+            except (IOError, OSError), e:
+                sys.stderr.write("Unable to write the job index of %s: %s\n" % (self.path, e))
+        return self
+
+    def Lookup(self, first, last=None):
+        """
+        Return the offsets of the blocks of the jobs with keys in
+        [first, last] (only 'first' if last is None), in log order.
+        """
+        if last is None:
+            last = first
+        low = numpy.searchsorted(self.keys, first, 'left')
+        high = numpy.searchsorted(self.keys, last, 'right')
+        return numpy.sort(self.offsets[low:high]).tolist()
+
+    def Events(self, first, last=None):
+        """
+        Yield the (MyType, time, jobid, site) of DecodeEvent of every event of
+        the jobs with keys in [first, last], reading only their blocks.
+        """
+        offsets = self.Lookup(first, last)
+        if not offsets:
+            return
+        decoder = None
+        if IsClassicLog(self.path):
+            decoder = ClassicDecoder(os.path.getmtime(self.path))
+        f = open(self.path)
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for offset in offsets:
+                for block, end in ReadBlocks(buf, offset):
+                    if decoder is not None:
+                        decoded = decoder.Decode(block)
+                    else:
+                        decoded = DecodeEvent(ParseBlock(block, decoded_attributes))
+                    if decoded is not None:
+                        yield decoded
+                    break
+        finally:
+            buf.close()
+            f.close()
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+#
+# On-disk store for the event history of jobs that no longer need to be in
+# memory.
+#
+# The bounded memory mode of the Analyzer folds a terminated job into its
+# totals and appends the (event, time, site) list of the job to a spill
+# file.  Each record is one pickled (jobid, events, final) segment: the
+# segments an active job flushed to stay under the memory limit, and the
+# whole history of a job once it is retired (final).  Nothing is kept in
+# memory per job, an active job remembers the offsets of its own segments,
+# and the histories of the retired jobs are found by reading the file, so
+# the history of any job can still be read back for drill-down, from this
+# process or by reopening the file later.
+#
+
+import os
+import cPickle
+import tempfile
+
+
+def CurrentRSS():
+    """
+    Return the resident memory of this process in bytes, or None if it can
+    not be found out.  Pages of memory mapped files (the userlog being read)
+    are not counted, they can be dropped by the kernel at any time.
+    """
+    try:
+        f = open("/proc/self/statm")
+        try:
+            fields = f.read().split()
+        finally:
+            f.close()
+        return (int(fields[1]) - int(fields[2])) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Only the peak is available, in kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return None
+
+
+class JobSpill:
+    """
+    Append only file of job event history segments.
+
+    Attributes:
+    path - the spill file
+    """
+    def __init__(self, path=None, mode='w'):
+        """Initializer
+
+        Arguments:
+        path - the spill file, None for a temporary file removed by Close()
+        mode - 'w' to start a new spill file, 'r' to read an existing one
+
+        """
+        self.temporary = path is None
+        if self.temporary:
+            fd, path = tempfile.mkstemp(suffix=".spill")
+            self.file = os.fdopen(fd, 'w+b')
+        elif mode == 'r':
+            self.file = open(path, 'rb')
+        else:
+            self.file = open(path, 'w+b')
+        self.path = path
+
+    def Write(self, jobid, events, final=False):
+        """
+        Append a segment of the history of 'jobid', and return its offset.
+        A 'final' segment is the whole history of a retired job.
+        """
+        self.file.seek(0, 2)
+        offset = self.file.tell()
+        cPickle.dump((jobid, events, final), self.file, 2)
+        return offset
+
+    def ReadAt(self, offset):
+        """
+        Return the (jobid, events, final) segment written at 'offset'.
+        """
+        self.file.flush()
+        self.file.seek(offset)
+        return cPickle.load(self.file)
+
+    def Segments(self):
+        """
+        Yield every (jobid, events, final) segment, in the order written.
+        """
+        self.file.flush()
+        offset = 0
+        while 1:
+            self.file.seek(offset)
+            try:
+                segment = cPickle.load(self.file)
+            except EOFError:
+                break
+            offset = self.file.tell()
+            yield segment
+
+    def Histories(self):
+        """
+        Yield (jobid, list of (event, time, site)) of every retired job, in
+        the order they were retired.  A job that comes back after it was
+        retired is yielded once for every time it was.
+        """
+        for (jobid, events, final) in self.Segments():
+            if final:
+                yield jobid, events
+
+    def Read(self, jobid):
+        """
+        Return the retired (event, time, site) list of 'jobid', the
+        histories of every time it was retired one after the other.
+        """
+        events = []
+        for (other, history) in self.Histories():
+            if other == jobid:
+                events.extend(history)
+        return events
+
+    def Close(self):
+        """
+        Close the spill file, and remove it if it was a temporary one.
+        """
+        self.file.close()
+        if self.temporary:
+            os.remove(self.path)
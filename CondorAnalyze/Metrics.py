@@ -0,0 +1,344 @@
+#!/usr/bin/python
+
+#
+# Single pass accumulation of the totals the ParseLog report prints.
+#
+# The GetTotal* functions each sweep every job, once per (eventa, eventb)
+# pair they are made of.  Metrics walks the events of each job exactly once
+# and keeps the total for every transition, from which any of those sums
+# can be read.  The same walk also fills the totals of every site, in flat
+# arrays indexed by an interned site id (SiteBreakdown), so the report of
+# each site costs nothing more than the report of the whole workflow.
+#
+
+
+# Slots of the flat per-site arrays: one per event code, and one per
+# (eventa, eventb) pair code eventa * event_slots + eventb
+event_slots = 16
+pair_slots = event_slots * event_slots
+
+
+class SiteBreakdown:
+    """
+    The Metrics totals of every site, in flat arrays indexed by
+    site id * event_slots + event or site id * pair_slots + pair code.
+
+    A transition counts for the site of the event ending it, an event for
+    its own site and a job for the last site it used.
+
+    Attributes:
+    names - site id -> site
+    ids - site -> site id
+    pair_time, last_pair_time, pair_occurances - per site and pair code,
+                                                 as the Metrics attributes
+    occurances - per site and event code
+    num_jobs - site id -> number of jobs
+    """
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.pair_time = []
+        self.last_pair_time = []
+        self.pair_occurances = []
+        self.occurances = []
+        self.num_jobs = []
+
+    def SiteId(self, site):
+        """
+        Return the interned integer id of 'site', growing the arrays (in
+        place) for a new site.
+        """
+        try:
+            return self.ids[site]
+        except KeyError:
+            self.ids[site] = len(self.names)
+            self.names.append(site)
+            for totals in (self.pair_time, self.last_pair_time, self.pair_occurances):
+                totals.extend([0] * pair_slots)
+            self.occurances.extend([0] * event_slots)
+            self.num_jobs.append(0)
+            return self.ids[site]
+
+    def Merge(self, other):
+        """
+        Add the totals of the SiteBreakdown 'other' to these.
+        """
+        for other_id, site in enumerate(other.names):
+            site_id = self.SiteId(site)
+            for name, slots in (('pair_time', pair_slots), ('last_pair_time', pair_slots), \
+                                ('pair_occurances', pair_slots), ('occurances', event_slots)):
+                totals = getattr(self, name)
+                other_totals = getattr(other, name)
+                base = site_id * slots
+                other_base = other_id * slots
+                for slot in range(slots):
+                    totals[base + slot] += other_totals[other_base + slot]
+            self.num_jobs[site_id] += other.num_jobs[other_id]
+
+    def SiteMetrics(self, site, evict_event):
+        """
+        Return the Metrics of the transitions, events and jobs of 'site'.
+        """
+        metrics = Metrics(evict_event, breakdown=False)
+        site_id = self.ids.get(site)
+        if site_id is None:
+            return metrics
+        base = site_id * pair_slots
+        for code in range(pair_slots):
+            pair = (code // event_slots, code % event_slots)
+            if self.pair_time[base + code] or self.last_pair_time[base + code]:
+                metrics.pair_time[pair] = self.pair_time[base + code]
+                metrics.last_pair_time[pair] = self.last_pair_time[base + code]
+            if self.pair_occurances[base + code]:
+                metrics.pair_occurances[pair] = self.pair_occurances[base + code]
+        base = site_id * event_slots
+        for event in range(event_slots):
+            if self.occurances[base + event]:
+                metrics.occurances[event] = self.occurances[base + event]
+        if metrics.occurances.has_key(evict_event):
+            metrics.evict_places[site] = metrics.occurances[evict_event]
+        metrics.num_jobs = self.num_jobs[site_id]
+        return metrics
+
+
+
+class Metrics:
+    """
+    Totals over all jobs of every transition between consecutive events.
+
+    Attributes:
+    pair_time - (eventa, eventb) -> sum of the time between sequential eventa & eventb
+    last_pair_time - (eventa, eventb) -> sum over jobs of their last eventa & eventb time
+    occurances - event -> number of times it happened
+    pair_occurances - (eventa, eventb) -> number of sequences eventa & eventb,
+                      not counting the last two events of a job (as
+                      Job.GetMultEventOccurances)
+    evict_places - site -> number of evictions at that site
+    num_jobs - number of jobs added
+    sites - SiteBreakdown of these totals, None for the Metrics of a site
+    """
+    def __init__(self, evict_event, breakdown=True):
+        """Initializer
+
+        Arguments:
+        evict_event - event code counted in evict_places (Job.EVICT)
+        breakdown - also keep the totals of every site
+
+        """
+        self.evict_event = evict_event
+        self.pair_time = {}
+        self.last_pair_time = {}
+        self.occurances = {}
+        self.pair_occurances = {}
+        self.evict_places = {}
+        self.num_jobs = 0
+        self.sites = None
+        if breakdown:
+            self.sites = SiteBreakdown()
+
+    def AddJob(self, events, distributions=None):
+        """
+        Accumulate the (event, time, site) list of one job, and add it to
+        the Distributions 'distributions' in the same walk if given.
+        """
+        if self.sites is None:
+            self.AddJobTotals(events, distributions)
+            return
+        self.num_jobs += 1
+        pair_time = self.pair_time
+        occurances = self.occurances
+        pair_occurances = self.pair_occurances
+        sites = self.sites
+        site_ids = sites.ids
+        site_pair_time = sites.pair_time
+        site_occurances = sites.occurances
+        site_pair_occurances = sites.pair_occurances
+        last = {}
+        durations = {}
+        counted_until = len(events) - 2
+        previous = None
+        for index, (event, time, site) in enumerate(events):
+            try:
+                site_id = site_ids[site]
+            except KeyError:
+                site_id = sites.SiteId(site)
+            occurances[event] = occurances.get(event, 0) + 1
+            site_occurances[site_id * event_slots + event] += 1
+            if event == self.evict_event:
+                self.evict_places[site] = self.evict_places.get(site, 0) + 1
+            if previous is not None:
+                pair = (previous, event)
+                slot = site_id * pair_slots + previous * event_slots + event
+                delta = time - previous_time
+                pair_time[pair] = pair_time.get(pair, 0) + delta
+                site_pair_time[slot] += delta
+                last[pair] = (delta, slot)
+                if distributions is not None:
+                    distributions.Transition(durations, pair, delta, site)
+                if index - 1 < counted_until:
+                    pair_occurances[pair] = pair_occurances.get(pair, 0) + 1
+                    site_pair_occurances[slot] += 1
+            previous = event
+            previous_time = time
+        for pair in last:
+            delta, slot = last[pair]
+            self.last_pair_time[pair] = self.last_pair_time.get(pair, 0) + delta
+            sites.last_pair_time[slot] += delta
+        if events:
+            sites.num_jobs[site_id] += 1
+        if distributions is not None:
+            distributions.Finish(durations)
+
+    def AddJobTotals(self, events, distributions=None):
+        """
+        AddJob without a site breakdown, the walk behind the per-job tables.
+        """
+        self.num_jobs += 1
+        pair_time = self.pair_time
+        occurances = self.occurances
+        pair_occurances = self.pair_occurances
+        last = {}
+        durations = {}
+        counted_until = len(events) - 2
+        previous = None
+        for index, (event, time, site) in enumerate(events):
+            occurances[event] = occurances.get(event, 0) + 1
+            if event == self.evict_event:
+                self.evict_places[site] = self.evict_places.get(site, 0) + 1
+            if previous is not None:
+                pair = (previous, event)
+                delta = time - previous_time
+                pair_time[pair] = pair_time.get(pair, 0) + delta
+                last[pair] = delta
+                if distributions is not None:
+                    distributions.Transition(durations, pair, delta, site)
+                if index - 1 < counted_until:
+                    pair_occurances[pair] = pair_occurances.get(pair, 0) + 1
+            previous = event
+            previous_time = time
+        for pair in last:
+            self.last_pair_time[pair] = self.last_pair_time.get(pair, 0) + last[pair]
+        if distributions is not None:
+            distributions.Finish(durations)
+
+    def Merge(self, other):
+        """
+        Add the totals of the Metrics 'other' to these.
+        """
+        for name in ('pair_time', 'last_pair_time', 'occurances', 'pair_occurances', 'evict_places'):
+            totals = getattr(self, name)
+            for key, value in getattr(other, name).items():
+                totals[key] = totals.get(key, 0) + value
+        self.num_jobs += other.num_jobs
+        if (self.sites is not None) and (other.sites is not None):
+            self.sites.Merge(other.sites)
+
+    def SiteMetrics(self, site):
+        """
+        Return the Metrics of the site 'site' alone.
+        """
+        return self.sites.SiteMetrics(site, self.evict_event)
+
+    def TotalTime(self, *events):
+        """
+        Sum of the time between the given (eventa, eventb) pairs.
+        """
+        return int(sum([self.pair_time.get(pair, 0) for pair in events]))
+
+    def LastTotalTime(self, *events):
+        """
+        Sum over jobs of the time of the last of each (eventa, eventb) pair.
+        """
+        return int(sum([self.last_pair_time.get(pair, 0) for pair in events]))
+
+    def EventOccurances(self, *events):
+        """
+        Number of occurrences of each event, or (eventa, eventb) sequence.
+        """
+        total_events = 0
+        for event in events:
+            try:
+                total_events += self.pair_occurances.get((event[0], event[1]), 0)
+            except TypeError:
+                total_events += self.occurances.get(event, 0)
+        return int(total_events)
+
+
+class JobState:
+    """
+    What StreamingMetrics remembers about one job that is still active.
+    """
+    def __init__(self):
+        self.event = None       # last event
+        self.time = 0           # time of the last event
+        self.site = None        # site id the job is counted at
+        self.pending = None     # (pair, slot) of the last transition, counted
+                                # in pair_occurances once another event follows
+        self.last = {}          # pair -> (duration, slot) of its last occurrence
+
+
+class StreamingMetrics(Metrics):
+    """
+    Metrics updated as each event arrives, without keeping the event history
+    of the jobs.  Every transition is also added to the totals of the site
+    of the event that ends it (sites).
+    """
+    def NewJob(self):
+        """
+        Count a new job, and return the JobState to pass to AddEvent.
+        """
+        self.num_jobs += 1
+        return JobState()
+
+    def AddEvent(self, state, event, time, site):
+        """
+        Accumulate one event of a job.
+
+        Arguments:
+        state - JobState of the job, from NewJob
+        event - the event code
+        time - time of the event
+        site - site the event is attributed to
+        """
+        sites = self.sites
+        try:
+            site_id = sites.ids[site]
+        except KeyError:
+            site_id = sites.SiteId(site)
+        self.occurances[event] = self.occurances.get(event, 0) + 1
+        sites.occurances[site_id * event_slots + event] += 1
+        if event == self.evict_event:
+            self.evict_places[site] = self.evict_places.get(site, 0) + 1
+
+        # A job counts for the last site it used
+        if state.site != site_id:
+            if state.site is not None:
+                sites.num_jobs[state.site] -= 1
+            sites.num_jobs[site_id] += 1
+            state.site = site_id
+
+        if state.event is not None:
+            if state.pending is not None:
+                pair, slot = state.pending
+                self.pair_occurances[pair] = self.pair_occurances.get(pair, 0) + 1
+                sites.pair_occurances[slot] += 1
+
+            pair = (state.event, event)
+            slot = site_id * pair_slots + state.event * event_slots + event
+            delta = time - state.time
+            self.pair_time[pair] = self.pair_time.get(pair, 0) + delta
+            sites.pair_time[slot] += delta
+
+            # Only the last occurrence of a pair counts, replace the previous one
+            if state.last.has_key(pair):
+                old_delta, old_slot = state.last[pair]
+                self.last_pair_time[pair] += delta - old_delta
+                sites.last_pair_time[old_slot] -= old_delta
+            else:
+                self.last_pair_time[pair] = self.last_pair_time.get(pair, 0) + delta
+            sites.last_pair_time[slot] += delta
+            state.last[pair] = (delta, slot)
+            state.pending = (pair, slot)
+
+        state.event = event
+        state.time = time
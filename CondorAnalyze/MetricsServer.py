@@ -0,0 +1,96 @@
+#!/usr/bin/python
+
+#
+# Local HTTP service of the metrics of live userlogs (--serve).
+#
+# The Analyzer keeps following the logs in the main thread, and after every
+# refresh that found new events it replaces its published snapshot: every
+# document serialized to JSON once.  The server threads only look the
+# requested path up in the current snapshot, so a request never parses or
+# computes anything.
+#
+
+import json
+import threading
+import BaseHTTPServer
+import SocketServer
+
+
+def Serialize(documents):
+    """
+    Turn {path: document} into the {path: JSON text} a MetricsServer
+    publishes, adding an index of the paths at "/".
+    """
+    snapshot = {}
+    for path, document in documents.items():
+        snapshot[path] = json.dumps(document, sort_keys=True)
+    snapshot["/"] = json.dumps(sorted(snapshot.keys()))
+    return snapshot
+
+
+class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers GET requests from the snapshot of the server.
+    """
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if (len(path) > 1) and path.endswith('/'):
+            path = path[:-1]
+        body = self.server.snapshot.get(path)
+        if body is None:
+            self.send_error(404, "No metrics at %s" % path)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # No line on stderr for every request
+        pass
+
+
+class MetricsServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    HTTP server of a snapshot of JSON documents, running in a background
+    thread.
+
+    Attributes:
+    snapshot - path -> JSON text, replaced as a whole by Publish
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        """Initializer
+
+        Arguments:
+        address - (host, port) to listen on
+
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, address, MetricsHandler)
+        self.snapshot = Serialize({})
+        self.thread = None
+
+    def Publish(self, documents):
+        """
+        Serve 'documents' ({path: document}) from now on.
+        """
+        # Replacing the reference is atomic, a request sees either snapshot
+        self.snapshot = Serialize(documents)
+
+    def Start(self):
+        """
+        Start serving in a background thread.
+        """
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def Stop(self):
+        """
+        Stop serving, and close the socket.
+        """
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,407 @@
+#!/usr/bin/python
+
+#
+# Binning of the per-site running job counts into fixed time intervals.
+#
+# The input is, for every site, the (time, +1/-1) changes recorded by
+# ModifySite.  They are folded into cells of rollup_levels[0] seconds as
+# they arrive (SiteCells), so the memory used grows with the sites and the
+# length of the workflow, not with the number of events.  A cell keeps the
+# submissions and terminations in it and the peak of the running jobs
+# relative to its start, the running jobs before it are the sum of the
+# cells before.
+#
+# The occupancy and submissions of any multiple of the cells are reduced
+# from the cells (Rollup), the max of the running jobs and the sum of the
+# counts, so changing the interval of a graph is O(cells), not O(events).
+#
+
+from array import array
+from bisect import bisect_left
+
+import numpy
+
+
+# Intervals the graphs and exports choose from, finest first, each a
+# multiple of the one before
+rollup_levels = (60, 60*5, 60*60, 60*60*24)
+
+# Most intervals a graph should show
+graph_bins = 500
+
+
+def FitInterval(span, bins=graph_bins):
+    """
+    Return the finest of rollup_levels that covers 'span' seconds in at most
+    'bins' intervals (the coarsest one if none does).
+    """
+    for level in rollup_levels:
+        if span <= level * bins:
+            return level
+    return rollup_levels[-1]
+
+
+def RunSummary(changes):
+    """
+    Return the (ups, downs, peak) of the (time, change) list 'changes' of
+    one cell: the number of +1 and -1 changes, and the highest number of
+    running jobs after any of them relative to the start of the cell, with
+    the changes sorted like the (time, change) tuples.
+    """
+    ups = downs = total = 0
+    peak = None
+    for (time, change) in sorted(changes):
+        total += change
+        if change > 0:
+            ups += 1
+        else:
+            downs += 1
+        if (peak is None) or (total > peak):
+            peak = total
+    return (ups, downs, peak)
+
+
+def FoldCell(cells, column, ups, downs, peak):
+    """
+    Add the changes (ups, downs, peak) of 'column' to the [columns, ups,
+    downs, peaks] arrays 'cells' of a site, after those it already holds.
+    """
+    (columns, cell_ups, cell_downs, peaks) = cells
+    if (not columns) or (column > columns[-1]):
+        columns.append(column)
+        cell_ups.append(ups)
+        cell_downs.append(downs)
+        peaks.append(peak)
+        return
+    index = bisect_left(columns, column)
+    if columns[index] == column:
+        peaks[index] = max(peaks[index], cell_ups[index] - cell_downs[index] + peak)
+        cell_ups[index] += ups
+        cell_downs[index] += downs
+    else:
+        columns.insert(index, column)
+        cell_ups.insert(index, ups)
+        cell_downs.insert(index, downs)
+        peaks.insert(index, peak)
+
+
+class SiteCells:
+    """
+    The changes in the running jobs of every site, folded into cells of
+    'resolution' seconds as they arrive.
+
+    Cell k holds the changes at (k-1)*resolution < time <= k*resolution,
+    everything up to the first cell in cell 1, times relative to the first
+    event.  The changes of a site are collected in a run while they fall
+    in the same cell, and when one of another cell arrives the run is
+    folded into its cell (RunSummary).  A run folded into a cell that
+    already holds one is counted after it, so the peaks are exact for
+    changes that arrive in time order (as a log is written), and logs read
+    out of time order can only shift a peak within its cell.
+
+    Attributes:
+    resolution - length of a cell, in seconds
+    names - the sites, in the order they were first seen
+    ids - site -> index in 'names'
+    cells - per site, [columns, ups, downs, peaks] arrays of the folded
+            cells, in column order
+    runs - per site, [column, list of (time, change)] of the run not folded
+           yet, or None
+    last - per site, the last cell with a change
+    version - number of changes added, to tell when a Rollup is stale
+    changed - ids of the sites with changes added since the Rollup was last
+              brought up to date
+    """
+    def __init__(self, resolution):
+        """
+        Arguments:
+        resolution - length of a cell, in seconds
+        """
+        self.resolution = resolution
+        self.names = []
+        self.ids = {}
+        self.cells = []
+        self.runs = []
+        self.last = []
+        self.version = 0
+        self.changed = set()
+
+    def SiteId(self, site):
+        """
+        Return the index of 'site', adding it the first time.
+        """
+        try:
+            return self.ids[site]
+        except KeyError:
+            site_id = self.ids[site] = len(self.names)
+            self.names.append(site)
+            self.cells.append([array('l'), array('l'), array('l'), array('l')])
+            self.runs.append(None)
+            self.last.append(0)
+            return site_id
+
+    def Column(self, time):
+        """
+        Return the cell of the relative 'time'.
+        """
+        return max(-(-time // self.resolution), 1)
+
+    def Add(self, site, time, change):
+        """
+        Add the change (+1 or -1) of the running jobs of 'site' at 'time',
+        in seconds since the first event.
+        """
+        site_id = self.SiteId(site)
+        column = self.Column(time)
+        run = self.runs[site_id]
+        if (run is not None) and (run[0] == column):
+            run[1].append( (time, change) )
+        else:
+            if run is not None:
+                FoldCell(self.cells[site_id], run[0], *RunSummary(run[1]))
+            self.runs[site_id] = [column, [(time, change)]]
+        if column > self.last[site_id]:
+            self.last[site_id] = column
+        self.version += 1
+        self.changed.add(site_id)
+
+    def AddChanges(self, sites):
+        """
+        Add the site -> list of (time, change) 'sites', each site in time
+        order.
+        """
+        for site in sites.keys():
+            for (time, change) in sorted(sites[site]):
+                self.Add(site, time, change)
+
+    def Fold(self):
+        """
+        Fold the runs of all sites into their cells, the changes added
+        after this are counted after them.  Done at the end of each log.
+        """
+        for site_id in range(len(self.names)):
+            run = self.runs[site_id]
+            if run is not None:
+                FoldCell(self.cells[site_id], run[0], *RunSummary(run[1]))
+                self.runs[site_id] = None
+
+    def Cells(self, site_id):
+        """
+        Return the (columns, ups, downs, peaks) numpy arrays of a site,
+        its open run included.
+        """
+        cells = self.cells[site_id]
+        run = self.runs[site_id]
+        if run is not None:
+            cells = [array('l', column) for column in cells]
+            FoldCell(cells, run[0], *RunSummary(run[1]))
+        return tuple([numpy.array(column, dtype=numpy.int64) for column in cells])
+
+    def Merge(self, site, cells, last, shift=0):
+        """
+        Add the (columns, ups, downs, peaks) 'cells' of 'site' from another
+        SiteCells (a partial aggregate) after those already held, moved
+        'shift' cells later.
+        """
+        site_id = self.SiteId(site)
+        (columns, ups, downs, peaks) = cells
+        for index in range(len(columns)):
+            FoldCell(self.cells[site_id], int(columns[index]) + shift, int(ups[index]), int(downs[index]), int(peaks[index]))
+        if last:
+            self.last[site_id] = max(self.last[site_id], last + shift)
+        self.version += 1
+        self.changed.add(site_id)
+
+
+def ChangeCells(sites, resolution):
+    """
+    Return the SiteCells of the site -> list of (time, change) 'sites'.
+    """
+    cells = SiteCells(resolution)
+    cells.AddChanges(sites)
+    return cells
+
+
+class Rollup:
+    """
+    The running jobs of every site and the submissions / terminations in
+    the cells of a SiteCells, ready to be reduced to any interval.
+
+    Only the cells a site has events in are kept, as runs sorted by (site,
+    column), so the memory used grows with the busy cells and not with
+    sites x the length of the workflow.  When events are added to the
+    SiteCells (a followed log) Update only derives the cells of the sites
+    that changed again.
+
+    Attributes:
+    resolution - length of a cell, in seconds
+    names - the sites, 'site' indexes them
+    site, column, cell_max - one entry per site and cell (0 based column)
+                             with events, sorted by (site, column): the
+                             highest number of running jobs of the site
+                             among its events in the cell
+    last - cell (1 based) of the last event of each site, 0 without events
+    counts - {'Submissions': counts, 'Terminations': counts} where counts[k]
+             is the number in cell k (1 based)
+    levels - interval -> Occupancy derived so far
+    parts - per site, the (column, cell_max, columns, ups, downs) it adds
+            to 'column', 'cell_max' and 'counts'
+    """
+    def __init__(self, cells):
+        """
+        Arguments:
+        cells - SiteCells of the sites
+        """
+        self.resolution = cells.resolution
+        self.names = []
+        self.parts = []
+        self.counts = {'Submissions': numpy.zeros(1, dtype=numpy.int64),
+                       'Terminations': numpy.zeros(1, dtype=numpy.int64)}
+        cells.changed = set(range(len(cells.names)))
+        self.Update(cells)
+
+    def AddCounts(self, name, columns, counts, sign):
+        """
+        Add 'sign' times the 'counts' in cells 'columns' to counts[name].
+        """
+        if not len(columns):
+            return
+        total = self.counts[name]
+        if columns[-1] >= len(total):
+            grown = numpy.zeros(max(int(columns[-1]) + 1, 2 * len(total)), dtype=numpy.int64)
+            grown[:len(total)] = total
+            total = self.counts[name] = grown
+        total[columns] += sign * counts
+
+    def Update(self, cells):
+        """
+        Derive the cells of the sites of 'cells' that changed since the
+        last Update again.
+        """
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        self.names = list(cells.names)
+        self.last = numpy.array(cells.last, dtype=numpy.int64)
+        while len(self.parts) < len(self.names):
+            self.parts.append( (empty, empty, empty, empty, empty) )
+        for site_id in sorted(cells.changed):
+            (old_column, old_max, old_columns, old_ups, old_downs) = self.parts[site_id]
+            self.AddCounts('Submissions', old_columns, old_ups, -1)
+            self.AddCounts('Terminations', old_columns, old_downs, -1)
+
+            (column, ups, downs, peaks) = cells.Cells(site_id)
+            self.AddCounts('Submissions', column, ups, 1)
+            self.AddCounts('Terminations', column, downs, 1)
+
+            # Running jobs at the start of each cell, plus its peak
+            net = ups - downs
+            cell_max = numpy.cumsum(net) - net + peaks
+
+            # The cell of the last event of a site is never closed, at any
+            # level, so it is not kept
+            inside = column < self.last[site_id]
+            self.parts[site_id] = (column[inside] - 1, numpy.maximum(cell_max[inside], 0), column, ups, downs)
+        cells.changed = set()
+
+        self.site = numpy.concatenate([empty] + [numpy.zeros(len(self.parts[site_id][0]), dtype=numpy.int64) + site_id
+                                                 for site_id in range(len(self.parts))])
+        self.column = numpy.concatenate([empty] + [part[0] for part in self.parts])
+        self.cell_max = numpy.concatenate([empty] + [part[1] for part in self.parts])
+        self.levels = {}
+
+    def Level(self, interval):
+        """
+        Return the Occupancy of 'interval' seconds, a multiple of the
+        resolution.
+        """
+        if not self.levels.has_key(interval):
+            self.levels[interval] = Occupancy(self, interval)
+        return self.levels[interval]
+
+
+class Occupancy:
+    """
+    Per interval occupancy of every site.
+
+    Attributes:
+    interval - length of an interval, in seconds
+    names - the sites, in the order of the rows of 'maxima'
+    maxima - dense sites x intervals matrix, the highest number of running
+             jobs of a site during each interval (intervals without events
+             repeat the value before them, unused cells are 0)
+    lengths - number of intervals each site really covers
+    leading - number of intervals at the start of each site without events
+    submissions - {'Submissions': {time: count}, 'Terminations': {time: count}}
+                  where time is the end of the interval
+    """
+    def __init__(self, rollup, interval):
+        """
+        Arguments:
+        rollup - Rollup of the sites, its resolution dividing 'interval'
+        interval - length of an interval, in seconds
+        """
+        if interval % rollup.resolution:
+            raise Exception("An interval of %i seconds is not a multiple of the %i second rollup" % (interval, rollup.resolution))
+        factor = interval // rollup.resolution
+        self.interval = interval
+        self.names = rollup.names
+        self.submissions = {'Submissions': {}, 'Terminations': {}}
+
+        # Interval k holds the finest intervals (k-1)*factor+1 to k*factor
+        for name in self.submissions.keys():
+            counts = rollup.counts[name][1:]
+            padded = numpy.zeros(-(-len(counts) // factor) * factor, dtype=numpy.int64)
+            padded[:len(counts)] = counts
+            per_bucket = padded.reshape(-1, factor).sum(axis=1)
+            for k in numpy.nonzero(per_bucket)[0]:
+                self.submissions[name][interval * (int(k) + 1)] = int(per_bucket[k])
+
+        used = numpy.maximum(-(-rollup.last // factor) - 1, 0)
+        self.lengths = used
+        width = 0
+        if len(used):
+            width = int(used.max())
+
+        rows = len(self.names)
+        maxima = numpy.zeros((rows, width), dtype=numpy.int64)
+        has_events = numpy.zeros((rows, width), dtype=bool)
+        level = rollup.column // factor
+        inside = level < width
+        site = rollup.site[inside]
+        level = level[inside]
+        if len(site):
+            # Still sorted by (site, column), the max of each run of a level
+            first = numpy.concatenate(([True], (site[1:] != site[:-1]) | (level[1:] != level[:-1])))
+            segment = numpy.nonzero(first)[0]
+            maxima[site[segment], level[segment]] = numpy.maximum.reduceat(rollup.cell_max[inside], segment)
+            has_events[site[segment], level[segment]] = True
+
+        # Intervals without events repeat the last value before them
+        columns = numpy.arange(width)
+        source = numpy.where(has_events, columns, 0)
+        numpy.maximum.accumulate(source, axis=1, out=source)
+        maxima = maxima[numpy.arange(rows)[:, None], source]
+        maxima[columns[None, :] >= used[:, None]] = 0
+        self.maxima = maxima
+
+        # No site covers a whole interval, there is nothing to look for
+        leading = used
+        if width:
+            leading = numpy.where(has_events.any(axis=1), has_events.argmax(axis=1), used)
+        self.leading = numpy.minimum(leading, used)
+
+    def SiteSeries(self, start_time):
+        """
+        Return {site: {time: running jobs}} with one entry per interval for
+        every site, times starting at 'start_time'.
+        """
+        series = {}
+        width = self.maxima.shape[1]
+        for row, name in enumerate(self.names):
+            values = self.maxima[row].tolist()
+            # The intervals before the first event of a site are 0.0
+            for index in range(int(self.leading[row])):
+                values[index] = 0.0
+            series[name] = {}
+            for i in range(width):
+                series[name][(i * self.interval) + start_time] = values[i]
+        return series
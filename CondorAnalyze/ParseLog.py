@@ -9,147 +9,27 @@
 
 import os, sys
 import optparse
-import re
+import multiprocessing
+from array import array
 from time import *
 
+import numpy
 from graphtool.graphs.basic import *
 
-submissions = {'Submissions': {}, 'Terminations': {}}
-def AddSubmission(site, interval, value):
-    global submissions
-        
-    if value > 0:
-        if not submissions['Submissions'].has_key(interval):
-            submissions['Submissions'][interval] = 1
-        else:
-            submissions['Submissions'][interval] += 1
-        
-    else:
-        if not submissions['Terminations'].has_key(interval):
-            submissions['Terminations'][interval] = 1
-        else:
-            submissions['Terminations'][interval] += 1
-
-    
-    return
-        
-    if len(submissions[site]) == 0:
-        if value > 0:
-            submissions[site][str(interval)] = ( 1, 0 )
-        else:
-            submissions[site][str(interval)] = ( 0, 1 )
-    else:
-        if submissions[site].has_key(str(interval)):
-            (subs, dones) = submissions[site][str(interval)]
-            if value > 0:
-                subs += 1
-            else:
-                dones += 1
-            submissions[site][str(interval)] = (subs, dones)
-        else:
-            if value > 0:
-                submissions[site][str(interval)] = ( 1, 0 )
-            else:
-                submissions[site][str(interval)] = ( 0, 1 )
-    
-    
-
-sites = {}
-def ModifySite(site, ts, num):
-    global sites
-    if not sites.has_key(site):
-        sites[site] = []
-        
-    #if len(sites[site]) == 0:
-    cur_num = num
-    #else:
-    #    cur_num = sites[site][len(sites[site])-1][1] + num
-    sites[site].append( (ts, cur_num) )
-    
-    
-
-def SummarizeSites(interval):
-    global sites
-    new_sites = {}
-    for site in sites.keys():
-        #print "presort"
-        #print sites[site]
-        sites[site].sort()
-        #print "postsort"
-        #print sites[site]
-        new_sites[site] = []
-        running_total = 0
-        for event in sites[site]:
-            running_total += event[1]
-            new_sites[site].append ( ( event[0], running_total ) )
-    sites = new_sites
-
-    sites_return = {}
-    
-    # For every site
-    for key in sites.keys():
-        sites_return[key] = []
-        cur_int = 1
-        cur_tot = 0
-        cur_num = 0
-        cur_max = 0
-        sub_val = 0
-        
-        # For every event in site
-        while len(sites[key]):
-            
-            # If the first event is inside the interval
-            if sites[key][0][0] > (interval * cur_int):
-                
-                # if there has been no events in this time frame
-                if cur_num == 0:
-                    
-                    # If it is the first event in the list
-                    if len(sites_return[key]) == 0:
-                        sites_return[key].append( 0.0 )
-                    else:
-                        # Copy the last number
-                        #sys.stderr.write("Value of last: %lf\n%s\n\n" % (sites_return[key][len(sites_return[key])-1], str(sites_return[key])))
-                        sites_return[key].append(sites_return[key][len(sites_return[key])-1])
-                else:
-                    # If there have been events in this time frame
-                    sites_return[key].append( cur_max )
-                    #sites_return[key].append( float(cur_tot) / float(cur_num) )
-                cur_num = 0
-                cur_tot = 0
-                cur_max = 0
-                cur_int += 1
-            else:
-                # Else if there is an event in the interval
-                cur_num += 1
-                
-                AddSubmission(key, interval*cur_int, sites[key][0][1] - sub_val )
-                sub_val = sites[key][0][1]
-                
-                # Grab the max
-                if sites[key][0][1] > cur_max:
-                    cur_max = sites[key][0][1]
-                cur_tot += sites[key][0][1]
-                
-                # Delete the first element
-                sites[key].pop(0)
-                
-    # Extend the shorter sites with 0's
-    max_len = max(len(sites_return[i]) for i in sites_return.keys())
-    for key in sites_return.keys():
-        last_value = sites_return[key][len(sites_return[key])-1]
-        while len(sites_return[key]) < max_len:
-            sites_return[key].append(0)
-            #sites_return[key].append(last_value)
-           
-    new_sites = {} 
-    for key in sites_return.keys():
-        new_sites[key] = {}
-        for i in range(max_len):
-            new_sites[key][(i*interval) + min_time] = sites_return[key][i]
-        
-    #print [len(sites_return[i]) for i in sites_return.keys()]
-    return new_sites
+from UserLogReader import ReadDecoded, LogTail, SplitLog, WindowRange, IsCompressed, Unquote, decoded_attributes
+from CondorTime import EpochTime, ParseTime
+from EventCache import EventCache, Fingerprint
+from EventStore import EventStore
+from Metrics import Metrics, StreamingMetrics, event_slots
+from JobSpill import JobSpill, CurrentRSS
+from Occupancy import Occupancy, Rollup, SiteCells, FitInterval, rollup_levels, graph_bins
+from Export import WriteTable, export_formats
+from Profile import Profiler, NullProfiler
+from JobIndex import JobIndex, ParseJobRange, ScanEvents, JobRangeError
+from MetricsServer import MetricsServer
+from Aggregate import MakeAggregate, WriteAggregate, ReadAggregate, AggregateError
+from Checkpoint import WriteCheckpoint, ReadCheckpoint, CheckpointError, DecodeJob
+from Quantiles import Distributions, LiveDistributions
 
 
 class Job:
@@ -172,15 +52,17 @@ class Job:
     HOLD = 5
     RELEASE = 6
     EVICT = 7
-    def __init__(self, jobid):
+    def __init__(self, jobid, analyzer=None):
         """Initializer
         
         Arguments:
         jobid - Unique string given to this job (usually
                 the condor job number)
+        analyzer - Analyzer the running jobs of the sites are recorded in
         
         """
         self.jobid = jobid
+        self.analyzer = analyzer
         self.events = []
         self.last_site = ""
     
@@ -198,18 +80,22 @@ class Job:
         if site:
             self.last_site = site
         self.events.append( (event, time, self.last_site) )
-        global min_time
-        if event == Job.RUNNING:
-            #if (len(self.events) > 2) and (self.events[len(self.events) - 2][0] != self.GRID_SUBMIT):
-            #   ModifySite(self.last_site, time - min_time, -1)
-            #   print "running at new site %s" % self.last_site
-            ModifySite(self.last_site, time - min_time, 1)
-            #print "running at site %s" % self.last_site
-        elif (event == Job.EVICT) or (event == Job.STOP):
-            ModifySite(self.last_site, time - min_time, -1)
-            #print "ending at site %s" % self.last_site
-        elif (event == Job.HOLD) and (self.events[len(self.events) - 2][0] == self.RUNNING):
-            ModifySite(self.last_site, time - min_time, -1)
+        self.UpdateSite(event, time, self.events[len(self.events) - 2][0])
+    
+    
+    def UpdateSite(self, event, time, previous):
+        """
+        Record the start or end of a running job at the last site.
+        
+        Arguments:
+        event - One of the Job.* constants, the event just added.
+        time - time of the event
+        previous - the event before it
+        
+        """
+        change = SiteChange(event, previous)
+        if change and (self.analyzer is not None):
+            self.analyzer.ModifySite(self.last_site, time - self.analyzer.min_time, change)
             
 
     
@@ -314,303 +200,1644 @@ class Job:
         return total_events
 
 
-jobs = {}
+def SiteChange(event, previous):
+    """
+    Return the change (+1, -1 or 0) in the number of jobs running at a site
+    caused by 'event', when it follows 'previous'.
+    """
+    if event == Job.RUNNING:
+        #if (len(self.events) > 2) and (self.events[len(self.events) - 2][0] != self.GRID_SUBMIT):
+        #   ModifySite(self.last_site, time - min_time, -1)
+        #   print "running at new site %s" % self.last_site
+        return 1
+    elif (event == Job.EVICT) or (event == Job.STOP):
+        return -1
+    elif (event == Job.HOLD) and (previous == Job.RUNNING):
+        return -1
+    return 0
 
 
-def SetEvent(event, time, jobid, site=None):
+class ColumnarJob(Job):
     """
-    Fill out the 'jobs' global dictionary.
+    A job whose events are kept in the shared EventStore columns instead
+    of a list of tuples.  Same interface as Job.
     """
-    global jobs
-    #jobid = event_re.group(1)
-    ts = getTime(time)
-    if not jobs.has_key(jobid):
-        jobs[jobid] = Job(jobid)
+    def __init__(self, jobid, store, analyzer=None):
+        """Initializer
+        
+        Arguments:
+        jobid - Unique string given to this job (usually
+                the condor job number)
+        store - EventStore holding the events of all jobs
+        analyzer - Analyzer the running jobs of the sites are recorded in
+        
+        """
+        self.jobid = jobid
+        self.analyzer = analyzer
+        self.store = store
+        self.index = store.AddJob(jobid)
+        self.last_site = ""
     
-    if site:
-        jobs[jobid].AddEvent(event, ts, site)
-    else:
-        jobs[jobid].AddEvent(event, ts)
+    def AddEvent(self, event, time, site=None):
+        """
+        Add an event to the store, see Job.AddEvent
+        """
+        if site:
+            self.last_site = site
+        previous = self.store.LastEvent(self.index)
+        self.store.AddEvent(self.index, event, time, self.last_site)
+        self.UpdateSite(event, time, previous)
+    
+    def GetEvents(self, event):
+        return self.store.GetEvents(self.index, event)
     
+    def GetTimeOfLast(self, eventa, eventb=None):
+        return self.store.GetTimeOfLast(self.index, eventa, eventb)
+    
+    def GetTimeOfFirst(self, event):
+        return self.store.GetTimeOfFirst(self.index, event)
     
-min_time = 0
-max_time = 0
+    def GetTimeBetween(self, eventa, eventb):
+        return self.store.GetTimeBetween(self.index, eventa, eventb)
+    
+    def GetEventOccurances(self, eventa, eventb=None):
+        return self.store.GetEventOccurances(self.index, eventa, eventb)
+    
+    def GetMultEventOccurances(self, eventa, eventb):
+        return self.store.GetEventOccurances(self.index, eventa, eventb)
+
 
-def getTime(ts):
+class StreamingJob(Job):
     """
-    Get a condor timestamp, and translate to seconds since unix epoch.
+    A job that keeps no event history, its events go straight into the
+    StreamingMetrics totals.  Only the totals (and the site graphs) are
+    available for these jobs, not the Get* queries.
     """
-    #12/16 12:32:17
-    # EventTime = "2011-06-14T02:29:31"
-    t = strptime(ts, "\"%Y-%m-%dT%H:%M:%S\"")
-    #t = strptime(ts + " 2009", "%m/%d %H:%M:%S %Y")
-    cur_time = int(mktime(t))
-    global max_time
-    global min_time
-    if cur_time > max_time:
-        max_time = cur_time
-    if min_time == 0:
-        min_time = cur_time
-    return cur_time
-    #return mktime(t)/3600
-
-
-def ParseFile(file):
+    def __init__(self, jobid, stream, analyzer=None):
+        """Initializer
+        
+        Arguments:
+        jobid - Unique string given to this job (usually
+                the condor job number)
+        stream - StreamingMetrics accumulating the events of all jobs
+        analyzer - Analyzer the running jobs of the sites are recorded in
+        
+        """
+        self.jobid = jobid
+        self.analyzer = analyzer
+        self.stream = stream
+        self.state = stream.NewJob()
+        self.last_site = ""
+        self.totals = {}
+    
+    def AddEvent(self, event, time, site=None):
+        """
+        Add the event to the running totals, see Job.AddEvent
+        """
+        if site:
+            self.last_site = site
+        previous = self.state.event
+        previous_time = self.state.time
+        self.stream.AddEvent(self.state, event, time, self.last_site)
+        if (previous is not None) and (self.analyzer is not None):
+            self.analyzer.distributions.Transition(self.totals, (previous, event), time - previous_time, self.last_site)
+        self.UpdateSite(event, time, previous)
+
+
+class RetiringJob(Job):
     """
-    Parse the file in string 'file', and fill out global 'jobs' variable.
+    A job of a bounded memory Analyzer.  While it is active its events can
+    be moved to the spill file (Flush) to stay under the memory limit, they
+    are read back when the whole history is needed.
     """
-    local_submit = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job submitted from host")
-    grid_submit = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job submitted to Globus") #\s*GridResource: gt2 ([\w|\-|\/|\.]+)")
-    grid_site = re.compile("\s+GridResource: gt2 ([\w|\-|\/|\.]+)")
-    start = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job executing on host")
-    hold = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job was held")
-    release = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job was released")
-    evict = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job was evicted")
-    terminate = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job terminated")
-    
-    f = open(file)
-    line_counter = 0
-    job_event = {}
-    while 1:
-        line = f.readline()
+    def __init__(self, jobid, spill, analyzer=None):
+        """Initializer
         
-        if not line:
-            break
- 
-        if "..." in line:
-            # Do stuff, end of event
-            if job_event.has_key("MyType"):
-               if job_event["MyType"] == "\"ExecuteEvent\"": 
-                   SetEvent(Job.RUNNING, job_event["EventTime"], ".".join([job_event["Cluster"], job_event["Proc"]]) , job_event["GLIDEIN_GatekeeperB"])
-               elif job_event["MyType"] == "\"JobTerminatedEvent\"":
-                   SetEvent(Job.STOP, job_event["EventTime"], ".".join([job_event["Cluster"], job_event["Proc"]]), job_event["GLIDEIN_GatekeeperB"])
-               elif job_event["MyType"] == "\"JobEvictedEvent\"" or job_event["MyType"] == "\"JobReconnectFailedEvent\"":
-                   SetEvent(Job.EVICT, job_event["EventTime"], ".".join([job_event["Cluster"], job_event["Proc"]]))
-               elif job_event["MyType"] == "\"SubmitEvent\"":
-                   SetEvent(Job.LOCAL_SUBMIT, job_event["EventTime"], ".".join([job_event["Cluster"], job_event["Proc"]]))
-
-            
-            job_event = {}
-            continue
+        Arguments:
+        jobid - Unique string given to this job (usually
+                the condor job number)
+        spill - JobSpill the event history is moved to
+        analyzer - Analyzer the running jobs of the sites are recorded in
         
-        # Else read in the event
+        """
+        Job.__init__(self, jobid, analyzer)
+        self.spill = spill
+        self.segments = []
+        self.last_event = None
+    
+    def AddEvent(self, event, time, site=None):
+        """
+        Add an event to the events in memory, see Job.AddEvent
+        """
+        if site:
+            self.last_site = site
+        previous = self.last_event
+        self.events.append( (event, time, self.last_site) )
+        self.last_event = event
+        self.UpdateSite(event, time, previous)
+    
+    def Flush(self):
+        """
+        Move the events in memory to the spill file.
+        """
+        if self.events:
+            self.segments.append(self.spill.Write(self.jobid, self.events))
+            self.events = []
+    
+    def History(self):
+        """
+        Return every (event, time, site) of this job, flushed or not.
+        """
+        events = []
+        for offset in self.segments:
+            events.extend(self.spill.ReadAt(offset)[1])
+        events.extend(self.events)
+        return events
+
+    def Retire(self, history):
+        """
+        Write the whole 'history' of this terminated job to the spill file
+        and drop it from memory.
+        """
+        self.spill.Write(self.jobid, history, True)
+        self.segments = []
+        self.events = []
+
+
+# The transitions each report metric is made of
+
+REMOTE_QUEUE_TIME = (   (Job.GRID_SUBMIT, Job.RUNNING), \
+                        (Job.EVICT, Job.RUNNING), \
+                        (Job.GRID_SUBMIT, Job.HOLD), \
+                        (Job.EVICT, Job.HOLD) )
+
+MATCHING_TIME = (       (Job.LOCAL_SUBMIT, Job.GRID_SUBMIT), \
+                        (Job.LOCAL_SUBMIT, Job.HOLD), \
+                        (Job.HOLD, Job.RELEASE), \
+                        (Job.RELEASE, Job.HOLD), \
+                        (Job.HOLD, Job.GRID_SUBMIT) )
+
+QUEUE_TIME = (          (Job.LOCAL_SUBMIT, Job.GRID_SUBMIT), \
+                        (Job.GRID_SUBMIT, Job.RUNNING), \
+                        (Job.EVICT, Job.RUNNING), \
+                        (Job.GRID_SUBMIT, Job.HOLD), \
+                        (Job.LOCAL_SUBMIT, Job.HOLD), \
+                        (Job.RELEASE, Job.HOLD), \
+                        (Job.HOLD, Job.GRID_SUBMIT), \
+                        (Job.HOLD, Job.RELEASE), \
+                        (Job.LOCAL_SUBMIT, Job.RUNNING) )
+
+RUNNING_TIME = (        (Job.RUNNING, Job.EVICT), \
+                        (Job.RUNNING, Job.HOLD), \
+                        (Job.RUNNING, Job.STOP) )
+
+WASTED_TIME = (         (Job.RUNNING, Job.EVICT), )
+                        #(Job.RUNNING, Job.HOLD) )
+
+GOOD_RUNNING_TIME = (   (Job.RUNNING, Job.STOP), )
+
+PREEMPTIONS = (         (Job.EVICT), \
+                        (Job.RUNNING, Job.HOLD) )
+
+# The per-job durations whose distribution is reported: name, label in
+# the report and the transitions they are made of
+DISTRIBUTIONS = ( ('queue_time', "Queue Time", QUEUE_TIME), \
+                  ('remote_queue_time', "Remote Queue Time", REMOTE_QUEUE_TIME), \
+                  ('matching_time', "Matching Time", MATCHING_TIME), \
+                  ('running_time', "Running Time", RUNNING_TIME), \
+                  ('wasted_time', "Wasted Time", WASTED_TIME) )
+
+# Columns of the exported per-job table: name, Metrics method and its
+# arguments
+JOB_COLUMNS = ( ('queue_time', 'TotalTime', QUEUE_TIME), \
+                ('matching_time', 'TotalTime', MATCHING_TIME), \
+                ('remote_queue_time', 'TotalTime', REMOTE_QUEUE_TIME), \
+                ('running_time', 'TotalTime', RUNNING_TIME), \
+                ('wasted_time', 'TotalTime', WASTED_TIME), \
+                ('good_running_time', 'LastTotalTime', GOOD_RUNNING_TIME), \
+                ('preemptions', 'EventOccurances', PREEMPTIONS), \
+                ('starts', 'EventOccurances', (Job.RUNNING,)) )
+
+
+# MyType of an event -> the Job event it is recorded as.  The grid submit,
+# hold and release events only come from classic format logs.
+event_codes = { "\"ExecuteEvent\"": Job.RUNNING,
+                "\"JobTerminatedEvent\"": Job.STOP,
+                "\"JobEvictedEvent\"": Job.EVICT,
+                "\"JobReconnectFailedEvent\"": Job.EVICT,
+                "\"SubmitEvent\"": Job.LOCAL_SUBMIT,
+                "\"GridSubmitEvent\"": Job.GRID_SUBMIT,
+                "\"JobHeldEvent\"": Job.HOLD,
+                "\"JobReleaseEvent\"": Job.RELEASE }
+
+# Names of the Job events, for printing the history of a job
+event_names = { Job.LOCAL_SUBMIT: "Submitted",
+                Job.GRID_SUBMIT: "Grid submitted",
+                Job.RUNNING: "Running",
+                Job.STOP: "Terminated",
+                Job.HOLD: "Held",
+                Job.RELEASE: "Released",
+                Job.EVICT: "Evicted" }
+
+# Quantiles of the distributions printed in the report
+report_quantiles = (0.5, 0.9, 0.99)
+
+
+def NewDistributions(live=False):
+    """
+    Return empty Distributions of the DISTRIBUTIONS durations, or
+    LiveDistributions if 'live'.
+    """
+    metrics = [(name, pairs) for (name, label, pairs) in DISTRIBUTIONS]
+    if live:
+        return LiveDistributions(metrics)
+    return Distributions(metrics)
+
+# Events between two looks at the memory use of a bounded memory Analyzer
+memory_check_interval = 10000
+
+# After a flush, how much (as a fraction) the resident memory has to grow
+# before the active jobs are flushed again.  Freed memory is rarely given
+# back to the system, so without it a process staying above the limit
+# would flush every job at every check.
+memory_flush_growth = 0.1
+
+# Events in memory a job needs before it is worth a spill segment (one
+# event takes about as much memory as the segment offset kept for it)
+memory_flush_events = 2
+
+
+class Analyzer:
+    """
+    The analysis of one workflow: its jobs, the running jobs of each site and
+    the report drawn from them.  Analyzers share no state, so several
+    workflows can be parsed and reported side by side in one process.
+
+    Attributes:
+    jobs - jobid -> Job
+    cells - SiteCells the changes in the running jobs of every site are
+            folded into, at rollup_levels[0] seconds
+    changes - site -> list of (time - min_time, change in running jobs), only
+              recorded when set to a dictionary (ParsePartial)
+    submissions - {'Submissions': {time: count}, 'Terminations': {time: count}}
+                  filled in by SummarizeSites
+    min_time - time of the first event, in seconds since epoch
+    max_time - time of the latest event
+    latex - output the report in a latex compatible format
+    store - EventStore shared by all jobs when the columnar backend is used
+    stream - StreamingMetrics when the event history is not kept
+    cache - EventCache the decoded events of whole logs are read from, if any
+    spill - JobSpill terminated jobs are retired to (bounded memory mode)
+    retired - Metrics of the retired jobs
+    merged - Metrics of the partial aggregates merged by MergeAggregates
+    distributions - Distributions of the jobs no longer in 'jobs' (retired
+                    jobs and merged aggregates), with the streaming backend
+                    LiveDistributions of all the jobs
+    memory_limit - bytes of resident memory above which the history of the
+                   active jobs is flushed to the spill file as well
+    flush_above - bytes of resident memory the next flush waits for, raised
+                  past the memory in use after each flush
+    num_events - number of events recorded
+    window - (start, end) times (either may be None) the events are limited
+             to, or None for all of them
+    profiler - Profiler timing the stages of Report (a NullProfiler when
+               not profiling)
+    interval - seconds per interval of the graphs, exports and served
+               series, None to fit the length of the workflow (GetInterval)
+    rollup - Rollup of 'cells' the occupancy of every interval is reduced
+             from, updated when the cells change
+    documents - (interval, num_events, Documents) of the last Documents,
+                returned again until more events are parsed
+    walked - (num_events, Metrics, Distributions) of the last WalkJobs
+    """
+    def __init__(self, columnar=False, streaming=False, cache=None, latex=False, spill=None, memory_limit=None, window=None):
+        """Initializer
+
+        Arguments:
+        columnar - keep job events in packed numpy columns (EventStore)
+        streaming - only keep running totals, not the event history of jobs
+        cache - EventCache to read the decoded events of the logs from
+        latex - output the report in a latex compatible format
+        spill - JobSpill to retire terminated jobs to.  A terminated job is
+                folded into the 'retired' totals and dropped from memory,
+                its history is kept in the spill file.
+        memory_limit - with a spill, the resident memory (in bytes) to
+                       keep the process under
+        window - (start, end) in seconds since epoch, only the events in
+                 [start, end] are analyzed.  Either may be None.
+
+        """
+        self.jobs = {}
+        self.cells = SiteCells(rollup_levels[0])
+        self.changes = None
+        self.submissions = {'Submissions': {}, 'Terminations': {}}
+        self.min_time = 0
+        self.max_time = 0
+        self.latex = latex
+        self.cache = cache
+        self.store = None
+        self.stream = None
+        self.spill = spill
+        self.retired = Metrics(Job.EVICT)
+        self.merged = Metrics(Job.EVICT)
+        self.distributions = NewDistributions()
+        self.memory_limit = memory_limit
+        self.flush_above = memory_limit
+        self.unchecked = 0
+        self.num_events = 0
+        self.profiler = NullProfiler()
+        self.window = window
+        self.interval = None
+        self.rollup = None
+        self.rollup_key = None
+        self.documents = None
+        self.walked = None
+        if columnar:
+            self.store = EventStore()
+        elif streaming:
+            self.stream = StreamingMetrics(Job.EVICT)
+            self.distributions = NewDistributions(live=True)
+
+    def AddSubmission(self, site, interval, value):
+        submissions = self.submissions
+
+        if value > 0:
+            if not submissions['Submissions'].has_key(interval):
+                submissions['Submissions'][interval] = 1
+            else:
+                submissions['Submissions'][interval] += 1
+
+        else:
+            if not submissions['Terminations'].has_key(interval):
+                submissions['Terminations'][interval] = 1
+            else:
+                submissions['Terminations'][interval] += 1
+
+    def ModifySite(self, site, ts, num):
+        if self.changes is not None:
+            self.changes.setdefault(site, []).append( (ts, num) )
+        self.cells.Add(site, ts, num)
+
+    def SummarizeSites(self, interval):
+        """
+        Bin the running jobs of every site into 'interval' second intervals.
+
+        Returns {site: {time: max running jobs in the interval}}, and adds the
+        number of submissions / terminations of each interval to 'submissions'.
+        """
+        occupancy = self.GetOccupancy(interval)
+        for kind in occupancy.submissions.keys():
+            for when, count in occupancy.submissions[kind].items():
+                self.submissions[kind][when] = self.submissions[kind].get(when, 0) + count
+        return occupancy.SiteSeries(self.min_time)
+
+    def GetOccupancy(self, interval):
+        """
+        Return the Occupancy of the sites in 'interval' second intervals, a
+        multiple of rollup_levels[0].  Every interval is reduced from the
+        same Rollup of the cells, whose sites with events added since are
+        brought up to date first.
+        """
+        if self.rollup is None:
+            self.rollup = Rollup(self.cells)
+        elif self.rollup_key != self.cells.version:
+            self.rollup.Update(self.cells)
+        self.rollup_key = self.cells.version
+        return self.rollup.Level(interval)
+
+    def GetInterval(self):
+        """
+        Return the seconds per interval of the graphs and exports: 'interval'
+        if set, else the finest rollup level showing the whole workflow in
+        at most graph_bins intervals.
+        """
+        if self.interval is not None:
+            return self.interval
+        return FitInterval(self.max_time - self.min_time)
+
+    def SetEvent(self, event, time, jobid, site=None):
+        """
+        Fill out the 'jobs' dictionary.
+        """
+        #jobid = event_re.group(1)
+        self.SetEventTime(event, self.getTime(time), jobid, site)
+
+    def SetEventTime(self, event, ts, jobid, site=None):
+        """
+        SetEvent for an event whose time is already in seconds since epoch (and
+        was passed to TrackTime).
+        """
+        self.num_events += 1
+        jobs = self.jobs
+        if not jobs.has_key(jobid):
+            if self.store is not None:
+                jobs[jobid] = ColumnarJob(jobid, self.store, self)
+            elif self.stream is not None:
+                jobs[jobid] = StreamingJob(jobid, self.stream, self)
+                self.distributions.Start(jobs[jobid].totals)
+            elif self.spill is not None:
+                jobs[jobid] = RetiringJob(jobid, self.spill, self)
+            else:
+                jobs[jobid] = Job(jobid, self)
+
+        if site:
+            jobs[jobid].AddEvent(event, ts, site)
+        else:
+            jobs[jobid].AddEvent(event, ts)
+
+        # A terminated streaming job is done, only its totals are kept
+        if (self.stream is not None) and (event == Job.STOP):
+            del jobs[jobid]
+
+        if self.spill is not None:
+            if event == Job.STOP:
+                self.Retire(jobid)
+            if self.memory_limit is not None:
+                self.unchecked += 1
+                if self.unchecked >= memory_check_interval:
+                    self.unchecked = 0
+                    self.CheckMemory()
+
+    def Retire(self, jobid):
+        """
+        Fold the terminated job 'jobid' into the 'retired' totals, move its
+        history to the spill file and forget it.
+        """
+        job = self.jobs.pop(jobid)
+        history = job.History()
+        self.retired.AddJob(history, self.distributions)
+        job.Retire(history)
+
+    def CheckMemory(self):
+        """
+        Flush the history of the active jobs to the spill file when the
+        process uses more than memory_limit.  Only the jobs with at least
+        memory_flush_events events in memory are flushed, and after a flush
+        the next one waits until the memory in use grew by
+        memory_flush_growth.
+        """
+        rss = CurrentRSS()
+        if rss is None:
+            return
+        if rss <= self.memory_limit:
+            self.flush_above = self.memory_limit
+        if rss <= self.flush_above:
+            return
+        for job in self.jobs.values():
+            if len(job.events) >= memory_flush_events:
+                job.Flush()
+        after = CurrentRSS() or rss
+        self.flush_above = max(self.memory_limit, int(after * (1 + memory_flush_growth)))
+
+    def GetJob(self, jobid):
+        """
+        Return a Job holding the whole history of 'jobid', including what was
+        retired or flushed to the spill file, or None for an unknown job.
+        """
+        if self.spill is None:
+            return self.jobs.get(jobid)
+        events = self.spill.Read(jobid)
+        active = self.jobs.get(jobid)
+        if active is not None:
+            events.extend(active.History())
+        if not events:
+            return None
+        job = Job(jobid)
+        job.events = events
+        job.last_site = events[len(events) - 1][2]
+        return job
+
+    def getTime(self, ts):
+        """
+        Get a condor timestamp, and translate to seconds since unix epoch.
+        """
+        #12/16 12:32:17
+        # EventTime = "2011-06-14T02:29:31"
+        return self.TrackTime(EpochTime(ts))
+        #return mktime(t)/3600
+
+    def TrackTime(self, cur_time):
+        """
+        Extend the workflow time span (min_time, max_time) with the event time
+        'cur_time', in seconds since epoch, and return it.
+        """
+        if cur_time > self.max_time:
+            self.max_time = cur_time
+        if self.min_time == 0:
+            self.min_time = cur_time
+        return cur_time
+
+    def DispatchDecoded(self, mytype, time, jobid, site):
+        """
+        Record an event reduced by DecodeEvent (or read from the event cache).
+        """
+        self.SetEventTime(event_codes[mytype], self.TrackTime(time), jobid, site)
+
+    def Windowed(self, events):
+        """
+        Yield the decoded events of 'events' that are inside the window.
+        """
+        (start, end) = self.window
+        for decoded in events:
+            if ((start is None) or (decoded[1] >= start)) and ((end is None) or (decoded[1] <= end)):
+                yield decoded
+
+    def ParseFile(self, file, start=0, stop=None):
+        """
+        Parse the file in string 'file', and fill out the 'jobs' dictionary.
+
+        Arguments:
+        file - path of the userlog, in the ClassAd or the classic format
+        start - offset of the first event block to parse
+        stop - if given, only parse the blocks starting before this offset
+
+        With a window and no offsets given, only the part of the log that
+        holds the window is read.  The cache, if any, is only used when the
+        whole log is parsed (no offsets given).
+        """
+        if (self.cache is not None) and (start == 0) and (stop is None):
+            events = self.cache.Events(file)
+        else:
+            if (self.window is not None) and (start == 0) and (stop is None):
+                (start, stop) = WindowRange(file, *self.window)
+            events = ReadDecoded(file, start, stop)
+        if self.window is not None:
+            events = self.Windowed(events)
+        for decoded in events:
+            self.DispatchDecoded(*decoded)
+        self.cells.Fold()
+
+    def ParsePartial(self, file, start=0, stop=None):
+        """
+        Parse 'file' (or its event blocks starting in [start, stop)) into this
+        empty Analyzer, usually in a worker process, and return a compact
+        picklable partial result for MergePartial.
+
+        The partial is (jobids, lengths, codes, times, site_index, site_names,
+        last_sites, site_changes, min_time, max_time): the events of all jobs
+        one after the other in flat arrays, the number of events of each job,
+        and for every site the (times, changes) arrays recorded by ModifySite.
+        Site change times are relative to that min_time.
+        """
+        self.changes = {}
+        self.ParseFile(file, start, stop)
+
+        jobs = self.jobs
+        jobids = jobs.keys()
+        site_names = [""]
+        site_ids = {"": 0}
+        lengths = array('l')
+        codes = array('b')
+        times = array('l')
+        site_index = array('i')
+        last_sites = []
+        for jobid in jobids:
+            job = jobs[jobid]
+            lengths.append(len(job.events))
+            last_sites.append(job.last_site)
+            for (event, time, site) in job.events:
+                codes.append(event)
+                times.append(time)
+                if not site_ids.has_key(site):
+                    site_ids[site] = len(site_names)
+                    site_names.append(site)
+                site_index.append(site_ids[site])
+        site_changes = {}
+        for site in self.changes.keys():
+            site_changes[site] = (array('l', [ts for (ts, num) in self.changes[site]]), array('b', [num for (ts, num) in self.changes[site]]))
+        return (jobids, lengths, codes, times, site_index, site_names, last_sites, site_changes, self.min_time, self.max_time)
+
+    def MergePartial(self, partial):
+        """
+        Add a ParsePartial result to this Analyzer, exactly as if its file had
+        been parsed after the ones already merged.
+        """
+        (jobids, lengths, codes, times, site_index, site_names, last_sites, site_changes, part_min, part_max) = partial
+        if part_min == 0:
+            # Nothing in the file
+            return
+        self.num_events += len(codes)
+
+        jobs = self.jobs
+        part_jobs = {}
+        pos = 0
+        for index in range(len(jobids)):
+            job = Job(jobids[index], self)
+            end = pos + lengths[index]
+            job.events = zip(codes[pos:end], times[pos:end], map(site_names.__getitem__, site_index[pos:end]))
+            job.last_site = last_sites[index]
+            part_jobs[jobids[index]] = job
+            pos = end
+        part_sites = {}
+        for site in site_changes.keys():
+            part_sites[site] = zip(*site_changes[site])
+        if self.min_time == 0:
+            self.min_time = part_min
+        if part_max > self.max_time:
+            self.max_time = part_max
+
+        # A job continuing from an earlier file carries its last site into this
+        # one.  Its events up to the first one naming a site were recorded at
+        # site "" (and a leading HOLD did not know the event before it), fix
+        # those up.
+        removed = []
+        for jobid in part_jobs.keys():
+            job = part_jobs[jobid]
+            if not jobs.has_key(jobid):
+                jobs[jobid] = job
+                continue
+            earlier = jobs[jobid]
+            carried = earlier.last_site
+            index = 0
+            while (index < len(job.events)) and (job.events[index][2] == ""):
+                (event, time, site) = job.events[index]
+                if index == 0:
+                    local = SiteChange(event, event)
+                    change = SiteChange(event, earlier.events[len(earlier.events) - 1][0])
+                else:
+                    local = change = SiteChange(event, job.events[index - 1][0])
+                if local:
+                    removed.append( (time - part_min, local) )
+                if change:
+                    part_sites.setdefault(carried, []).append( (time - part_min, change) )
+                job.events[index] = (event, time, carried)
+                index += 1
+            earlier.events.extend(job.events)
+            if job.last_site:
+                earlier.last_site = job.last_site
+        for change in removed:
+            part_sites[""].remove(change)
+        if part_sites.has_key("") and not part_sites[""]:
+            del part_sites[""]
+
+        shift = part_min - self.min_time
+        for site in part_sites.keys():
+            changes = part_sites[site]
+            if shift:
+                changes = [(ts + shift, num) for (ts, num) in changes]
+            if self.changes is not None:
+                self.changes.setdefault(site, []).extend(changes)
+            for (ts, num) in sorted(changes):
+                self.cells.Add(site, ts, num)
+
+    def ParseFiles(self, files, processes=1):
+        """
+        Parse every file in 'files', in order.  With more than one process the
+        files, cut at event boundaries when they are large, are parsed in a pool
+        of workers and the results merged in order.  With a cache the files
+        are not cut, so every one is read through the cache.
+        """
+        if processes <= 1:
+            for file in files:
+                self.ParseFile(file)
+            return
+        if (self.store is not None) or (self.stream is not None) or (self.spill is not None):
+            raise Exception("Only the default backend can parse in several processes")
+        tasks = []
+        for file in files:
+            if self.cache is not None:
+                # The cache holds whole logs, each log is one task read
+                # through it (ParseFile applies the window)
+                tasks.append( (file, 0, None, self.cache, self.window) )
+                continue
+            (first, last) = (0, None)
+            if self.window is not None:
+                (first, last) = WindowRange(file, *self.window)
+            if last is None:
+                size = os.path.getsize(file) - first
+            else:
+                size = last - first
+            parts = min(processes, size / split_size + 1)
+            for (start, stop) in SplitLog(file, parts, first, last):
+                tasks.append( (file, start, stop, self.cache, self.window) )
+        pool = multiprocessing.Pool(processes)
+        try:
+            for partial in pool.imap(ParseTask, tasks):
+                self.MergePartial(partial)
+            self.cells.Fold()
+        finally:
+            pool.close()
+            pool.join()
+
+    def ParseJobs(self, files, jobs, index_directory=None):
+        """
+        Parse only the events of the jobs 'jobs' ("1234.0", a cluster "1234"
+        or a range of clusters "1200-1300") from 'files', through the job
+        index of each file, which is built or updated first.  A compressed
+        file can not be indexed and is scanned instead.
+
+        Arguments:
+        index_directory - directory of the job index files, None to keep
+                          each next to its log
+        """
+        (first, last) = ParseJobRange(jobs)
+        for file in files:
+            if IsCompressed(file):
+                events = ScanEvents(file, first, last)
+            else:
+                events = JobIndex(file, index_directory).Update().Events(first, last)
+            if self.window is not None:
+                events = self.Windowed(events)
+            for decoded in events:
+                self.DispatchDecoded(*decoded)
+
+    def PrintJobs(self, out=None):
+        """
+        Print the event history of every job, ordered by jobid.
+        """
+        if out is None:
+            out = sys.stdout
+        jobids = self.jobs.keys()
+        jobids.sort(key=lambda jobid: map(int, jobid.split('.')))
+        for jobid in jobids:
+            job = self.GetJob(jobid)
+            print >>out, jobid
+            for (event, time, site) in job.events:
+                print >>out, "  %s  %-15s %s" % (strftime("%Y-%m-%d %H:%M:%S", localtime(time)), event_names[event], site)
+
+    def Follow(self, files, refresh, checkpoint=None):
+        """
+        Parse the complete events of 'files', write the report, and then every
+        'refresh' seconds parse whatever was appended and write it again.
+        Only a streaming Analyzer keeps the cost of a refresh independent
+        of the length of the logs, the others walk every event again.
+
+        With a 'checkpoint' file the streaming state is saved there after
+        every refresh, and a restarted Follow continues from it.
+        """
+        tails = self.StartFollowing(files, checkpoint)
+        resumed = bool(tails)
+        while 1:
+            if self.Poll(files, tails) or resumed:
+                resumed = False
+                self.Report()
+                sys.stdout.flush()
+                self.SaveCheckpoint(checkpoint, tails)
+            sleep(refresh)
+
+    def Poll(self, files, tails):
+        """
+        Parse the complete events appended to 'files' since the last Poll,
+        and return how many there were.
+
+        Arguments:
+        tails - file -> LogTail of the files already being read, updated
+        """
+        new_events = 0
+        for file in files:
+            if not tails.has_key(file):
+                if not os.path.exists(file):
+                    continue
+                tails[file] = LogTail(file, 0, decoded_attributes)
+            events = tails[file].ReadDecoded()
+            if self.window is not None:
+                events = self.Windowed(events)
+            for decoded in events:
+                self.DispatchDecoded(*decoded)
+                new_events += 1
+        return new_events
+
+    def Checkpoint(self, tails):
+        """
+        Return the checkpoint (see Checkpoint.py) of this streaming Analyzer
+        following the logs of 'tails' (as Poll updates it).
+        """
+        if self.stream is None:
+            raise Exception("Only the streaming backend can be checkpointed")
+        logs = []
+        for file in sorted(tails.keys()):
+            offset = tails[file].offset
+            logs.append( (os.path.abspath(file), offset, Fingerprint(file, offset)) )
+        return {'logs': logs,
+                'window': self.window,
+                'min_time': self.min_time,
+                'max_time': self.max_time,
+                'num_events': self.num_events,
+                'stream': self.stream,
+                'jobs': self.jobs.values(),
+                'distributions': self.distributions,
+                'cells': self.cells}
+
+    def Resume(self, checkpoint, files):
+        """
+        Restore the state of a Checkpoint (read back by ReadCheckpoint) into
+        this empty streaming Analyzer, and return the tails to Poll 'files'
+        with.  Raises a CheckpointError if the logs were not read with the
+        same window or one of them no longer starts with what was read,
+        before anything was restored.
+        """
+        if self.stream is None:
+            raise Exception("Only the streaming backend can be checkpointed")
+        window = checkpoint['window']
+        if window is not None:
+            window = tuple(window)
+        if window != self.window:
+            raise CheckpointError("The checkpoint was written with another --start / --end")
+        paths = dict([(os.path.abspath(file), file) for file in files])
+        tails = {}
+        for (path, offset, fingerprint) in checkpoint['logs']:
+            if not paths.has_key(path):
+                raise CheckpointError("The checkpoint includes %s, which is not followed" % path)
+            if (not os.path.exists(path)) or (os.path.getsize(path) < offset) or (Fingerprint(path, offset) != fingerprint):
+                raise CheckpointError("%s changed since the checkpoint was written" % path)
+            tails[paths[path]] = LogTail(paths[path], offset, decoded_attributes)
+
+        self.min_time = checkpoint['min_time']
+        self.max_time = checkpoint['max_time']
+        self.num_events = checkpoint['num_events']
+        self.stream = stream = checkpoint['stream']
+        self.distributions = NewDistributions(live=True)
+        self.distributions.Merge(checkpoint['distributions'])
+        # Restored jobs are already counted in the totals
+        num_jobs = stream.num_jobs
+        for data in checkpoint['jobs']:
+            job = StreamingJob(data[0], stream, self)
+            DecodeJob(job, data)
+            self.jobs[job.jobid] = job
+        stream.num_jobs = num_jobs
+        for site, (cells, last) in checkpoint['cells'].items():
+            self.cells.Merge(site, cells, last)
+        return tails
+
+    def StartFollowing(self, files, checkpoint):
+        """
+        Return the tails Follow and Serve start polling 'files' with: those
+        of the 'checkpoint' file if there is a usable one, else none (every
+        log is read from the start).
+        """
+        if (checkpoint is None) or not os.path.exists(checkpoint):
+            return {}
+        try:
+            return self.Resume(ReadCheckpoint(checkpoint), files)
+        except (CheckpointError, IOError), e:
+            sys.stderr.write("Not resuming from %s: %s\n" % (checkpoint, e))
+            return {}
+
+    def SaveCheckpoint(self, checkpoint, tails):
+        """
+        Write the Checkpoint of this Analyzer to the file 'checkpoint', if
+        not None.  A checkpoint that can not be written is only a warning.
+        """
+        if checkpoint is None:
+            return
         try:
-            job_event[line.split('=')[0].strip()] = line.split('=')[1].strip()
-        except:
-            pass
-        continue
+            WriteCheckpoint(checkpoint, self.Checkpoint(tails))
+        except (IOError, OSError), e:
+            sys.stderr.write("Unable to write the checkpoint %s: %s\n" % (checkpoint, e))
 
+    def Serve(self, files, refresh, address, checkpoint=None):
+        """
+        Follow 'files' like Follow, but instead of printing the report publish
+        the Documents over HTTP at 'address' (host, port).  The documents are
+        only recomputed when new events were parsed (see Follow for the
+        cost of that, and for the 'checkpoint').
+        """
+        server = MetricsServer(address)
+        server.Start()
+        sys.stderr.write("Serving the metrics of %s on http://%s:%i/\n" % (", ".join(files), address[0], address[1]))
+        tails = self.StartFollowing(files, checkpoint)
+        resumed = bool(tails)
         try:
-            if local_submit.search(line):
-                SetEvent(Job.LOCAL_SUBMIT, local_submit.search(line))
-            elif grid_submit.search(line):
-#            print "Grid Submit"
-                re_grid = grid_submit.search(line)
-            elif grid_site.search(line):
-                site = grid_site.search(line).group(1)
+            while 1:
+                if self.Poll(files, tails) or resumed:
+                    resumed = False
+                    server.Publish(self.Documents())
+                    self.SaveCheckpoint(checkpoint, tails)
+                sleep(refresh)
+        finally:
+            server.Stop()
+
+    def Documents(self, interval=None):
+        """
+        Return the metrics of everything parsed so far as {path: document}:
+        /metrics the values of the report, /sites the running jobs of every
+        site per 'interval' seconds (GetInterval by default), /evictions the
+        evictions per site, /submissions the submissions histogram,
+        /distributions the quantiles of the job durations, /site_metrics
+        the values of the report for every site and /unsited_metrics those
+        of the jobs and events without a site.  They are only computed again
+        once more events were parsed.
+        """
+        if interval is None:
+            interval = self.GetInterval()
+        if (self.documents is not None) and (self.documents[:2] == (interval, self.num_events)):
+            return self.documents[2]
+        occupancy = self.GetOccupancy(interval)
+        site_series = occupancy.SiteSeries(self.min_time)
+        sites = {}
+        for site in site_series.keys():
+            series = site_series[site]
+            sites[site] = [[time, series[time]] for time in sorted(series.keys())]
+        submissions = {}
+        for kind in occupancy.submissions.keys():
+            counts = occupancy.submissions[kind]
+            submissions[kind] = [[time, counts[time]] for time in sorted(counts.keys())]
+        metrics = self.GetMetrics()
+        documents = {'/metrics': self.Summary(metrics),
+                     '/sites': sites,
+                     '/evictions': dict(metrics.evict_places),
+                     '/submissions': submissions,
+                     '/distributions': self.Quantiles(self.GetDistributions()),
+                     '/site_metrics': self.SiteSummaries(metrics),
+                     '/unsited_metrics': self.UnsitedSummary(metrics)}
+        self.documents = (interval, self.num_events, documents)
+        return documents
+
+    def Quantiles(self, distributions):
+        """
+        Return {'jobs': {metric: quantiles}, 'sites': {site: {metric:
+        quantiles}}} of 'distributions', where quantiles is {'p50', 'p90',
+        'p99', 'max'} in seconds.
+        """
+        def Summarize(sketch):
+            summary = {'count': sketch.count, 'max': sketch.max}
+            for q in report_quantiles:
+                summary['p%i' % int(q * 100)] = sketch.Quantile(q)
+            return summary
+
+        jobs = {}
+        for name in distributions.names:
+            jobs[name] = Summarize(distributions.jobs[name])
+        sites = {}
+        for (name, site), sketch in distributions.sites.items():
+            sites.setdefault(site, {})[name] = Summarize(sketch)
+        return {'jobs': jobs, 'sites': sites}
+
+    def Summary(self, metrics):
+        """
+        Return the values the report prints as a dictionary, read from the
+        Metrics 'metrics'.  Times are in hours, and ratios without a
+        denominator are None.
+        """
+        def Ratio(numerator, denominator):
+            if not denominator:
+                return None
+            return float(numerator) / denominator
+
+        wallclock = self.max_time - self.min_time
+        running_time = metrics.TotalTime(*RUNNING_TIME)
+        good_running_time = metrics.LastTotalTime(*GOOD_RUNNING_TIME)
+        queue_time = metrics.TotalTime(*QUEUE_TIME)
+        wasted_time = metrics.TotalTime(*WASTED_TIME)
+        remote_queue_time = metrics.TotalTime(*REMOTE_QUEUE_TIME)
+        matching_time = metrics.TotalTime(*MATCHING_TIME)
+        job_starts = metrics.EventOccurances(Job.RUNNING)
+        num_jobs = metrics.num_jobs
+        return {'min_time': self.min_time,
+                'max_time': self.max_time,
+                'jobs': num_jobs,
+                'throughput': Ratio(running_time, wallclock),
+                'goodput': Ratio(good_running_time, running_time),
+                'x_factor': Ratio(queue_time, running_time),
+                'wallclock_hours': wallclock / 3600.0,
+                'preemptions': metrics.EventOccurances(*PREEMPTIONS),
+                'queue_hours': queue_time / 3600.0,
+                'running_hours': running_time / 3600.0,
+                'wasted_hours': wasted_time / 3600.0,
+                'good_running_hours': good_running_time / 3600.0,
+                'job_starts_per_hour': Ratio(job_starts * 3600.0, wallclock),
+                'per_job': {'remote_queue_minutes': Ratio(remote_queue_time / 60.0, num_jobs),
+                            'matching_hours': Ratio(matching_time / 3600.0, num_jobs),
+                            'queue_hours': Ratio(queue_time / 3600.0, num_jobs),
+                            'running_hours': Ratio(running_time / 3600.0, num_jobs),
+                            'wasted_hours': Ratio(wasted_time / 3600.0, num_jobs),
+                            'good_running_hours': Ratio(good_running_time / 3600.0, num_jobs),
+                            'job_starts': Ratio(job_starts, num_jobs)}}
+
+    def SiteSummaries(self, metrics):
+        """
+        Return {site: Summary of that site} for every site of the Metrics
+        'metrics' with any job or event.  Throughput and job starts per
+        hour are over the wallclock time of the whole workflow, so those of
+        the sites add up to the workflow's.
+
+        The jobs that never ran at a site and the events without one are
+        not a site, they are in UnsitedSummary.
+        """
+        summaries = {}
+        sites = metrics.sites
+        for site_id, site in enumerate(sites.names):
+            base = site_id * event_slots
+            if not site:
+                continue
+            if sites.num_jobs[site_id] or any(sites.occurances[base:base + event_slots]):
+                summaries[site] = self.Summary(metrics.SiteMetrics(site))
+        return summaries
+
+    def UnsitedSummary(self, metrics):
+        """
+        Return the Summary of the jobs and events of the Metrics 'metrics'
+        without a site, so with SiteSummaries the totals add up to the
+        workflow's.  Its ratios are None, they would describe a site.
+        """
+        summary = self.Summary(metrics.SiteMetrics(""))
+        for name in ('throughput', 'goodput', 'x_factor', 'job_starts_per_hour'):
+            summary[name] = None
+        return summary
+
+    def GetTotalTime(self, *events):
+        if self.spill is not None:
+            return self.GetMetrics().TotalTime(*events)
+        if self.stream is not None:
+            return self.stream.TotalTime(*events)
+        if self.store is not None:
+            return sum([self.store.TotalTimeBetween(eventa, eventb) for eventa, eventb in events])
+        total_time = 0
+        for key in self.jobs.keys():
+            job = self.jobs[key]
+            for eventa, eventb in events:
+                total_time += job.GetTimeBetween(eventa, eventb)
+        return int(total_time)
+
+    def GetLastTotalTime(self, *events):
+        if self.spill is not None:
+            return self.GetMetrics().LastTotalTime(*events)
+        if self.stream is not None:
+            return self.stream.LastTotalTime(*events)
+        if self.store is not None:
+            return sum([self.store.TotalTimeOfLast(eventa, eventb) for eventa, eventb in events])
+        total_time = 0
+        for key in self.jobs.keys():
+            job = self.jobs[key]
+            for eventa, eventb in events:
                 try:
-                    SetEvent(Job.GRID_SUBMIT, re_grid, site)
-                except UnboundLocalError:
+                    total_time += job.GetTimeOfLast(eventa, eventb)
+                except:
                     pass
-#               SetEvent("grid_site", grid_site.search(line))
-            elif start.search(line):
-                SetEvent(Job.RUNNING, start.search(line))
-            elif hold.search(line):
-                SetEvent(Job.HOLD, hold.search(line))
-            elif release.search(line):
-                SetEvent(Job.RELEASE, release.search(line))
-            elif evict.search(line):
-                SetEvent(Job.EVICT, evict.search(line))
-            elif terminate.search(line):
-                SetEvent(Job.STOP, terminate.search(line))
-        except:
-            raise Exception("Error while parsing line %i:\n%s\n" % ( line_counter, line ) )
-
-        line_counter += 1
-        
+        return int(total_time)
 
-def AddOptions(parser):
-    parser.add_option('-l', '--latex', help="Output in a latex compatible format", default=False, dest="latex", action="store_true")
-    pass
+    def GetEventOccurances(self, *events):
+        if self.spill is not None:
+            return self.GetMetrics().EventOccurances(*events)
+        if self.stream is not None:
+            return self.stream.EventOccurances(*events)
+        total_events = 0
+        if self.store is not None:
+            for event in events:
+                try:
+                    total_events += self.store.TotalEventOccurances(event[0], event[1])
+                except TypeError:
+                    total_events += self.store.TotalEventOccurances(event)
+            return total_events
+        for key in self.jobs.keys():
+            job = self.jobs[key]
+            for event in events:
+                try:
+                    total_events += job.GetEventOccurances(event[0], event[1])
+                except TypeError:
+                    total_events += job.GetEventOccurances(event)
 
-def GetTotalTime(*events):
-    total_time = 0
-    for key in jobs.keys():
-        job = jobs[key]
-        for eventa, eventb in events:
-            total_time += job.GetTimeBetween(eventa, eventb)
-    return int(total_time)
-
-def GetLastTotalTime(*events):
-    total_time = 0
-    for key in jobs.keys():
-        job = jobs[key]
-        for eventa, eventb in events:
-            try:
-                total_time += job.GetTimeOfLast(eventa, eventb)
-            except:
-                pass
-    return int(total_time)
-
-def GetEventOccurances(*events):
-    total_events = 0
-    for key in jobs.keys():
-        job = jobs[key]
-        for event in events:
-            try:
-                total_events += job.GetEventOccurances(event[0], event[1])
-            except TypeError:
-                total_events += job.GetEventOccurances(event)
-                
-    return int(total_events)
-
-def GetEvictPlaces():
-    places = {}
-    for key in jobs.keys():
-        job = jobs[key]
-        evicts = job.GetEvents(Job.EVICT)
-        for evict in evicts:
-            if places.has_key(evict[2]):
-                places[evict[2]] += 1
-            else:
-                places[evict[2]] = 1
-    return places
-        
+        return int(total_events)
 
-def GetTotalRemoteQueueTime():
-    return GetTotalTime(    (Job.GRID_SUBMIT, Job.RUNNING), \
-                            (Job.EVICT, Job.RUNNING), \
-                            (Job.GRID_SUBMIT, Job.HOLD), \
-                            (Job.EVICT, Job.HOLD) )
+    def GetEvictPlaces(self):
+        if self.spill is not None:
+            return self.GetMetrics().evict_places
+        if self.stream is not None:
+            return self.stream.evict_places
+        if self.store is not None:
+            return self.store.EventPlaces(Job.EVICT)
+        places = {}
+        for key in self.jobs.keys():
+            job = self.jobs[key]
+            evicts = job.GetEvents(Job.EVICT)
+            for evict in evicts:
+                if places.has_key(evict[2]):
+                    places[evict[2]] += 1
+                else:
+                    places[evict[2]] = 1
+        return places
 
-    
-def GetTotalMatchingTime():
-    return GetTotalTime(    (Job.LOCAL_SUBMIT, Job.GRID_SUBMIT), \
-                            (Job.LOCAL_SUBMIT, Job.HOLD), \
-                            (Job.HOLD, Job.RELEASE), \
-                            (Job.RELEASE, Job.HOLD), \
-                            (Job.HOLD, Job.GRID_SUBMIT) )
-    
-def GetTotalQueueTime():
-    return GetTotalTime(    (Job.LOCAL_SUBMIT, Job.GRID_SUBMIT), \
-                            (Job.GRID_SUBMIT, Job.RUNNING), \
-                            (Job.EVICT, Job.RUNNING), \
-                            (Job.GRID_SUBMIT, Job.HOLD), \
-                            (Job.LOCAL_SUBMIT, Job.HOLD), \
-                            (Job.RELEASE, Job.HOLD), \
-                            (Job.HOLD, Job.GRID_SUBMIT), \
-                            (Job.HOLD, Job.RELEASE), \
-                            (Job.LOCAL_SUBMIT, Job.RUNNING) )
-    
-def GetTotalRunningTime():
-    return GetTotalTime(    (Job.RUNNING, Job.EVICT), \
-                            (Job.RUNNING, Job.HOLD), \
-                            (Job.RUNNING, Job.STOP) )
-    
-def GetTotalWastedTime():
-    return GetTotalTime(    (Job.RUNNING, Job.EVICT) )
-                            #(Job.RUNNING, Job.HOLD) )
-    
+    def GetTotalRemoteQueueTime(self):
+        return self.GetTotalTime(*REMOTE_QUEUE_TIME)
 
-def GetTotalGoodRunningTime():
-    return GetLastTotalTime( (Job.RUNNING, Job.STOP) )
+    def GetTotalMatchingTime(self):
+        return self.GetTotalTime(*MATCHING_TIME)
 
-def GetTotalPreemptions():
-    return GetEventOccurances( (Job.EVICT),  \
-                               (Job.RUNNING, Job.HOLD) )
-    
-    
-latex = False
+    def GetTotalQueueTime(self):
+        return self.GetTotalTime(*QUEUE_TIME)
+
+    def GetTotalRunningTime(self):
+        return self.GetTotalTime(*RUNNING_TIME)
+
+    def GetTotalWastedTime(self):
+        return self.GetTotalTime(*WASTED_TIME)
+
+    def GetTotalGoodRunningTime(self):
+        return self.GetLastTotalTime(*GOOD_RUNNING_TIME)
+
+    def GetTotalPreemptions(self):
+        return self.GetEventOccurances(*PREEMPTIONS)
+
+    def GetMetrics(self):
+        """
+        Return a Metrics object holding the totals of every transition the
+        report needs (see WalkJobs).
+        """
+        if self.stream is not None:
+            return self.stream
+        return self.WalkJobs()[0]
+
+    def GetDistributions(self):
+        """
+        Return the Distributions of the durations of every job, those still
+        active included.  The streaming backend keeps them up to date, they
+        are returned as they are.
+        """
+        if self.stream is not None:
+            return self.distributions
+        return self.WalkJobs()[1]
+
+    def WalkJobs(self):
+        """
+        Walk the events of every job once, and return the (Metrics,
+        Distributions) of all of them.  The result is kept until more events
+        are parsed, so the report reads both from the same walk.
+        """
+        if (self.walked is not None) and (self.walked[0] == self.num_events):
+            return self.walked[1:]
+        distributions = self.distributions.Copy()
+        if self.store is not None:
+            metrics = self.store.Metrics(Job.EVICT)
+            self.store.AddDistributions(distributions)
+        elif self.spill is not None:
+            metrics = Metrics(Job.EVICT)
+            metrics.Merge(self.retired)
+            for key in self.jobs.keys():
+                metrics.AddJob(self.jobs[key].History(), distributions)
+        else:
+            metrics = Metrics(Job.EVICT)
+            metrics.Merge(self.merged)
+            for key in self.jobs.keys():
+                metrics.AddJob(self.jobs[key].events, distributions)
+        self.walked = (self.num_events, metrics, distributions)
+        return (metrics, distributions)
+
+    def Aggregate(self):
+        """
+        Return the partial aggregate (see Aggregate.py) of everything parsed,
+        for MergeAggregates on another host.
+        """
+        return MakeAggregate(self.GetMetrics(), self.GetDistributions(), self.cells, self.min_time, self.max_time)
+
+    def MergeAggregates(self, aggregates):
+        """
+        Fold the partial aggregates 'aggregates' of several hosts into this
+        (otherwise empty) Analyzer, whose report is then the report of all
+        their logs together.
+
+        The cells of a host are relative to its own first event, they are
+        moved to those of the first event of all hosts rounded up to a whole
+        cell, so a host whose logs start a fraction of a cell later has its
+        running jobs counted up to that fraction later.
+        """
+        aggregates = [aggregate for aggregate in aggregates if aggregate['min_time']]
+        if not aggregates:
+            return
+        self.walked = None
+        self.min_time = min([aggregate['min_time'] for aggregate in aggregates])
+        self.max_time = max([aggregate['max_time'] for aggregate in aggregates])
+        resolution = self.cells.resolution
+        for aggregate in aggregates:
+            if aggregate['resolution'] != resolution:
+                raise AggregateError("A partial aggregate of %i second cells can not be merged with %i second ones" % (aggregate['resolution'], resolution))
+            self.merged.Merge(aggregate['metrics'])
+            self.distributions.Merge(aggregate['distributions'])
+            shift = -(-(aggregate['min_time'] - self.min_time) // resolution)
+            for site, (cells, last) in aggregate['sites'].items():
+                self.cells.Merge(site, cells, last, shift)
+
+    def JobHistories(self):
+        """
+        Yield (jobid, list of (event, time, site)) for every job, including
+        the retired ones.  The streaming backend keeps no history.
+        """
+        if self.stream is not None:
+            raise Exception("The streaming backend keeps no job history")
+        if self.spill is not None:
+            for jobid, events in self.spill.Histories():
+                yield jobid, events
+            for jobid in self.jobs.keys():
+                yield jobid, self.jobs[jobid].History()
+        elif self.store is not None:
+            store = self.store
+            store.Freeze()
+            for index, jobid in enumerate(store.jobids):
+                start, end = store.Range(index)
+                sites = [store.sites[site] for site in store.s_site[start:end].tolist()]
+                yield jobid, zip(store.s_event[start:end].tolist(), store.s_time[start:end].tolist(), sites)
+        else:
+            for jobid in self.jobs.keys():
+                yield jobid, self.jobs[jobid].events
+
+    def JobTable(self):
+        """
+        Return the (names, columns) of the per-job table: the jobid and every
+        JOB_COLUMNS metric of each job.
+        """
+        # The Metrics totals and keys each column adds up, as the Metrics
+        # method of the column would
+        sources = []
+        for (name, method, args) in JOB_COLUMNS:
+            keys = []
+            for arg in args:
+                if method == 'TotalTime':
+                    keys.append( ('pair_time', arg) )
+                elif method == 'LastTotalTime':
+                    keys.append( ('last_pair_time', arg) )
+                elif type(arg) is tuple:
+                    keys.append( ('pair_occurances', arg) )
+                else:
+                    keys.append( ('occurances', arg) )
+            sources.append(keys)
+
+        jobids = []
+        values = [[] for column in JOB_COLUMNS]
+        for jobid, events in self.JobHistories():
+            metrics = Metrics(Job.EVICT, breakdown=False)
+            metrics.AddJob(events)
+            jobids.append(jobid)
+            totals = metrics.__dict__
+            for index, keys in enumerate(sources):
+                value = 0
+                for (attribute, key) in keys:
+                    value += totals[attribute].get(key, 0)
+                values[index].append(value)
+        names = ['jobid'] + [name for (name, method, args) in JOB_COLUMNS]
+        columns = [numpy.array(jobids, dtype=str)]
+        columns.extend([numpy.array(column, dtype=numpy.int64) for column in values])
+        return names, columns
+
+    def SiteTable(self, occupancy):
+        """
+        Return the (names, columns) of the per-site occupancy table, one row
+        per site and interval of the Occupancy 'occupancy', as SummarizeSites
+        reports them.  Times are the start of the interval, in seconds since
+        the epoch.
+        """
+        maxima = occupancy.maxima.copy()
+        for row in range(len(occupancy.names)):
+            maxima[row, :int(occupancy.leading[row])] = 0
+        width = maxima.shape[1]
+        site = numpy.repeat(numpy.array([Unquote(name) for name in occupancy.names], dtype=str), width)
+        time = numpy.tile(numpy.arange(width, dtype=numpy.int64) * occupancy.interval + self.min_time, len(occupancy.names))
+        return ['site', 'interval_start_epoch', 'running'], [site, time, maxima.ravel()]
+
+    def SubmissionTable(self, occupancy):
+        """
+        Return the (names, columns) of the submissions histogram of the
+        Occupancy 'occupancy', one row per interval with any.  Times are the
+        start of the interval, in seconds since the epoch, as in SiteTable.
+        """
+        submissions = occupancy.submissions['Submissions']
+        terminations = occupancy.submissions['Terminations']
+        # The histogram is keyed by the end of the interval, relative to
+        # the first event
+        ends = sorted(set(submissions.keys()) | set(terminations.keys()))
+        starts = [self.min_time + end - occupancy.interval for end in ends]
+        columns = [numpy.array(starts, dtype=numpy.int64), \
+                   numpy.array([submissions.get(t, 0) for t in ends], dtype=numpy.int64), \
+                   numpy.array([terminations.get(t, 0) for t in ends], dtype=numpy.int64)]
+        return ['interval_start_epoch', 'submissions', 'terminations'], columns
 
-def OutputCols(*cols):
-    if latex:
-        print cols[0],
-        if len(cols) > 1:
-            print " & " + cols[1] + " \\\\"
+    def Export(self, prefix, formats=('csv', 'columns'), interval=None):
+        """
+        Write the per-job, per-site and submissions tables to
+        <prefix>-jobs, <prefix>-sites and <prefix>-submissions, in each of
+        'formats' (see Export.export_formats), the last two per 'interval'
+        seconds (GetInterval by default).  The per-job table is left out
+        for the streaming backend.
+        """
+        if interval is None:
+            interval = self.GetInterval()
+        occupancy = self.GetOccupancy(interval)
+        if self.stream is None:
+            names, columns = self.JobTable()
+            WriteTable(prefix, 'jobs', names, columns, formats)
         else:
-            print " & \\\\ "
-    else:
-        for col in cols:
-            print col + " ",
-        print ""
+            sys.stderr.write("The streaming backend keeps no job history, not exporting %s-jobs\n" % prefix)
+        names, columns = self.SiteTable(occupancy)
+        WriteTable(prefix, 'sites', names, columns, formats)
+        names, columns = self.SubmissionTable(occupancy)
+        WriteTable(prefix, 'submissions', names, columns, formats)
+
+    def OutputCols(self, out, *cols):
+        if self.latex:
+            print >>out, cols[0],
+            if len(cols) > 1:
+                print >>out, " & " + cols[1] + " \\\\"
+            else:
+                print >>out, " & \\\\ "
+        else:
+            for col in cols:
+                print >>out, col + " ",
+            print >>out, ""
+
+    def Report(self, out=None, sites_graph="sites.png", submissions_graph="SubHist.png"):
+        """
+        Draw the site and submission graphs and print the report of everything
+        parsed so far.
+
+        Arguments:
+        out - file the report is written to, sys.stdout by default
+        sites_graph - file name of the running jobs per site graph
+        submissions_graph - file name of the submissions histogram
+        """
+        if out is None:
+            out = sys.stdout
+        profiler = self.profiler
+        profiler.Start('summarize')
+        self.submissions = {'Submissions': {}, 'Terminations': {}}
+        interval = self.GetInterval()
+        site_data = self.SummarizeSites(interval)
+        profiler.Stop('summarize')
+
+        profiler.Start('graphs')
+        bsl = BasicStackedLine()
+        f=open(sites_graph, 'w')
+        #sys.stderr.write(str(site_data))
+        bsl.run(site_data, f, { 'title': 'Sites Used for Job', 'starttime': self.min_time, 'endtime': self.max_time, 'xlabel': 'Time', 'ylabel': 'Running Jobs'})
+        f.close()
+
+        sbg = StackedBarGraph()
+        f = open(submissions_graph, 'w')
+        sbg.run(self.submissions, f, {'title': 'Histogram of submissions', 'span': interval, 'text_size': 12, 'title_size': 18})
+        f.close()
+        profiler.Stop('graphs')
+
+        profiler.Start('metrics')
+        metrics = self.GetMetrics()
+        profiler.Stop('metrics')
+
+        profiler.Start('report')
+        if self.latex:
+            print >>out, "\\small \\begin{table}[h!] \centering"
+            print >>out, "\\begin{tabular}{l r}"
+
+        OutputCols = self.OutputCols
+        min_time = self.min_time
+        max_time = self.max_time
+        running_time = metrics.TotalTime(*RUNNING_TIME)
+        good_running_time = metrics.LastTotalTime(*GOOD_RUNNING_TIME)
+        queue_time = metrics.TotalTime(*QUEUE_TIME)
+        wasted_time = metrics.TotalTime(*WASTED_TIME)
+        job_starts = metrics.EventOccurances(Job.RUNNING)
+
+        OutputCols(out, "Ratios" )
+        OutputCols(out, "Throughput (Avg. number of proceses running)", "%0.2lf" % ((float(running_time) / (3600)) /  ((float(max_time - min_time) / 3600.0))))
+        OutputCols(out, "Goodput (TotalRunningTime / AppRunningTime)", "%0.2lf" % ((float(good_running_time) / (3600)) / (float(running_time) / (3600))))
+        OutputCols(out, "X Factor (QueueTime / RunningTime)", "%0.2lf" % ((float(queue_time) / (3600)) / (float(running_time) / (3600))))
+        OutputCols(out, "")
+
+        OutputCols(out, "Totals" )
+        OutputCols(out, "Workflow Wallclock Time", "%.2lf H" % ((float(max_time - min_time) / 3600.0)))
+        OutputCols(out, "Pre-emptions",  "%i" % (metrics.EventOccurances(*PREEMPTIONS)))
+        OutputCols(out, "Queue Time", "%0.2lf H" % (float(queue_time) / (3600)))
+        OutputCols(out, "Aggregate Running Time", "%0.2lf H" % (float(running_time) / (3600)))
+        OutputCols(out, "Wasted Time", "%0.2lf H" % (float(wasted_time) / (3600)))
+        OutputCols(out, "Application Running Time", "%0.2lf H" % (float(good_running_time) / (3600)))
+        OutputCols(out, "Job Starts Per Hour", "%0.2lf" % ( float(job_starts) / ( (max_time - min_time) / 3600.0)))
+
+        OutputCols(out, "")
+        OutputCols(out, "Divided by Number of jobs")
+        num_jobs = metrics.num_jobs
+        OutputCols(out, "Remote Queue Time", "%0.2lf M" % (float(metrics.TotalTime(*REMOTE_QUEUE_TIME)) / (60*num_jobs)))
+        OutputCols(out, "Matching Time", "%0.2lf H" % (float(metrics.TotalTime(*MATCHING_TIME)) / (3600*num_jobs)))
+        OutputCols(out, "Queue Time", "%0.2lf H" % (float(queue_time) / (3600*num_jobs)))
+        OutputCols(out, "Running Time", "%0.2lf H" % (float(running_time) / (3600*num_jobs)))
+        OutputCols(out, "Wasted Time", "%0.2lf H" % (float(wasted_time) / (3600*num_jobs)))
+        OutputCols(out, "Running Time", "%0.2lf H" % (float(good_running_time) / (3600*num_jobs)))
+        OutputCols(out, "Job Starts Per Job", "%0.2lf" % ( float(job_starts) / (num_jobs)))
+
+        OutputCols(out, "")
+        OutputCols(out, "Distribution per job (p50 / p90 / p99 / max)")
+        distributions = self.GetDistributions()
+        for (name, label, pairs) in DISTRIBUTIONS:
+            sketch = distributions.jobs[name]
+            if sketch.count:
+                values = [sketch.Quantile(q) for q in report_quantiles] + [sketch.max]
+                OutputCols(out, label, " / ".join(["%0.2lf" % (float(value) / 3600) for value in values]) + " H")
+
+        OutputCols(out, "")
+        OutputCols(out, "Evictions ---------")
+        evicts = metrics.evict_places
+        for evict in evicts.keys():
+            OutputCols(out, "%s" % evict,  "%i" % (evicts[evict]))
+
+        if self.latex:
+            print >>out, "\\end{tabular} \\end{table}"
+
+        self.SiteReport(out, metrics)
+        profiler.Stop('report')
+
+    def SiteReport(self, out, metrics):
+        """
+        Print the table of the report values of every site of the Metrics
+        'metrics', busiest site first, and last the totals of the jobs and
+        events without a site.
+        """
+        def Format(value, format):
+            if value is None:
+                return "-"
+            return format % value
+
+        summaries = self.SiteSummaries(metrics)
+        sites = summaries.keys()
+        sites.sort(key=lambda site: -summaries[site]['running_hours'])
+        header = ["Site", "Jobs", "Throughput", "Goodput", "X Factor", "Queue H", "Running H", "Wasted H", "Pre-emptions", "Starts/H"]
+        unsited = self.UnsitedSummary(metrics)
+        if unsited['jobs'] or unsited['queue_hours'] or unsited['running_hours'] or unsited['preemptions']:
+            sites.append("")
+            summaries[""] = unsited
+        rows = []
+        for site in sites:
+            summary = summaries[site]
+            rows.append([site or "(no site)", "%i" % summary['jobs'], \
+                         Format(summary['throughput'], "%0.2lf"), \
+                         Format(summary['goodput'], "%0.2lf"), \
+                         Format(summary['x_factor'], "%0.2lf"), \
+                         "%0.2lf" % summary['queue_hours'], \
+                         "%0.2lf" % summary['running_hours'], \
+                         "%0.2lf" % summary['wasted_hours'], \
+                         "%i" % summary['preemptions'], \
+                         Format(summary['job_starts_per_hour'], "%0.2lf")])
+
+        if self.latex:
+            print >>out, "\\small \\begin{table}[h!] \\centering"
+            print >>out, "\\begin{tabular}{l " + "r " * (len(header) - 1) + "}"
+            for row in [header] + rows:
+                print >>out, " & ".join(row) + " \\\\"
+            print >>out, "\\end{tabular} \\end{table}"
+            return
+
+        print >>out, ""
+        print >>out, "Per site"
+        width = max([len(row[0]) for row in rows] + [len(header[0])])
+        for row in [header] + rows:
+            print >>out, row[0].ljust(width) + "".join(["%13s" % col for col in row[1:]])
+
+
+# Logs larger than this are cut into pieces parsed by different processes
+split_size = 64 * 1024 * 1024
+
+def ParseTask(task):
+    """
+    Pool entry point, ParsePartial of a (file, start, stop, cache, window)
+    range in a fresh Analyzer.
+    """
+    (file, start, stop, cache, window) = task
+    return Analyzer(cache=cache, window=window).ParsePartial(file, start, stop)
+
+
+def AddOptions(parser):
+    parser.add_option('-l', '--latex', help="Output in a latex compatible format", default=False, dest="latex", action="store_true")
+    parser.add_option('-c', '--columnar', help="Keep job events in packed numpy columns", default=False, dest="columnar", action="store_true")
+    parser.add_option('-s', '--streaming', help="Only keep running totals, not the event history of jobs", default=False, dest="streaming", action="store_true")
+    parser.add_option('-j', '--jobs', help="Number of processes parsing the logs (default 1)", default=1, dest="processes", type="int")
+    parser.add_option('-f', '--follow', help="Keep reading the logs as they grow, and refresh the report (only keeps running totals, like --streaming)", default=False, dest="follow", action="store_true")
+    parser.add_option('--serve', help="Keep following the logs, and serve their metrics as JSON over HTTP on this port (only keeps running totals, like --streaming)", default=None, dest="serve", type="int", metavar="PORT")
+    parser.add_option('--serve-host', help="Address --serve listens on (default 127.0.0.1)", default="127.0.0.1", dest="serve_host")
+    parser.add_option('--checkpoint', help="With --follow or --serve, save the running totals to this file after every refresh and continue from it when restarted (default next to the event cache with --cache or --cache-dir)", default=None, dest="checkpoint")
+    parser.add_option('--refresh', help="Seconds between report refreshes with --follow or --serve (default 60)", default=60, dest="refresh", type="int")
+    parser.add_option('--cache', help="Cache the decoded events of each log in <log>.evcache", default=False, dest="cache", action="store_true")
+    parser.add_option('--cache-dir', help="Cache the decoded events of the logs in this directory (default $CONDOR_LOG_CACHE)", default=os.environ.get("CONDOR_LOG_CACHE"), dest="cache_dir")
+    parser.add_option('--cache-size', help="Megabytes the cache directory may use (default 1024)", default=1024, dest="cache_size", type="int")
+    parser.add_option('--start', help="Only analyze the events from this time on (YYYY-MM-DD HH:MM[:SS])", default=None, dest="start")
+    parser.add_option('--end', help="Only analyze the events up to this time (YYYY-MM-DD HH:MM[:SS])", default=None, dest="end")
+    parser.add_option('--summarize', help="Write the partial aggregate of the logs to this file instead of a report, for --merge", default=None, dest="summarize", metavar="FILE")
+    parser.add_option('--merge', help="The arguments are partial aggregates written by --summarize, print the report of all of them", default=False, dest="merge", action="store_true")
+    parser.add_option('--lookup', help="Only print the event history of the job JOB (1234.0), cluster (1234) or cluster range (1200-1300), read through a job index of each log", default=None, dest="lookup", metavar="JOB")
+    parser.add_option('--index-dir', help="Keep the job indexes of --lookup in this directory instead of <log>.jobidx", default=None, dest="index_dir")
+    parser.add_option('--spill', help="Retire terminated jobs from memory, keeping their history in this file", default=None, dest="spill")
+    parser.add_option('--memory-limit', help="Megabytes of memory to stay under, by also moving the history of active jobs to the spill file (a temporary one without --spill)", default=None, dest="memory_limit", type="int")
+    parser.add_option('--export', help="Write the per-job, per-site and submissions tables to PREFIX-jobs, PREFIX-sites and PREFIX-submissions", default=None, dest="export", metavar="PREFIX")
+    parser.add_option('--profile', help="Write the wall and CPU time, throughput and peak memory of each stage to profile.json", default=False, dest="profile", action="store_true")
+    parser.add_option('--profile-file', help="File the --profile summary is written to (default profile.json)", default="profile.json", dest="profile_file")
+    parser.add_option('--profile-functions', help="With --profile, also report the N functions with the most time spent in them, estimated by sampling the stack", default=0, dest="profile_functions", type="int")
+    parser.add_option('--interval', help="Seconds per interval of the site and submission graphs, the exports and the served series, a multiple of %i (default the finest of 1 minute, 5 minutes, 1 hour and 1 day showing the workflow in at most %i intervals)" % (rollup_levels[0], graph_bins), default=None, dest="interval", type="int")
+    parser.add_option('--export-format', help="Comma separated formats of --export: csv, columns (.npy per column), default both", default="csv,columns", dest="export_format")
+    pass
+
 
 def main():
     parser = optparse.OptionParser()
     AddOptions(parser)
     (opts, args) = parser.parse_args()
-    
-    for file in args:
-        if not os.path.exists(file):
-            print "File %s not found" % file
-        else:
-            ParseFile(file)
-
-    global latex
-    latex = opts.latex
-    site_data = SummarizeSites(60*5)
-    bsl = BasicStackedLine()
-    f=open("sites.png", 'w')
-    #sys.stderr.write(str(site_data))
-    bsl.run(site_data, f, { 'title': 'Sites Used for Job', 'starttime': min_time, 'endtime': max_time, 'xlabel': 'Time', 'ylabel': 'Running Jobs'})
-    #bsl.run(site_data, f, { 'title': 'Sites Used for Job', 'starttime': min_time, 'endtime': max_time, 'xlabel': 'Time', 'ylabel': 'Running Jobs', 'text_size': 12, 'title_size': 18 })
-    #bsl.run(site_data, f, { 'title': 'Sites Used for Job', 'starttime': min_time, 'endtime': min_time + 118800, 'xlabel': 'Time', 'ylabel': 'Running Jobs' })
-    
-    global submissions
-    sbg = StackedBarGraph()
-    f = open("SubHist.png", 'w')
-    sbg.run(submissions, f, {'title': 'Histogram of submissions', 'span': 60*5, 'text_size': 12, 'title_size': 18})
-    #print site_data
-    #new_site = [site_data[key] for key in site_data.keys()]
-    #from condor_running import stacked_graph, pos_only
-    #stacked_graph(new_site, color_seq='random', baseline_fn=pos_only, cmap=cm.get_cmap("Accent"), items=site_data.keys())
-    #savefig("sites.pdf")
-    
-    
-    
-    if latex:
-        print "\\small \\begin{table}[h!] \centering"
-        print "\\begin{tabular}{l r}"
-    
-    OutputCols( "Ratios" )
-    OutputCols( "Throughput (Avg. number of proceses running)", "%0.2lf" % ((float(GetTotalRunningTime()) / (3600)) /  ((float(max_time - min_time) / 3600.0))))
-    OutputCols("Goodput (TotalRunningTime / AppRunningTime)", "%0.2lf" % ((float(GetTotalGoodRunningTime()) / (3600)) / (float(GetTotalRunningTime()) / (3600))))
-    OutputCols("X Factor (QueueTime / RunningTime)", "%0.2lf" % ((float(GetTotalQueueTime()) / (3600)) / (float(GetTotalRunningTime()) / (3600))))
-    OutputCols("")
-    
-    OutputCols( "Totals" )
-    OutputCols("Workflow Wallclock Time", "%.2lf H" % ((float(max_time - min_time) / 3600.0)))
-    OutputCols( "Pre-emptions",  "%i" % (GetTotalPreemptions()))
-    OutputCols( "Queue Time", "%0.2lf H" % (float(GetTotalQueueTime()) / (3600)))
-    OutputCols( "Aggregate Running Time", "%0.2lf H" % (float(GetTotalRunningTime()) / (3600)))
-    OutputCols( "Wasted Time", "%0.2lf H" % (float(GetTotalWastedTime()) / (3600)))
-    OutputCols( "Application Running Time", "%0.2lf H" % (float(GetTotalGoodRunningTime()) / (3600)))
-    OutputCols( "Job Starts Per Hour", "%0.2lf" % ( float(GetEventOccurances(Job.RUNNING)) / ( (max_time - min_time) / 3600.0)))
-    
-    OutputCols("")
-    OutputCols( "Divided by Number of jobs")
-    num_jobs = len(jobs)
-    OutputCols( "Remote Queue Time", "%0.2lf M" % (float(GetTotalRemoteQueueTime()) / (60*num_jobs)))
-    OutputCols( "Matching Time", "%0.2lf H" % (float(GetTotalMatchingTime()) / (3600*num_jobs)))
-    OutputCols( "Queue Time", "%0.2lf H" % (float(GetTotalQueueTime()) / (3600*num_jobs)))
-    OutputCols( "Running Time", "%0.2lf H" % (float(GetTotalRunningTime()) / (3600*num_jobs)))
-    OutputCols( "Wasted Time", "%0.2lf H" % (float(GetTotalWastedTime()) / (3600*num_jobs)))
-    OutputCols( "Running Time", "%0.2lf H" % (float(GetTotalGoodRunningTime()) / (3600*num_jobs)))
-    OutputCols( "Job Starts Per Job", "%0.2lf" % ( float(GetEventOccurances(Job.RUNNING)) / (num_jobs)))
-    
-    OutputCols("")
-    OutputCols( "Evictions ---------")
-    evicts = GetEvictPlaces()
-    for evict in evicts.keys():
-        OutputCols( "%s" % evict,  "%i" % (evicts[evict]))
-    
-    if latex:
-        print "\\end{tabular} \\end{table}"
-    
-    
-    
-    
 
-if __name__ == "__main__":
-    main()
+    if (opts.processes > 1) and (opts.columnar or opts.streaming or opts.follow or (opts.serve is not None)):
+        parser.error("--jobs can not be combined with --columnar, --streaming, --follow or --serve")
+    bounded = (opts.spill is not None) or (opts.memory_limit is not None)
+    following = opts.follow or (opts.serve is not None)
+    if following and (opts.columnar or bounded):
+        parser.error("--follow and --serve can not be combined with --columnar, --spill or --memory-limit")
+    if bounded and (opts.processes > 1 or opts.columnar or opts.streaming):
+        parser.error("--spill and --memory-limit can not be combined with --jobs, --columnar or --streaming")
+    if (opts.lookup is not None) and (bounded or opts.processes > 1 or opts.columnar or opts.streaming or opts.follow or (opts.serve is not None)):
+        parser.error("--lookup can not be combined with --jobs, --columnar, --streaming, --follow, --serve, --spill or --memory-limit")
+    if opts.lookup is not None:
+        try:
+            ParseJobRange(opts.lookup)
+        except JobRangeError, e:
+            parser.error(str(e))
+
+    if (opts.checkpoint is not None) and not following:
+        parser.error("--checkpoint can only be used with --follow or --serve")
+    if (opts.interval is not None) and (opts.interval <= 0):
+        parser.error("--interval must be a positive number of seconds")
+    if (opts.interval is not None) and (opts.interval % rollup_levels[0]):
+        parser.error("--interval must be a multiple of %i seconds" % rollup_levels[0])
+
+    export_format = opts.export_format.split(',')
+    for format in export_format:
+        if not export_formats.has_key(format):
+            parser.error("Unknown export format %s" % format)
+
+    if opts.merge and (opts.follow or (opts.serve is not None) or (opts.lookup is not None) or (opts.summarize is not None) or (opts.export is not None) or opts.columnar or opts.streaming or bounded):
+        parser.error("--merge can only be combined with --latex and --profile")
+
+    window = None
+    if (opts.start is not None) or (opts.end is not None):
+        try:
+            window = [None, None]
+            if opts.start is not None:
+                window[0] = ParseTime(opts.start)
+            if opts.end is not None:
+                window[1] = ParseTime(opts.end)
+        except ValueError, e:
+            parser.error(str(e))
+        window = tuple(window)
+
+    cache = None
+    if opts.cache_dir:
+        cache = EventCache(opts.cache_dir, opts.cache_size * 1024 * 1024)
+    elif opts.cache:
+        cache = EventCache()
 
+    spill = memory_limit = None
+    if bounded:
+        spill = JobSpill(opts.spill)
+    if opts.memory_limit is not None:
+        memory_limit = opts.memory_limit * 1024 * 1024
 
+    # Every refresh of the other backends walks the whole event history of
+    # every job again, the streaming totals are kept up to date per event
+    streaming = opts.streaming or following
+    analyzer = Analyzer(opts.columnar, streaming, cache, opts.latex, spill, memory_limit, window)
+    if opts.profile:
+        analyzer.profiler = Profiler(opts.profile_functions)
+    analyzer.interval = opts.interval
+
+    checkpoint = opts.checkpoint
+    if following and (checkpoint is None) and (cache is not None) and args:
+        checkpoint = cache.CheckpointPath(args)
+
+    try:
+        if opts.serve is not None:
+            analyzer.Serve(args, opts.refresh, (opts.serve_host, opts.serve), checkpoint)
+            return
+        if opts.follow:
+            analyzer.Follow(args, opts.refresh, checkpoint)
+            return
+
+        if opts.merge:
+            try:
+                aggregates = [ReadAggregate(file) for file in args]
+            except (AggregateError, IOError), e:
+                parser.error(str(e))
+            analyzer.MergeAggregates(aggregates)
+            analyzer.Report()
+            if opts.profile:
+                analyzer.profiler.Write(opts.profile_file)
+            return
+
+        files = []
+        for file in args:
+            if not os.path.exists(file):
+                print "File %s not found" % file
+            else:
+                files.append(file)
+        if opts.lookup is not None:
+            analyzer.ParseJobs(files, opts.lookup, opts.index_dir)
+            analyzer.PrintJobs()
+            return
+        analyzer.profiler.Start('parse')
+        analyzer.ParseFiles(files, opts.processes)
+        analyzer.profiler.Stop('parse', analyzer.num_events, sum([os.path.getsize(file) for file in files]))
+
+        if opts.summarize is not None:
+            WriteAggregate(opts.summarize, analyzer.Aggregate())
+            return
+
+        analyzer.Report()
+        if opts.export is not None:
+            analyzer.profiler.Start('export')
+            analyzer.Export(opts.export, export_format)
+            analyzer.profiler.Stop('export')
+        if opts.profile:
+            analyzer.profiler.Write(opts.profile_file)
+    finally:
+        if spill is not None:
+            spill.Close()
+
+
+if __name__ == "__main__":
+    main()
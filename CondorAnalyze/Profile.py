@@ -0,0 +1,219 @@
+#!/usr/bin/python
+
+#
+# Stage profiling of a ParseLog run (--profile).
+#
+# Each stage of the run (parsing, the site summary, the metric sweeps, the
+# graphs and the report text) is bracketed by Start/Stop, which record its
+# wall and CPU time, how much it raised the peak memory of the process, and
+# what it processed.  The summary is written as JSON.
+# Without --profile the Analyzer uses a NullProfiler whose methods do
+# nothing, so the only cost is a few calls per run.
+#
+# The hot functions (--profile-functions) are found by sampling the stack
+# on a CPU time timer rather than by tracing every call: a deterministic
+# profiler (cProfile) doubled the CPU time of the per event functions it
+# was meant to measure, and made them look heavier than the rest.  The
+# cost of sampling is lost in the noise between runs.
+#
+
+import os
+import json
+import signal
+import resource
+from time import time
+
+
+# Seconds of CPU time between two samples of the stack
+sample_interval = 0.005
+
+
+def PeakMemory():
+    """
+    Return the peak resident memory of this process, in bytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def CPUTime():
+    """
+    Return the (own, children) user + system CPU seconds of this process.
+    """
+    times = os.times()
+    return times[0] + times[1], times[2] + times[3]
+
+
+class NullProfiler:
+    """
+    Profiler that records nothing.
+    """
+    def Start(self, stage):
+        pass
+
+    def Stop(self, stage, events=None, bytes=None):
+        pass
+
+
+class StackSampler:
+    """
+    Statistical profiler: every 'interval' seconds of CPU time (SIGPROF)
+    the stack of the main thread is looked at, and every function on it
+    counted.  It costs nothing per call, but the times are estimates
+    (samples * interval), there are no call counts, and the workers of
+    --jobs are not sampled.
+
+    Attributes:
+    interval - seconds of CPU time between two samples
+    samples - number of samples taken
+    own - (file, line, function) -> samples taken while it was running
+    cumulative - (file, line, function) -> samples with it on the stack
+    """
+    def __init__(self, interval=None):
+        """Initializer
+
+        Arguments:
+        interval - seconds of CPU time between two samples, sample_interval
+                   by default
+
+        """
+        if interval is None:
+            interval = sample_interval
+        self.interval = interval
+        self.samples = 0
+        self.own = {}
+        self.cumulative = {}
+        self.previous = None
+
+    def Enable(self):
+        """
+        Start sampling.
+        """
+        self.previous = signal.signal(signal.SIGPROF, self.Sample)
+        # Restart the system calls a sample lands in
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def Disable(self):
+        """
+        Stop sampling.
+        """
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous)
+
+    def Sample(self, signum, frame):
+        """
+        SIGPROF handler, count the functions of the stack of 'frame'.
+        """
+        self.samples += 1
+        seen = {}
+        own = True
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            if own:
+                self.own[key] = self.own.get(key, 0) + 1
+                own = False
+            # A recursive function is only counted once per sample
+            if not seen.has_key(key):
+                seen[key] = True
+                self.cumulative[key] = self.cumulative.get(key, 0) + 1
+            frame = frame.f_back
+
+
+class Profiler:
+    """
+    Records the wall time, CPU time and throughput of each stage of a run,
+    and optionally the hot functions (with a StackSampler).
+
+    Attributes:
+    stages - list of dictionaries, one per stage, in the order they ran
+    functions - number of hot functions to report, 0 to not profile them
+    """
+    def __init__(self, functions=0):
+        """Initializer
+
+        Arguments:
+        functions - report the 'functions' functions with the most time spent
+                    in them, 0 to not sample the stack
+
+        """
+        self.stages = []
+        self.running = {}
+        self.functions = functions
+        self.profile = None
+        if functions:
+            self.profile = StackSampler()
+        self.start = time()
+
+    def Start(self, stage):
+        """
+        Start timing 'stage'.
+        """
+        self.running[stage] = (time(), CPUTime(), PeakMemory())
+        if self.profile is not None:
+            self.profile.Enable()
+
+    def Stop(self, stage, events=None, bytes=None):
+        """
+        Stop timing 'stage', which processed 'events' events and 'bytes'
+        bytes (if known).
+
+        The peak memory of a process only ever grows, 'peak_memory_growth'
+        is how much this stage raised it: 0 for a stage that stayed below
+        the peak of the stages before, even if it used a lot of memory.
+        """
+        if self.profile is not None:
+            self.profile.Disable()
+        (wall_start, (cpu_start, children_start), peak_start) = self.running.pop(stage)
+        wall = time() - wall_start
+        cpu, children = CPUTime()
+        summary = {'stage': stage,
+                   'wall': wall,
+                   'cpu': cpu - cpu_start,
+                   'children_cpu': children - children_start,
+                   'peak_memory_growth': max(0, PeakMemory() - peak_start)}
+        if events is not None:
+            summary['events'] = events
+            summary['events_per_second'] = events / max(wall, 1e-9)
+        if bytes is not None:
+            summary['bytes'] = bytes
+            summary['bytes_per_second'] = bytes / max(wall, 1e-9)
+        self.stages.append(summary)
+
+    def HotFunctions(self):
+        """
+        Return the functions with the most time spent in them (not counting
+        their callees), as a list of dictionaries.  'time' and 'cumulative'
+        (with the callees) are estimated from the samples.
+        """
+        if self.profile is None:
+            return []
+        interval = self.profile.interval
+        hot = []
+        for (file, line, name), samples in self.profile.own.items():
+            hot.append({'function': "%s:%i(%s)" % (os.path.basename(file), line, name),
+                        'samples': samples,
+                        'time': samples * interval,
+                        'cumulative': self.profile.cumulative[(file, line, name)] * interval})
+        hot.sort(key=lambda function: function['time'], reverse=True)
+        return hot[:self.functions]
+
+    def Summary(self):
+        """
+        Return the profile of the run as a dictionary.
+        """
+        return {'wall': time() - self.start,
+                'peak_memory': PeakMemory(),
+                'stages': self.stages,
+                'functions': self.HotFunctions()}
+
+    def Write(self, path):
+        """
+        Write the Summary as JSON to 'path'.
+        """
+        f = open(path, 'w')
+        try:
+            json.dump(self.Summary(), f, indent=2, sort_keys=True)
+            f.write("\n")
+        finally:
+            f.close()
@@ -0,0 +1,277 @@
+#!/usr/bin/python
+
+#
+# Streaming quantile sketches of the per-job durations behind the report.
+#
+# The report totals and averages hide the long tail of queue and running
+# times.  A QuantileSketch counts values in logarithmic buckets, so every
+# quantile it returns is within a relative 'accuracy' of the true value,
+# its size only depends on the range of the values (a few hundred buckets
+# for durations between a second and years) and two sketches merge exactly
+# by adding their buckets.
+#
+
+import math
+
+import numpy
+
+
+class QuantileSketch:
+    """
+    Mergeable sketch of a distribution of non negative values.
+
+    Attributes:
+    accuracy - relative accuracy of the quantiles
+    buckets - bucket index -> number of values v with
+              gamma^(index-1) < v <= gamma^index
+    zeros - number of values <= 0
+    count - number of values
+    max - largest value, None if there is none
+    """
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.gamma = (1.0 + accuracy) / (1.0 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+        self.max = None
+
+    def Add(self, value, count=1):
+        """
+        Add 'value' to the distribution, 'count' times.
+        """
+        if value <= 0:
+            self.zeros += count
+        else:
+            index = int(math.ceil(math.log(value) / self.log_gamma))
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        if (self.max is None) or (value > self.max):
+            self.max = value
+
+    def AddValues(self, values):
+        """
+        Add every value of the numpy array 'values'.
+        """
+        if not len(values):
+            return
+        positive = values[values > 0]
+        self.zeros += len(values) - len(positive)
+        if len(positive):
+            indexes = numpy.ceil(numpy.log(positive) / self.log_gamma).astype(numpy.int64)
+            counts = numpy.bincount(indexes - indexes.min())
+            for offset in numpy.nonzero(counts)[0]:
+                index = int(offset + indexes.min())
+                self.buckets[index] = self.buckets.get(index, 0) + int(counts[offset])
+        self.count += len(values)
+        top = values.max().item()
+        if (self.max is None) or (top > self.max):
+            self.max = top
+
+    def Remove(self, value, count=1):
+        """
+        Take 'value', added before, out of the distribution 'count' times.
+        The max is left as it is.
+        """
+        if value <= 0:
+            self.zeros -= count
+        else:
+            index = int(math.ceil(math.log(value) / self.log_gamma))
+            left = self.buckets[index] - count
+            if left:
+                self.buckets[index] = left
+            else:
+                del self.buckets[index]
+        self.count -= count
+
+    def Merge(self, other):
+        """
+        Add the values of the sketch 'other' (of the same accuracy).
+        """
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        if (other.max is not None) and ((self.max is None) or (other.max > self.max)):
+            self.max = other.max
+
+    def Quantile(self, q):
+        """
+        Return the 'q' quantile (0 <= q <= 1) of the values, None if there
+        are none.
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0
+        for index in sorted(self.buckets.keys()):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Middle of the bucket, in relative terms
+                value = 2.0 * math.pow(self.gamma, index) / (self.gamma + 1.0)
+                return min(value, self.max)
+        return self.max
+
+
+class Distributions:
+    """
+    Sketches of the per-job totals of several duration metrics, over all
+    jobs and per site.
+
+    A job is fed one transition at a time into a 'totals' dictionary of its
+    own (Transition), and added to the sketches when it is done (Finish).
+    The duration of a transition counts for the site of the event ending it.
+
+    Attributes:
+    names - the metrics, in order
+    jobs - metric -> QuantileSketch of the total of each job
+    sites - (metric, site) -> QuantileSketch of the total of each job at
+            that site
+    """
+    def __init__(self, metrics, accuracy=0.01):
+        """Initializer
+
+        Arguments:
+        metrics - list of (name, pairs): the (eventa, eventb) transitions
+                  whose durations add up to each metric
+        accuracy - relative accuracy of the quantiles
+
+        """
+        self.metrics = metrics
+        self.accuracy = accuracy
+        self.names = [name for (name, pairs) in metrics]
+        self.pair_metrics = {}
+        for (name, pairs) in metrics:
+            for pair in pairs:
+                self.pair_metrics.setdefault(pair, []).append(name)
+        self.jobs = {}
+        for name in self.names:
+            self.jobs[name] = QuantileSketch(accuracy)
+        self.sites = {}
+
+    def Transition(self, totals, pair, duration, site):
+        """
+        Add one transition of a job to its 'totals'.
+        """
+        try:
+            names = self.pair_metrics[pair]
+        except KeyError:
+            return
+        for name in names:
+            totals[name] = totals.get(name, 0) + duration
+            key = (name, site)
+            totals[key] = totals.get(key, 0) + duration
+
+    def Finish(self, totals):
+        """
+        Add the 'totals' of a finished job to the sketches.
+        """
+        for name in self.names:
+            self.jobs[name].Add(totals.get(name, 0))
+        for key, duration in totals.items():
+            if type(key) is tuple:
+                if not self.sites.has_key(key):
+                    self.sites[key] = QuantileSketch(self.accuracy)
+                self.sites[key].Add(duration)
+
+    def AddJob(self, events):
+        """
+        Add the (event, time, site) list of a whole job.
+        """
+        totals = {}
+        for index in range(1, len(events)):
+            (event, time, site) = events[index]
+            previous = events[index - 1]
+            self.Transition(totals, (previous[0], event), time - previous[1], site)
+        self.Finish(totals)
+
+    def Merge(self, other):
+        """
+        Add the sketches of the Distributions 'other'.
+        """
+        for name in self.names:
+            self.jobs[name].Merge(other.jobs[name])
+        for key, sketch in other.sites.items():
+            if not self.sites.has_key(key):
+                self.sites[key] = QuantileSketch(self.accuracy)
+            self.sites[key].Merge(sketch)
+
+    def Copy(self):
+        """
+        Return a new Distributions holding the same sketches.
+        """
+        copy = Distributions(self.metrics, self.accuracy)
+        copy.Merge(self)
+        return copy
+
+
+class LiveDistributions(Distributions):
+    """
+    Distributions that also count the jobs still active, at their totals so
+    far, so they are up to date without a walk over the active jobs (the
+    streaming backend).  A job is counted once it starts (Start), each
+    Transition moves its totals in the sketches and Finish has nothing left
+    to do.  The max of a sketch is that of the totals ever reached, the
+    same as at the end since the totals of a job only grow in a log in time
+    order.
+    """
+    def Start(self, totals):
+        """
+        Count a new job, whose 'totals' are all 0.
+        """
+        for name in self.names:
+            self.jobs[name].Add(0)
+
+    def Transition(self, totals, pair, duration, site):
+        """
+        Add one transition of a job to its 'totals', and move them in the
+        sketches.
+        """
+        try:
+            names = self.pair_metrics[pair]
+        except KeyError:
+            return
+        for name in names:
+            old = totals.get(name, 0)
+            sketch = self.jobs[name]
+            sketch.Remove(old)
+            sketch.Add(old + duration)
+            totals[name] = old + duration
+
+            key = (name, site)
+            if not self.sites.has_key(key):
+                self.sites[key] = QuantileSketch(self.accuracy)
+            sketch = self.sites[key]
+            if totals.has_key(key):
+                sketch.Remove(totals[key])
+            totals[key] = totals.get(key, 0) + duration
+            sketch.Add(totals[key])
+
+    def Finish(self, totals):
+        """
+        Nothing to do, the 'totals' of the job are already counted.
+        """
+        pass
+
+    def AddJob(self, events):
+        """
+        Add the (event, time, site) list of a whole job.
+        """
+        totals = {}
+        self.Start(totals)
+        for index in range(1, len(events)):
+            (event, time, site) = events[index]
+            previous = events[index - 1]
+            self.Transition(totals, (previous[0], event), time - previous[1], site)
+
+    def Copy(self):
+        """
+        Return a new LiveDistributions holding the same sketches.
+        """
+        copy = LiveDistributions(self.metrics, self.accuracy)
+        copy.Merge(self)
+        return copy
+
@@ -0,0 +1,661 @@
+#!/usr/bin/python
+
+#
+# Block oriented reader for ClassAd formatted condor userlogs.
+#
+# Every event in the log is a run of "key = value" lines terminated by a
+# line containing "...".  Instead of reading the log a line at a time, the
+# file is memory mapped and split into event blocks in one sweep.
+#
+# Compressed logs (.gz, .bz2, .xz) are decompressed by a background thread
+# into a bounded queue of large buffers, which are split into event blocks
+# as they arrive.
+#
+# A time window of a (ClassAd, uncompressed) log is found by binary search
+# on the EventTime of the event blocks at sampled byte offsets, so only the
+# blocks of the window are read.
+#
+# Logs in the classic text format ("000 (123.000.000) 12/16 12:32:17 Job
+# submitted from host: ...") are told apart by their first line, and their
+# event blocks decoded by dispatching on the three digit event code.
+#
+
+import os
+import re
+import mmap
+import gzip
+import bz2
+import subprocess
+import threading
+import Queue
+from time import localtime
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        # .xz logs are read through the xz command instead
+        lzma = None
+
+from CondorTime import EpochTime, ClassicEpochTime
+
+
+# Marks the end of an event block: a line of just "...", so a "..." in the
+# text of an event does not end it.  The start of the line is checked by
+# Separators, a "^" in the pattern makes the search several times slower.
+event_separator = re.compile(r"\.\.\.[ \t\r]*$", re.M)
+
+
+def Separators(buf, pos=0):
+    """
+    Yield the match of every separator line in 'buf' after 'pos'.
+    """
+    for sep in event_separator.finditer(buf, pos):
+        index = sep.start()
+        if index == 0 or buf[index - 1] == '\n':
+            yield sep
+
+
+def ParseBlock(block, attributes=None):
+    """
+    Turn the text of one event block into a dictionary of attributes.
+
+    Arguments:
+    block - the "key = value" lines of a single event, without the separator
+    attributes - if given, a Projection; only these attributes are decoded
+
+    Only the text between the first and second '=' of a line is kept as the
+    value, lines without an '=' are ignored.
+    """
+    job_event = {}
+    if attributes is None:
+        for line in block.split('\n'):
+            key, eq, value = line.partition('=')
+            if eq:
+                job_event[key.strip()] = value.partition('=')[0].strip()
+        return job_event
+    prefixes = attributes.prefixes
+    names = attributes.names
+    for line in block.split('\n'):
+        # Most lines (Environment, Args, usage ads...) stop at this check
+        if not line.startswith(prefixes):
+            continue
+        key, eq, value = line.partition('=')
+        key = key.strip()
+        if eq and (key in names):
+            job_event[key] = value.partition('=')[0].strip()
+    return job_event
+
+
+class Projection:
+    """
+    The set of attributes ParseBlock decodes, every other line of an event is
+    skipped with a prefix check before it is split.
+    """
+    def __init__(self, names):
+        """Initializer
+
+        Arguments:
+        names - the attribute names to decode
+
+        """
+        self.names = frozenset(names)
+        self.prefixes = tuple(self.names)
+
+
+# The event types the analysis tools look at, and whether they use the site
+# (GLIDEIN_GatekeeperB) of the event
+decoded_types = {
+    '"SubmitEvent"': False,
+    '"ExecuteEvent"': True,
+    '"JobTerminatedEvent"': True,
+    '"JobEvictedEvent"': False,
+    '"JobReconnectFailedEvent"': False,
+}
+
+
+def DecodeEvent(job_event):
+    """
+    Reduce a parsed event to the (MyType, time, jobid, site) the analysis
+    tools use, or None if it is not one of the decoded_types.
+
+    'time' is in seconds since the epoch, 'jobid' is "Cluster.Proc" and
+    'site' is None for the types that do not use it.  A missing attribute
+    raises KeyError.
+    """
+    try:
+        mytype = job_event["MyType"]
+        wants_site = decoded_types[mytype]
+    except KeyError:
+        return None
+    time = EpochTime(job_event["EventTime"])
+    jobid = ".".join([job_event["Cluster"], job_event["Proc"]])
+    if wants_site:
+        return (mytype, time, jobid, job_event["GLIDEIN_GatekeeperB"])
+    return (mytype, time, jobid, None)
+
+
+# The attributes DecodeEvent reads
+decoded_attributes = Projection(["MyType", "EventTime", "Cluster", "Proc", "GLIDEIN_GatekeeperB"])
+
+
+def Unquote(value):
+    """
+    Return the ClassAd string 'value' without its double quotes.
+    """
+    if (len(value) >= 2) and value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+    return value
+
+
+def ReadBlocks(buf, pos=0, stop=None):
+    """
+    Yield (text, end) for every complete event block in 'buf' after 'pos',
+    where 'end' is the offset just after the block's separator line.
+
+    Arguments:
+    buf - a string or mmap holding userlog text
+    pos - offset of the start of an event block
+    stop - if given, only blocks starting before this offset are returned
+
+    A trailing block without a separator line is not complete and is not
+    returned.
+    """
+    size = len(buf)
+    for sep in Separators(buf, pos):
+        if (stop is not None) and (pos >= stop):
+            break
+        end = sep.end() + 1
+        if end > size:
+            end = size
+        yield buf[pos:sep.start()], end
+        pos = end
+
+
+# Extensions of the compressed logs that are read through a ChunkReader
+compressed_extensions = ('.gz', '.bz2', '.xz')
+
+# Size of the buffers a ChunkReader decompresses into, and how many of them
+# may wait to be parsed
+chunk_size = 4 * 1024 * 1024
+queued_chunks = 4
+
+
+def IsCompressed(file):
+    """
+    Return True if 'file' is a compressed log, by its extension.
+    """
+    return os.path.splitext(file)[1] in compressed_extensions
+
+
+def OpenCompressed(file):
+    """
+    Return a file object reading the decompressed contents of 'file'.
+    """
+    extension = os.path.splitext(file)[1]
+    if extension == '.gz':
+        return gzip.GzipFile(file, 'rb')
+    elif extension == '.bz2':
+        return bz2.BZ2File(file, 'rb')
+    elif extension == '.xz':
+        if lzma is not None:
+            return lzma.LZMAFile(file, 'rb')
+        return XzReader(file)
+    raise Exception("%s is not a compressed log" % file)
+
+
+class XzReader:
+    """
+    File object reading the output of the xz command decompressing a log,
+    for when there is no lzma module.  Reaching the end of the output fails
+    if xz did not exit successfully.
+    """
+    def __init__(self, file):
+        """Initializer
+
+        Arguments:
+        file - path of the .xz log
+
+        """
+        self.file = file
+        try:
+            self.xz = subprocess.Popen(["xz", "--decompress", "--stdout", file], stdout=subprocess.PIPE)
+        except OSError:
+            raise Exception("Reading %s needs the lzma module (backports.lzma) or the xz command" % file)
+
+    def read(self, size=-1):
+        data = self.xz.stdout.read(size)
+        if not data and size != 0:
+            self.Finish()
+        return data
+
+    def readline(self):
+        line = self.xz.stdout.readline()
+        if not line:
+            self.Finish()
+        return line
+
+    def Finish(self):
+        """
+        Wait for xz at the end of its output and check it succeeded.
+        """
+        if self.xz.wait() != 0:
+            raise Exception("xz failed decompressing %s (exit status %i)" % (self.file, self.xz.returncode))
+
+    def close(self):
+        """
+        Close the output, xz stops if it was not read to the end.
+        """
+        self.xz.stdout.close()
+        self.xz.wait()
+
+
+class ChunkReader(threading.Thread):
+    """
+    Background thread decompressing a log into a bounded queue of buffers,
+    so the decompression overlaps with the parsing of the buffers before.
+    """
+    def __init__(self, file):
+        """Initializer
+
+        Arguments:
+        file - path of the compressed log
+
+        """
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.input = OpenCompressed(file)
+        self.queue = Queue.Queue(queued_chunks)
+        self.stopped = False
+
+    def run(self):
+        try:
+            try:
+                while not self.stopped:
+                    chunk = self.input.read(chunk_size)
+                    if not chunk:
+                        break
+                    self.Put(chunk)
+                self.Put(None)
+            except Exception, e:
+                self.Put(e)
+        finally:
+            self.input.close()
+
+    def Put(self, item):
+        """
+        Queue 'item', giving up if the reader is stopped meanwhile.
+        """
+        while not self.stopped:
+            try:
+                self.queue.put(item, True, 0.1)
+                return
+            except Queue.Full:
+                pass
+
+    def Chunks(self):
+        """
+        Yield the decompressed buffers in order, the thread is stopped when
+        the generator is done or closed.
+        """
+        self.start()
+        try:
+            while 1:
+                chunk = self.queue.get()
+                if chunk is None:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            self.stopped = True
+
+
+def ReadCompressedBlocks(file):
+    """
+    Decompress the log 'file' in a ChunkReader thread and yield the text of
+    each complete event block.
+    """
+    rest = ""
+    for chunk in ChunkReader(file).Chunks():
+        buf = rest + chunk
+        # Only whole lines, a separator line may continue in the next chunk
+        whole = buf[:buf.rfind('\n') + 1]
+        pos = 0
+        for block, end in ReadBlocks(whole):
+            pos = end
+            yield block
+        rest = buf[pos:]
+    for block, end in ReadBlocks(rest):
+        yield block
+
+
+# Event code of a classic event -> (MyType it is decoded as, pattern of the
+# rest of its block).  The patterns match after the code, and capture the
+# cluster, proc, month, day, two digit year (newer logs only) and time of
+# day, plus the site of a grid submission.
+classic_header = r" \((\d+)\.(\d+)\.\d+\) (\d\d)/(\d\d)(?:/(\d\d))? (\d\d:\d\d:\d\d) "
+classic_events = {
+    '000': ('"SubmitEvent"', re.compile(classic_header)),
+    '001': ('"ExecuteEvent"', re.compile(classic_header)),
+    '004': ('"JobEvictedEvent"', re.compile(classic_header)),
+    '005': ('"JobTerminatedEvent"', re.compile(classic_header)),
+    '012': ('"JobHeldEvent"', re.compile(classic_header)),
+    '013': ('"JobReleaseEvent"', re.compile(classic_header)),
+    '024': ('"JobReconnectFailedEvent"', re.compile(classic_header)),
+    '027': ('"GridSubmitEvent"', re.compile(classic_header + r".*\n\s*GridResource: \S+ (\S+)")),
+}
+
+# The first line of a classic log
+classic_line = re.compile(r"\d\d\d \(\d+\.\d+\.\d+\) ")
+
+
+def IsClassicLog(file):
+    """
+    Return True if 'file' is written in the classic text format, by its
+    first line.
+    """
+    if IsCompressed(file):
+        f = OpenCompressed(file)
+    else:
+        f = open(file)
+    try:
+        return classic_line.match(f.readline()) is not None
+    finally:
+        f.close()
+
+
+class ClassicDecoder:
+    """
+    Turns the event blocks of a classic log into the (MyType, time, jobid,
+    site) of DecodeEvent.
+
+    Older logs leave the year out of their timestamps.  The first event is
+    taken to be in the last year before 'latest', and the year is moved on
+    whenever the month goes backwards.
+    """
+    def __init__(self, latest):
+        """Initializer
+
+        Arguments:
+        latest - no event is later than this, in seconds since epoch
+                 (usually the modification time of the log)
+
+        """
+        self.latest = latest
+        self.year = None
+        self.month = 0
+
+    def Decode(self, block):
+        """
+        Decode one event block, or return None if it is not one of the
+        classic_events.  A malformed block raises ValueError.
+        """
+        try:
+            mytype, pattern = classic_events[block[:3]]
+        except KeyError:
+            return None
+        match = pattern.match(block, 3)
+        if match is None:
+            raise ValueError("Malformed %s event: %r" % (block[:3], block[:80]))
+        groups = match.groups()
+        month = int(groups[2])
+        day = int(groups[3])
+        if groups[4] is not None:
+            time = ClassicEpochTime(2000 + int(groups[4]), month, day, groups[5])
+        elif self.year is None:
+            self.year = localtime(self.latest)[0]
+            time = ClassicEpochTime(self.year, month, day, groups[5])
+            if time > self.latest + 86400:
+                self.year -= 1
+                time = ClassicEpochTime(self.year, month, day, groups[5])
+        else:
+            if month < self.month:
+                self.year += 1
+            time = ClassicEpochTime(self.year, month, day, groups[5])
+        self.month = month
+        jobid = "%i.%i" % (int(groups[0]), int(groups[1]))
+        if len(groups) > 6:
+            return (mytype, time, jobid, groups[6])
+        return (mytype, time, jobid, None)
+
+
+def NextBlockStart(buf, pos):
+    """
+    Return the offset of the first event block starting at or after 'pos'
+    (the end of the next separator line), or len(buf) if there is none.
+    """
+    if pos == 0:
+        return 0
+    for sep in Separators(buf, pos):
+        return min(sep.end() + 1, len(buf))
+    return len(buf)
+
+
+def SplitLog(file, parts, start=0, end=None):
+    """
+    Cut 'file' (or its event blocks starting in [start, end)) into at most
+    'parts' byte ranges of about the same size, each starting at an event
+    block.  Returns a list of (start, end) offsets.
+    """
+    size = os.path.getsize(file)
+    if end is None:
+        end = size
+    if (size == 0) or (parts <= 1) or IsCompressed(file):
+        return [(start, end)]
+    f = open(file)
+    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        cuts = [start]
+        for part in range(1, parts):
+            cut = NextBlockStart(buf, max(start + (end - start) * part / parts, cuts[-1]))
+            if cut > cuts[-1] and cut < end:
+                cuts.append(cut)
+    finally:
+        buf.close()
+        f.close()
+    cuts.append(end)
+    return [(cuts[i], cuts[i + 1]) for i in range(len(cuts) - 1)]
+
+
+# The attribute BlockTime reads
+time_attributes = Projection(["EventTime"])
+
+# A binary search stops once the window start is known to within this many
+# bytes, the rest is read
+seek_granularity = 64 * 1024
+
+
+def BlockTime(buf, pos):
+    """
+    Return (time, end) of the first event block at or after 'pos' that has
+    an EventTime, where 'end' is the offset just after it.  None is returned
+    when there is none.
+    """
+    for block, end in ReadBlocks(buf, pos):
+        value = ParseBlock(block, time_attributes).get("EventTime")
+        if value is not None:
+            return EpochTime(value), end
+    return None
+
+
+def SeekTime(buf, when, low=0):
+    """
+    Return the offset of an event block of the userlog in 'buf' before every
+    event with a time >= 'when', at most about seek_granularity bytes before
+    the first one.  The log has to be in EventTime order.
+
+    Arguments:
+    low - start of an event block known to be before the first event of
+          'when' (0 at worst)
+    """
+    high = len(buf)
+    while high - low > seek_granularity:
+        middle = (low + high) / 2
+        pos = NextBlockStart(buf, middle)
+        found = None
+        if pos < high:
+            found = BlockTime(buf, pos)
+        if (found is not None) and (found[0] < when):
+            low = pos
+        else:
+            high = middle
+    return low
+
+
+def WindowRange(file, start=None, end=None):
+    """
+    Return the (first, last) byte offsets of the event blocks of 'file' that
+    may hold events with a time in [start, end] (either may be None).  The
+    blocks starting in [first, last) have to be read, and their events
+    outside of the window dropped.  'last' is None when the blocks up to
+    the end of the log have to be read.
+
+    Compressed and classic format logs are not searched, (0, None) is
+    returned for them.
+    """
+    if IsCompressed(file) or (not os.path.getsize(file)) or IsClassicLog(file):
+        return (0, None)
+    f = open(file)
+    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        first = 0
+        if start is not None:
+            first = SeekTime(buf, start)
+        last = None
+        if end is not None:
+            pos = SeekTime(buf, end + 1, first)
+            # The first block after the window ends the range
+            for block, block_end in ReadBlocks(buf, pos):
+                value = ParseBlock(block, time_attributes).get("EventTime")
+                if (value is not None) and (EpochTime(value) > end):
+                    last = pos
+                    break
+                pos = block_end
+    finally:
+        buf.close()
+        f.close()
+    return (first, last)
+
+
+class LogTail:
+    """
+    Reader for a userlog that may still be growing.
+
+    'offset' is the byte offset just after the last complete event block
+    read, each ReadNew() continues from there.  A partially written block at
+    the end of the file is left for the next call.
+
+    A compressed log can only be read whole, 'offset' is then its size once
+    it was read.
+
+    'classic' is whether the log is in the classic text format, None until
+    something was read.
+    """
+    def __init__(self, file, offset=0, attributes=None):
+        """Initializer
+
+        Arguments:
+        file - path of the userlog
+        offset - byte offset to start reading at (start of an event block)
+        attributes - if given, a Projection of the attributes to decode
+
+        """
+        self.file = file
+        self.offset = offset
+        self.attributes = attributes
+        self.classic = None
+        self.decoder = None
+
+    def ReadNew(self, stop=None):
+        """
+        Memory map the log and yield each complete event after 'offset' as a
+        dictionary of its attributes.
+
+        Arguments:
+        stop - if given, only read the blocks starting before this offset
+        """
+        for block in self.ReadBlocks(stop):
+            yield ParseBlock(block, self.attributes)
+
+    def ReadDecoded(self, stop=None):
+        """
+        Yield the (MyType, time, jobid, site) of DecodeEvent for each complete
+        event after 'offset', in a log of either format.
+
+        Arguments:
+        stop - if given, only read the blocks starting before this offset
+        """
+        if self.classic is None:
+            if not os.path.getsize(self.file):
+                return
+            self.classic = IsClassicLog(self.file)
+            if self.classic:
+                self.decoder = ClassicDecoder(os.path.getmtime(self.file))
+        if self.classic:
+            decode = self.decoder.Decode
+            for block in self.ReadBlocks(stop):
+                decoded = decode(block)
+                if decoded is not None:
+                    yield decoded
+            return
+        attributes = self.attributes
+        for block in self.ReadBlocks(stop):
+            decoded = DecodeEvent(ParseBlock(block, attributes))
+            if decoded is not None:
+                yield decoded
+
+    def ReadBlocks(self, stop=None):
+        """
+        Yield the text of each complete event block after 'offset', see
+        ReadNew.
+        """
+        size = os.path.getsize(self.file)
+        if size < self.offset:
+            raise Exception("%s is smaller than the %i bytes already read, was it truncated?" % (self.file, self.offset))
+        if size == self.offset:
+            return
+        if IsCompressed(self.file):
+            if self.offset:
+                raise Exception("%s changed after it was read, a compressed log can only be read whole" % self.file)
+            for block in ReadCompressedBlocks(self.file):
+                yield block
+            self.offset = size
+            return
+        f = open(self.file)
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for block, end in ReadBlocks(buf, self.offset, stop):
+                self.offset = end
+                yield block
+        finally:
+            buf.close()
+            f.close()
+
+
+def ReadEvents(file, start=0, stop=None, attributes=None):
+    """
+    Memory map the log 'file' and yield each complete event as a dictionary
+    of its attributes.
+
+    Arguments:
+    start - offset of the first event block to read
+    stop - if given, only read the blocks starting before this offset
+    attributes - if given, a Projection of the attributes to decode
+
+    A compressed log is always read whole.
+    """
+    return LogTail(file, start, attributes).ReadNew(stop)
+
+
+def ReadDecoded(file, start=0, stop=None):
+    """
+    Yield the (MyType, time, jobid, site) of DecodeEvent for each complete
+    event of the log 'file', in either format.
+
+    Arguments:
+    start - offset of the first event block to read
+    stop - if given, only read the blocks starting before this offset
+    """
+    return LogTail(file, start, decoded_attributes).ReadDecoded(stop)
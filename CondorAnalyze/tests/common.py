@@ -0,0 +1,38 @@
+#
+# Helpers shared by the tests: synthetic logs from GenerateLog, written to
+# a temporary directory removed after each test.
+#
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from GenerateLog import LogGenerator
+
+
+class LogTestCase(unittest.TestCase):
+    """
+    A test with a temporary directory 'directory' to write logs to.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="condor_log_test")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def WriteLog(self, name, events, seed=1, **options):
+        """
+        Write a synthetic log of 'events' events, and return its path.
+        'options' are passed to the LogGenerator.
+        """
+        path = os.path.join(self.directory, name)
+        out = open(path, 'w')
+        try:
+            LogGenerator(seed=seed, **options).Write(out, events=events)
+        finally:
+            out.close()
+        return path
@@ -0,0 +1,49 @@
+import os
+import zlib
+import cPickle
+
+from common import LogTestCase, unittest
+
+from Aggregate import WriteAggregate, ReadAggregate, AggregateError
+from ParseLog import Analyzer
+
+
+class AggregateTest(LogTestCase):
+
+    def testMergeMatchesDirectParse(self):
+        # Two hosts, their clusters kept apart
+        logs = [self.WriteLog("host1.log", 3000, seed=1), self.WriteLog("host2.log", 3000, seed=2)]
+        shifted = []
+        for line in open(logs[1]):
+            if line.startswith("Cluster = "):
+                line = "Cluster = %i\n" % (int(line.split()[2]) + 100000)
+            shifted.append(line)
+        open(logs[1], 'w').write("".join(shifted))
+
+        direct = Analyzer()
+        direct.ParseFiles(logs)
+
+        paths = []
+        for index, log in enumerate(logs):
+            analyzer = Analyzer()
+            analyzer.ParseFile(log)
+            paths.append(os.path.join(self.directory, "partial%i" % index))
+            WriteAggregate(paths[-1], analyzer.Aggregate())
+        merged = Analyzer()
+        merged.MergeAggregates([ReadAggregate(path) for path in paths])
+
+        self.assertEqual(merged.Summary(merged.GetMetrics()), direct.Summary(direct.GetMetrics()))
+        self.assertEqual(merged.SiteSummaries(merged.GetMetrics()), direct.SiteSummaries(direct.GetMetrics()))
+        self.assertEqual(merged.Quantiles(merged.GetDistributions()), direct.Quantiles(direct.GetDistributions()))
+        self.assertEqual(merged.SummarizeSites(300), direct.SummarizeSites(300))
+
+    def testPickleRejected(self):
+        path = os.path.join(self.directory, "pickled")
+        open(path, 'wb').write(zlib.compress(cPickle.dumps({'version': 4})))
+        self.assertRaises(AggregateError, ReadAggregate, path)
+        open(path, 'wb').write(cPickle.dumps({'version': 4}))
+        self.assertRaises(AggregateError, ReadAggregate, path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+
+from common import LogTestCase, unittest
+
+from JobSpill import JobSpill
+from ParseLog import Analyzer, Job, NewDistributions, RUNNING_TIME, GOOD_RUNNING_TIME, QUEUE_TIME, WASTED_TIME, PREEMPTIONS
+
+events = (Job.LOCAL_SUBMIT, Job.GRID_SUBMIT, Job.RUNNING, Job.STOP, Job.HOLD, Job.RELEASE, Job.EVICT)
+
+
+class BackendTest(LogTestCase):
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+        # Evictions, holds and reconnects well above the defaults
+        self.log = self.WriteLog("backends.log", 5000, evict_rate=0.3, hold_rate=0.1, reconnect_rate=0.3)
+        self.expected = self.Parse()
+
+    def Parse(self, **options):
+        analyzer = Analyzer(**options)
+        analyzer.ParseFile(self.log)
+        return analyzer
+
+    def Backends(self):
+        return {'columnar': self.Parse(columnar=True),
+                'streaming': self.Parse(streaming=True),
+                'spill': self.Parse(spill=JobSpill(os.path.join(self.directory, "spill")))}
+
+    def testPerJobWalkMatchesMetrics(self):
+        # The totals of the single pass are those of the per job queries
+        expected = self.expected
+        metrics = expected.GetMetrics()
+        self.assertEqual(metrics.TotalTime(*RUNNING_TIME), expected.GetTotalTime(*RUNNING_TIME))
+        self.assertEqual(metrics.TotalTime(*QUEUE_TIME), expected.GetTotalTime(*QUEUE_TIME))
+        self.assertEqual(metrics.TotalTime(*WASTED_TIME), expected.GetTotalTime(*WASTED_TIME))
+        self.assertEqual(metrics.LastTotalTime(*GOOD_RUNNING_TIME), expected.GetLastTotalTime(*GOOD_RUNNING_TIME))
+        self.assertEqual(metrics.EventOccurances(*PREEMPTIONS), expected.GetEventOccurances(*PREEMPTIONS))
+        self.assertEqual(metrics.evict_places, expected.GetEvictPlaces())
+        self.assertTrue(metrics.EventOccurances(*PREEMPTIONS) > 0)
+
+    def testBackendsMatchDefault(self):
+        expected = self.expected
+        metrics = expected.GetMetrics()
+        for name, analyzer in self.Backends().items():
+            self.assertEqual(analyzer.Summary(analyzer.GetMetrics()), expected.Summary(metrics), name)
+            self.assertEqual(analyzer.SiteSummaries(analyzer.GetMetrics()), expected.SiteSummaries(metrics), name)
+            self.assertEqual(analyzer.GetMetrics().evict_places, metrics.evict_places, name)
+            self.assertEqual(analyzer.Quantiles(analyzer.GetDistributions()), expected.Quantiles(expected.GetDistributions()), name)
+            self.assertEqual(analyzer.SummarizeSites(300), expected.SummarizeSites(300), name)
+
+    def testSitesAddUpToTheWorkflow(self):
+        for analyzer in [self.expected] + self.Backends().values():
+            metrics = analyzer.GetMetrics()
+            summaries = analyzer.SiteSummaries(metrics)
+            self.assertFalse(summaries.has_key(""))
+            parts = summaries.values() + [analyzer.UnsitedSummary(metrics)]
+            self.assertTrue(parts[-1]['jobs'] > 0)
+            total = analyzer.Summary(metrics)
+            for name in ('jobs', 'preemptions'):
+                self.assertEqual(sum([part[name] for part in parts]), total[name])
+            for name in ('queue_hours', 'running_hours', 'wasted_hours', 'good_running_hours'):
+                self.assertAlmostEqual(sum([part[name] for part in parts]), total[name])
+            self.assertAlmostEqual(sum([part['throughput'] for part in summaries.values()]) + \
+                                   parts[-1]['running_hours'] * 3600 / (analyzer.max_time - analyzer.min_time), total['throughput'])
+
+    def testSketchesOfTheMetricsWalk(self):
+        # The sketches filled along with the Metrics are those of a walk of
+        # their own
+        def Sketches(distributions):
+            sketches = distributions.sites.items() + distributions.jobs.items()
+            return dict([(key, (sketch.buckets, sketch.zeros, sketch.count, sketch.max)) for key, sketch in sketches])
+        expected = NewDistributions()
+        for jobid, events in self.expected.JobHistories():
+            expected.AddJob(events)
+        for analyzer in (self.expected, self.Parse(columnar=True)):
+            (metrics, distributions) = analyzer.WalkJobs()
+            self.assertTrue(analyzer.GetDistributions() is distributions)
+            self.assertEqual(Sketches(distributions), Sketches(expected))
+
+    def testColumnarJobQueries(self):
+        columnar = self.Parse(columnar=True)
+        self.assertEqual(sorted(columnar.jobs.keys()), sorted(self.expected.jobs.keys()))
+        for jobid, job in self.expected.jobs.items():
+            other = columnar.jobs[jobid]
+            for eventa in events:
+                self.assertEqual([tuple(event) for event in other.GetEvents(eventa)], job.GetEvents(eventa))
+                self.assertEqual(other.GetTimeOfLast(eventa), job.GetTimeOfLast(eventa))
+                self.assertEqual(other.GetTimeOfFirst(eventa), job.GetTimeOfFirst(eventa))
+                self.assertEqual(other.GetEventOccurances(eventa), job.GetEventOccurances(eventa))
+                for eventb in events:
+                    self.assertEqual(other.GetTimeOfLast(eventa, eventb), job.GetTimeOfLast(eventa, eventb))
+                    self.assertEqual(other.GetTimeBetween(eventa, eventb), job.GetTimeBetween(eventa, eventb))
+                    self.assertEqual(other.GetEventOccurances(eventa, eventb), job.GetEventOccurances(eventa, eventb))
+
+
+if __name__ == "__main__":
+    unittest.main()
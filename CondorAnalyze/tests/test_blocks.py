@@ -0,0 +1,63 @@
+import mmap
+import gzip
+
+from common import LogTestCase, unittest
+
+import UserLogReader
+from UserLogReader import ReadBlocks, ReadEvents, ReadCompressedBlocks, SplitLog
+
+
+class BlocksTest(LogTestCase):
+
+    def testFinalSeparatorWithoutNewline(self):
+        buf = 'MyType = "A"\n...\nMyType = "B"\n...'
+        self.assertEqual(list(ReadBlocks(buf)), [('MyType = "A"\n', 17), ('MyType = "B"\n', len(buf))])
+
+    def testIncompleteFinalBlock(self):
+        buf = 'MyType = "A"\n...\nMyType = "B"\n'
+        self.assertEqual(list(ReadBlocks(buf)), [('MyType = "A"\n', 17)])
+
+    def testSeparatorInEventText(self):
+        first = 'MyType = "A"\nReason = "waiting..."\nHoldReason = "more to come..."\n'
+        second = 'MyType = "B"\n'
+        buf = first + '...\n' + second + '...\n'
+        self.assertEqual(list(ReadBlocks(buf)), [(first, len(first) + 4), (second, len(buf))])
+        self.assertEqual(UserLogReader.NextBlockStart(buf, 20), len(first) + 4)
+
+    def testEventsSplitAcrossParts(self):
+        log = self.WriteLog("g.log", 2000)
+        events = list(ReadEvents(log))
+        f = open(log)
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            whole = list(ReadBlocks(buf))
+            for parts in (2, 3, 7, 64):
+                blocks = []
+                for (start, end) in SplitLog(log, parts):
+                    blocks.extend(ReadBlocks(buf, start, end))
+                self.assertEqual(blocks, whole)
+            buf.close()
+        finally:
+            f.close()
+        self.assertEqual(len(whole), len(events))
+
+    def testEventsSplitAcrossChunks(self):
+        log = self.WriteLog("g.log", 100)
+        compressed = gzip.open(log + ".gz", 'wb')
+        try:
+            compressed.write(open(log).read())
+        finally:
+            compressed.close()
+        whole = [block for block, end in ReadBlocks(open(log).read())]
+        chunk_size = UserLogReader.chunk_size
+        try:
+            # Chunk ends land inside blocks and inside separator lines
+            for size in (2, 3, 97, 1000):
+                UserLogReader.chunk_size = size
+                self.assertEqual(list(ReadCompressedBlocks(log + ".gz")), whole)
+        finally:
+            UserLogReader.chunk_size = chunk_size
+
+
+if __name__ == "__main__":
+    unittest.main()
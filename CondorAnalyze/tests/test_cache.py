@@ -0,0 +1,63 @@
+import os
+import cPickle
+
+from common import LogTestCase, unittest
+
+import EventCache as cache_module
+import ParseLog
+from EventCache import EventCache
+from ParseLog import Analyzer
+
+
+def NoParsing(*args, **kwargs):
+    raise AssertionError("The log was parsed instead of read from the cache")
+
+
+class CacheTest(LogTestCase):
+
+    def Summary(self, processes, cache):
+        analyzer = Analyzer(cache=cache)
+        analyzer.ParseFiles([self.log], processes)
+        return analyzer.Summary(analyzer.GetMetrics())
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+        self.log = self.WriteLog("cached.log", 3000)
+
+    def testWarmRunHitsCache(self):
+        for processes in (1, 2):
+            cache_dir = os.path.join(self.directory, "cache%i" % processes)
+            cache = EventCache(cache_dir)
+            expected = self.Summary(processes, None)
+            self.assertEqual(self.Summary(processes, cache), expected)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # The workers are forked after this, they see it as well
+            saved = (cache_module.LogTail, ParseLog.ReadDecoded)
+            cache_module.LogTail = ParseLog.ReadDecoded = NoParsing
+            try:
+                self.assertEqual(self.Summary(processes, cache), expected)
+            finally:
+                (cache_module.LogTail, ParseLog.ReadDecoded) = saved
+
+
+    def testPickleNotLoaded(self):
+        # A pickle planted in a shared cache directory is never unpickled,
+        # the log is parsed again
+        cache_dir = os.path.join(self.directory, "cache")
+        cache = EventCache(cache_dir)
+        expected = self.Summary(1, cache)
+        planted = os.path.join(self.directory, "planted")
+        class Payload(object):
+            def __reduce__(self):
+                return (open, (planted, 'w'))
+        path = cache.CachePath(os.path.abspath(self.log))
+        open(path, 'wb').write(cPickle.dumps({'version': 2, 'payload': Payload()}, 2))
+        self.assertEqual(self.Summary(1, cache), expected)
+        self.assertFalse(os.path.exists(planted))
+        # and the cache was written again
+        self.assertTrue(cache.Open(os.path.abspath(self.log)).fingerprint is not None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import time
+
+from common import LogTestCase, unittest
+
+from UserLogReader import ReadDecoded, IsClassicLog
+
+classic_log = """000 (1234.000.000) 12/31 23:59:30 Job submitted from host: <10.0.0.1:9618>
+...
+027 (1234.000.000) 12/31 23:59:40 Job submitted to grid resource
+    GridResource: gt2 gatekeeper.example.org/jobmanager-pbs
+    GridJobId: gt2 gatekeeper.example.org/jobmanager-pbs https://gatekeeper.example.org:40000/1/
+...
+001 (1234.000.000) 01/01 00:01:00 Job executing on host: gt2 gatekeeper.example.org/jobmanager-pbs
+...
+012 (1234.000.000) 01/01 00:30:00 Job was held.
+	Unspecified gridmanager error
+	Code 0 Subcode 0
+...
+013 (1234.000.000) 01/01 01:00:00 Job was released.
+	via condor_release (by user someone)
+...
+004 (1234.000.000) 01/02 02:00:00 Job was evicted.
+	(0) Job was not checkpointed.
+...
+005 (1234.000.000) 01/03 03:00:00 Job terminated.
+	(1) Normal termination (return value 0)
+...
+"""
+
+
+def Epoch(year, stamp):
+    return int(time.mktime(time.strptime("%i/%s" % (year, stamp), "%Y/%m/%d %H:%M:%S")))
+
+
+class ClassicTest(LogTestCase):
+
+    def testDecodeClassicLog(self):
+        path = os.path.join(self.directory, "classic.log")
+        open(path, 'w').write(classic_log)
+        # Timestamps without a year are in the year before the log was
+        # last written, moving on at the new year
+        written = Epoch(2012, "01/05 12:00:00")
+        os.utime(path, (written, written))
+        self.assertTrue(IsClassicLog(path))
+        site = "gatekeeper.example.org/jobmanager-pbs"
+        expected = [('"SubmitEvent"', Epoch(2011, "12/31 23:59:30"), "1234.0", None),
+                    ('"GridSubmitEvent"', Epoch(2011, "12/31 23:59:40"), "1234.0", site),
+                    ('"ExecuteEvent"', Epoch(2012, "01/01 00:01:00"), "1234.0", None),
+                    ('"JobHeldEvent"', Epoch(2012, "01/01 00:30:00"), "1234.0", None),
+                    ('"JobReleaseEvent"', Epoch(2012, "01/01 01:00:00"), "1234.0", None),
+                    ('"JobEvictedEvent"', Epoch(2012, "01/02 02:00:00"), "1234.0", None),
+                    ('"JobTerminatedEvent"', Epoch(2012, "01/03 03:00:00"), "1234.0", None)]
+        self.assertEqual(list(ReadDecoded(path)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
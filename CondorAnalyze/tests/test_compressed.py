@@ -0,0 +1,64 @@
+import os
+import bz2
+import gzip
+import subprocess
+
+from common import LogTestCase, unittest
+
+import UserLogReader
+from UserLogReader import ReadEvents, ReadDecoded, XzReader
+
+
+class CompressedTest(LogTestCase):
+
+    def Compress(self, log):
+        """
+        Write gzip, bz2 and xz copies of 'log', return their paths.
+        """
+        data = open(log, 'rb').read()
+        gz = gzip.open(log + ".gz", 'wb')
+        gz.write(data)
+        gz.close()
+        bz = bz2.BZ2File(log + ".bz2", 'wb')
+        bz.write(data)
+        bz.close()
+        subprocess.check_call(["xz", "--keep", log])
+        return [log + ".gz", log + ".bz2", log + ".xz"]
+
+    def testSameEventsAsPlainLog(self):
+        # Larger than a decompressed chunk, so blocks span chunks
+        log = self.WriteLog("g.log", 20000)
+        self.assertTrue(os.path.getsize(log) > UserLogReader.chunk_size)
+        events = list(ReadEvents(log))
+        decoded = list(ReadDecoded(log))
+        for compressed in self.Compress(log):
+            self.assertEqual(list(ReadEvents(compressed)), events)
+            self.assertEqual(list(ReadDecoded(compressed)), decoded)
+
+    def testXzCommand(self):
+        log = self.WriteLog("g.log", 200)
+        (gz, bz, xz) = self.Compress(log)
+        lzma = UserLogReader.lzma
+        UserLogReader.lzma = None
+        try:
+            self.assertEqual(list(ReadEvents(xz)), list(ReadEvents(log)))
+        finally:
+            UserLogReader.lzma = lzma
+
+    def testXzFailure(self):
+        log = self.WriteLog("g.log", 200)
+        (gz, bz, xz) = self.Compress(log)
+        damaged = open(xz, 'rb').read()
+        open(xz, 'wb').write(damaged[:len(damaged) / 2])
+        reader = XzReader(xz)
+        try:
+            def ReadAll():
+                while reader.read(4096):
+                    pass
+            self.assertRaises(Exception, ReadAll)
+        finally:
+            reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
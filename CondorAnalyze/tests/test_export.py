@@ -0,0 +1,45 @@
+import os
+
+from common import LogTestCase, unittest
+
+from Metrics import Metrics
+from ParseLog import Analyzer, Job, JOB_COLUMNS
+
+
+class ExportTest(LogTestCase):
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+        self.analyzer = Analyzer()
+        self.analyzer.ParseFile(self.WriteLog("export.log", 3000))
+
+    def testTablesShareTimeBase(self):
+        analyzer = self.analyzer
+        occupancy = analyzer.GetOccupancy(300)
+        names, (sites, site_times, running) = analyzer.SiteTable(occupancy)
+        self.assertEqual(names[1], 'interval_start_epoch')
+        names, (submit_times, submissions, terminations) = analyzer.SubmissionTable(occupancy)
+        self.assertEqual(names[0], 'interval_start_epoch')
+        self.assertEqual(submit_times.min(), analyzer.min_time)
+        for times in (site_times, submit_times):
+            self.assertTrue(((times - analyzer.min_time) % 300 == 0).all())
+            self.assertTrue((times >= analyzer.min_time).all())
+            self.assertTrue((times <= analyzer.max_time).all())
+        self.assertEqual(submissions.sum(), analyzer.GetEventOccurances(Job.RUNNING))
+
+    def testSiteNamesUnquoted(self):
+        self.analyzer.Export(os.path.join(self.directory, "out"), ['csv'])
+        for line in open(os.path.join(self.directory, "out-sites.csv")).readlines()[1:]:
+            self.assertTrue(line.startswith("site"))
+
+    def testJobTableMatchesMetrics(self):
+        names, columns = self.analyzer.JobTable()
+        for row, jobid in enumerate(columns[0].tolist()):
+            metrics = Metrics(Job.EVICT)
+            metrics.AddJob(self.analyzer.jobs[jobid].events)
+            for index, (name, method, args) in enumerate(JOB_COLUMNS):
+                self.assertEqual(columns[index + 1][row], getattr(metrics, method)(*args))
+
+
+if __name__ == "__main__":
+    unittest.main()
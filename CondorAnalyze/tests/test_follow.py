@@ -0,0 +1,83 @@
+import os
+
+from common import LogTestCase, unittest
+
+from ParseLog import Analyzer
+
+
+class FollowTest(LogTestCase):
+
+    def testPolledStreamMatchesParse(self):
+        log = self.WriteLog("whole.log", 3000)
+        expected = Analyzer()
+        expected.ParseFile(log)
+
+        # The log grows in two steps, the second cut inside an event
+        text = open(log).read()
+        cut = text.index("...\n", len(text) / 2) + 20
+        growing = os.path.join(self.directory, "growing.log")
+        analyzer = Analyzer(streaming=True)
+        tails = {}
+        open(growing, 'w').write(text[:cut])
+        self.assertTrue(analyzer.Poll([growing], tails))
+        open(growing, 'a').write(text[cut:])
+        self.assertTrue(analyzer.Poll([growing], tails))
+        self.assertEqual(analyzer.Poll([growing], tails), 0)
+
+        self.assertEqual(analyzer.num_events, expected.num_events)
+        self.assertEqual(analyzer.Documents(), expected.Documents())
+
+
+    def testDocumentsOnlyRebuiltForNewEvents(self):
+        log = self.WriteLog("whole.log", 3000)
+        text = open(log).read()
+        cut = text.index("...\n", len(text) / 2) + 4
+        growing = os.path.join(self.directory, "growing.log")
+        analyzer = Analyzer(streaming=True)
+        tails = {}
+        open(growing, 'w').write(text[:cut])
+        analyzer.Poll([growing], tails)
+        documents = analyzer.Documents(300)
+        distributions = analyzer.GetDistributions()
+        self.assertTrue(analyzer.Documents(300) is documents)
+
+        # The sketches are kept up to date, not copied
+        open(growing, 'a').write(text[cut:])
+        analyzer.Poll([growing], tails)
+        self.assertTrue(analyzer.GetDistributions() is distributions)
+        self.assertFalse(analyzer.Documents(300) is documents)
+        expected = Analyzer()
+        expected.ParseFile(log)
+        self.assertEqual(analyzer.Documents(300), expected.Documents(300))
+
+    def testResumeFromCheckpoint(self):
+        log = self.WriteLog("whole.log", 3000, evict_rate=0.3, hold_rate=0.1)
+        expected = Analyzer()
+        expected.ParseFile(log)
+
+        text = open(log).read()
+        cut = text.index("...\n", len(text) / 2) + 20
+        growing = os.path.join(self.directory, "growing.log")
+        checkpoint = os.path.join(self.directory, "checkpoint")
+        open(growing, 'w').write(text[:cut])
+        first = Analyzer(streaming=True)
+        tails = first.StartFollowing([growing], checkpoint)
+        self.assertEqual(tails, {})
+        first.Poll([growing], tails)
+        first.SaveCheckpoint(checkpoint, tails)
+
+        # A restarted follower only reads what was appended
+        open(growing, 'a').write(text[cut:])
+        resumed = Analyzer(streaming=True)
+        tails = resumed.StartFollowing([growing], checkpoint)
+        self.assertEqual(resumed.num_events, first.num_events)
+        self.assertEqual(resumed.Poll([growing], tails), expected.num_events - first.num_events)
+        self.assertEqual(resumed.Documents(), expected.Documents())
+
+        # Nor from a log that was replaced
+        open(growing, 'w').write(text[:cut].replace("Cluster = ", "Cluster = 9"))
+        self.assertEqual(Analyzer(streaming=True).StartFollowing([growing], checkpoint), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import gzip
+import shutil
+
+from common import LogTestCase, unittest
+
+from JobIndex import ParseJobRange, JobRangeError, JobKey
+from ParseLog import Analyzer
+
+
+class JobIndexTest(LogTestCase):
+
+    def Histories(self, file, jobs):
+        analyzer = Analyzer()
+        analyzer.ParseJobs([file], jobs, self.directory)
+        return dict([(jobid, job.events) for jobid, job in analyzer.jobs.items()])
+
+    def testCompressedLogIsScanned(self):
+        log = self.WriteLog("lookup.log", 2000)
+        compressed = gzip.open(log + ".gz", 'wb')
+        shutil.copyfileobj(open(log, 'rb'), compressed)
+        compressed.close()
+
+        whole = Analyzer()
+        whole.ParseFile(log)
+        for jobs in ("7.0", "7", "10-20"):
+            (first, last) = ParseJobRange(jobs)
+            expected = dict([(jobid, job.events) for jobid, job in whole.jobs.items() if first <= JobKey(*jobid.split('.')) <= last])
+            self.assertTrue(expected)
+            self.assertEqual(self.Histories(log, jobs), expected)
+            self.assertEqual(self.Histories(log + ".gz", jobs), expected)
+
+    def testBadRanges(self):
+        for text in ("", "abc", "12.x", "1.2.3", "5-3", "-1", "99999999999"):
+            self.assertRaises(JobRangeError, ParseJobRange, text)
+        self.assertEqual(ParseJobRange("12.3"), (JobKey(12, 3), JobKey(12, 3)))
+
+
+if __name__ == "__main__":
+    unittest.main()
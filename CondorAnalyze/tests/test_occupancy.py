@@ -0,0 +1,109 @@
+import copy
+
+from common import LogTestCase, unittest
+
+import ParseLog
+from ParseLog import Analyzer
+
+
+def LoopSummarizeSites(sites, interval, min_time):
+    """
+    The pop(0) loop SummarizeSites the binning replaced, returning the
+    site series and the submissions of the intervals.
+    """
+    submissions = {'Submissions': {}, 'Terminations': {}}
+    totals = {}
+    for site in sites.keys():
+        running_total = 0
+        totals[site] = []
+        for (ts, change) in sorted(sites[site]):
+            running_total += change
+            totals[site].append( (ts, running_total) )
+
+    sites_return = {}
+    for key in totals.keys():
+        sites_return[key] = []
+        cur_int = 1
+        cur_num = 0
+        cur_max = 0
+        sub_val = 0
+        while len(totals[key]):
+            if totals[key][0][0] > (interval * cur_int):
+                if cur_num == 0:
+                    if len(sites_return[key]) == 0:
+                        sites_return[key].append( 0.0 )
+                    else:
+                        sites_return[key].append(sites_return[key][-1])
+                else:
+                    sites_return[key].append( cur_max )
+                cur_num = 0
+                cur_max = 0
+                cur_int += 1
+            else:
+                cur_num += 1
+                kind = 'Terminations'
+                if totals[key][0][1] - sub_val > 0:
+                    kind = 'Submissions'
+                when = interval * cur_int
+                submissions[kind][when] = submissions[kind].get(when, 0) + 1
+                sub_val = totals[key][0][1]
+                if totals[key][0][1] > cur_max:
+                    cur_max = totals[key][0][1]
+                totals[key].pop(0)
+
+    max_len = max([len(series) for series in sites_return.values()])
+    for key in sites_return.keys():
+        while len(sites_return[key]) < max_len:
+            sites_return[key].append(0)
+
+    series = {}
+    for key in sites_return.keys():
+        series[key] = {}
+        for i in range(max_len):
+            series[key][(i * interval) + min_time] = sites_return[key][i]
+    return (series, submissions)
+
+
+class OccupancyTest(LogTestCase):
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+        self.log = self.WriteLog("occupancy.log", 5000, evict_rate=0.3, hold_rate=0.1)
+
+    def Summaries(self, analyzer, interval):
+        analyzer.submissions = {'Submissions': {}, 'Terminations': {}}
+        series = analyzer.SummarizeSites(interval)
+        return (series, analyzer.submissions)
+
+    def testBinningMatchesLoop(self):
+        analyzer = Analyzer()
+        analyzer.changes = {}
+        analyzer.ParseFile(self.log)
+        for interval in (60, 300, 420, 3600):
+            expected = LoopSummarizeSites(copy.deepcopy(analyzer.changes), interval, analyzer.min_time)
+            self.assertEqual(self.Summaries(analyzer, interval), expected)
+
+    def testSplitMergeMatchesParse(self):
+        # Cut the log into many pieces, jobs continue across the cuts
+        expected = Analyzer()
+        expected.ParseFile(self.log)
+        saved = ParseLog.split_size
+        ParseLog.split_size = 16 * 1024
+        try:
+            analyzer = Analyzer()
+            analyzer.ParseFiles([self.log], 4)
+        finally:
+            ParseLog.split_size = saved
+
+        self.assertEqual(analyzer.num_events, expected.num_events)
+        self.assertEqual(dict([(jobid, job.events) for jobid, job in analyzer.jobs.items()]),
+                         dict([(jobid, job.events) for jobid, job in expected.jobs.items()]))
+        self.assertEqual(analyzer.Summary(analyzer.GetMetrics()), expected.Summary(expected.GetMetrics()))
+        self.assertEqual(analyzer.SiteSummaries(analyzer.GetMetrics()), expected.SiteSummaries(expected.GetMetrics()))
+        self.assertEqual(analyzer.Quantiles(analyzer.GetDistributions()), expected.Quantiles(expected.GetDistributions()))
+        for interval in (60, 300):
+            self.assertEqual(self.Summaries(analyzer, interval), self.Summaries(expected, interval))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import signal
+import subprocess
+
+from common import LogTestCase, unittest
+
+from Profile import Profiler
+
+
+def Spin(count):
+    total = 0
+    for i in xrange(count):
+        total += i * i
+    return total
+
+
+class ProfileTest(LogTestCase):
+
+    def testSampledFunctions(self):
+        profiler = Profiler(5)
+        profiler.Start('spin')
+        Spin(3000000)
+        # A system call interrupted by a sample is restarted
+        subprocess.call(["sleep", "0.1"])
+        profiler.Stop('spin')
+        self.assertEqual(signal.getsignal(signal.SIGPROF), signal.SIG_DFL)
+        self.assertEqual(signal.getitimer(signal.ITIMER_PROF), (0.0, 0.0))
+
+        functions = profiler.HotFunctions()
+        self.assertTrue(profiler.profile.samples > 0)
+        self.assertEqual(functions[0]['function'], "test_profile.py:%i(Spin)" % Spin.func_code.co_firstlineno)
+        for function in functions:
+            self.assertTrue(function['time'] <= function['cumulative'])
+        self.assertEqual(profiler.stages[0]['stage'], 'spin')
+
+    def testPeakMemoryGrowth(self):
+        profiler = Profiler()
+        size = 64 * 1024 * 1024
+        profiler.Start('allocate')
+        buf = "x" * size
+        profiler.Stop('allocate')
+        del buf
+        # Below the peak of the stage before
+        profiler.Start('reuse')
+        buf = "x" * (size / 2)
+        profiler.Stop('reuse')
+        del buf
+        (allocate, reuse) = profiler.stages
+        self.assertTrue(allocate['peak_memory_growth'] >= size / 2)
+        self.assertEqual(reuse['peak_memory_growth'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import random
+
+import numpy
+
+from common import unittest
+
+from Quantiles import QuantileSketch
+
+
+class QuantileTest(unittest.TestCase):
+
+    def testWithinAccuracyOfPercentile(self):
+        rand = random.Random(1)
+        # Durations from seconds to weeks, some zero
+        values = [int(rand.lognormvariate(8, 2)) for i in range(20000)] + [0] * 500
+        for accuracy in (0.01, 0.05):
+            added = QuantileSketch(accuracy)
+            for value in values:
+                added.Add(value)
+            bulk = QuantileSketch(accuracy)
+            bulk.AddValues(numpy.array(values, dtype=numpy.int64))
+            self.assertEqual((bulk.buckets, bulk.zeros, bulk.count, bulk.max), (added.buckets, added.zeros, added.count, added.max))
+            for q in (0.01, 0.1, 0.5, 0.9, 0.99, 0.999, 1.0):
+                # The value at rank q * (count - 1), as Quantile counts
+                exact = numpy.percentile(values, q * 100, interpolation='lower')
+                self.assertTrue(abs(added.Quantile(q) - exact) <= accuracy * exact, (accuracy, q, added.Quantile(q), exact))
+
+    def testRemove(self):
+        sketch = QuantileSketch()
+        for value in (0, 10, 100, 1000):
+            sketch.Add(value)
+        sketch.Remove(100)
+        sketch.Remove(0)
+        expected = QuantileSketch()
+        for value in (10, 1000):
+            expected.Add(value)
+        self.assertEqual((sketch.buckets, sketch.zeros, sketch.count, sketch.max), (expected.buckets, expected.zeros, expected.count, expected.max))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+
+from common import LogTestCase, unittest
+
+from Occupancy import Occupancy, Rollup, ChangeCells, rollup_levels
+from ParseLog import Analyzer
+from test_occupancy import LoopSummarizeSites
+
+
+class RollupTest(LogTestCase):
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+        self.log = self.WriteLog("rollup.log", 5000, evict_rate=0.3, hold_rate=0.1)
+
+    def assertSameOccupancy(self, analyzer, interval):
+        rolled = analyzer.GetOccupancy(interval)
+        direct = Occupancy(Rollup(ChangeCells(analyzer.changes, interval)), interval)
+        # The direct cells see the sites in another order
+        for occupancy in (rolled, direct):
+            occupancy.rows = dict([(name, (occupancy.maxima[row].tolist(), int(occupancy.lengths[row]), int(occupancy.leading[row])))
+                                   for row, name in enumerate(occupancy.names)])
+        self.assertEqual(rolled.rows, direct.rows)
+        self.assertEqual(rolled.submissions, direct.submissions)
+        expected = LoopSummarizeSites(analyzer.changes, interval, analyzer.min_time)
+        self.assertEqual((rolled.SiteSeries(analyzer.min_time), rolled.submissions), expected)
+
+    def testLevelsMatchDirectBinning(self):
+        analyzer = Analyzer()
+        analyzer.changes = {}
+        analyzer.ParseFile(self.log)
+        # The last level is longer than the whole workflow
+        for interval in rollup_levels + (2 * rollup_levels[0], 7 * rollup_levels[0]):
+            self.assertSameOccupancy(analyzer, interval)
+        self.assertTrue(analyzer.rollup.levels.has_key(rollup_levels[1]))
+
+    def testCellsDropTheChanges(self):
+        # The cells only grow with the busy minutes of the sites
+        analyzer = Analyzer()
+        analyzer.ParseFile(self.log)
+        self.assertEqual(analyzer.changes, None)
+        cells = sum([len(columns) for (columns, ups, downs, peaks) in analyzer.cells.cells])
+        minutes = (analyzer.max_time - analyzer.min_time) / rollup_levels[0] + 1
+        self.assertTrue(cells <= len(analyzer.cells.names) * minutes)
+        self.assertTrue(cells < analyzer.cells.version)
+
+    def testIntervalOffTheCells(self):
+        analyzer = Analyzer()
+        analyzer.ParseFile(self.log)
+        self.assertRaises(Exception, analyzer.GetOccupancy, 90)
+
+    def testSparseCells(self):
+        # Two sites busy a month apart keep a handful of cells, not a row
+        # of 40000 minutes each
+        sites = {'a': [(0, 1), (100, 1), (200, -1)],
+                 'b': [(50, 1), (30 * 86400, -1), (30 * 86400 + 10, 1), (30 * 86400 + 90, -1)]}
+        rollup = Rollup(ChangeCells(sites, 60))
+        self.assertEqual(len(rollup.cell_max), 5)
+        occupancy = rollup.Level(3600)
+        self.assertEqual(occupancy.maxima.shape, (2, 720))
+        self.assertEqual((occupancy.SiteSeries(0), occupancy.submissions), LoopSummarizeSites(sites, 3600, 0))
+
+    def testRollupFollowsNewEvents(self):
+        text = open(self.log).read()
+        cut = text.index("...\n", len(text) / 2) + 4
+        growing = os.path.join(self.directory, "growing.log")
+        analyzer = Analyzer(streaming=True)
+        analyzer.changes = {}
+        tails = {}
+        open(growing, 'w').write(text[:cut])
+        analyzer.Poll([growing], tails)
+        self.assertSameOccupancy(analyzer, 300)
+        open(growing, 'a').write(text[cut:])
+        analyzer.Poll([growing], tails)
+        self.assertSameOccupancy(analyzer, 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
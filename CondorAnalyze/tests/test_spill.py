@@ -0,0 +1,96 @@
+import os
+
+from common import LogTestCase, unittest
+
+import ParseLog
+from JobSpill import JobSpill
+from ParseLog import Analyzer, RetiringJob
+
+
+class SpillTest(LogTestCase):
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+        self.log = self.WriteLog("spill.log", 3000)
+        self.saved = (ParseLog.CurrentRSS, ParseLog.memory_check_interval, RetiringJob.Flush)
+        self.rss = 0
+        self.flushed = []
+        def Flush(job):
+            self.flushed.append(len(job.events))
+            self.saved[2](job)
+        ParseLog.CurrentRSS = lambda: self.rss
+        ParseLog.memory_check_interval = 100
+        RetiringJob.Flush = Flush
+
+    def tearDown(self):
+        (ParseLog.CurrentRSS, ParseLog.memory_check_interval, RetiringJob.Flush) = self.saved
+        LogTestCase.tearDown(self)
+
+    def Analyzer(self):
+        return Analyzer(spill=JobSpill(os.path.join(self.directory, "spill")), memory_limit=1000)
+
+    def testMatchesUnbounded(self):
+        expected = Analyzer()
+        expected.ParseFile(self.log)
+        self.rss = 2000
+        analyzer = self.Analyzer()
+        analyzer.ParseFile(self.log)
+        self.assertEqual(analyzer.Summary(analyzer.GetMetrics()), expected.Summary(expected.GetMetrics()))
+
+    def testHistoriesFromFile(self):
+        expected = Analyzer()
+        expected.ParseFile(self.log)
+        self.rss = 2000
+        analyzer = self.Analyzer()
+        analyzer.ParseFile(self.log)
+        # Nothing of the retired jobs is left in memory
+        self.assertTrue(len(analyzer.jobs) < len(expected.jobs))
+        self.assertFalse(hasattr(analyzer.spill, 'index'))
+        histories = dict(analyzer.JobHistories())
+        self.assertEqual(histories, dict([(jobid, job.events) for jobid, job in expected.jobs.items()]))
+
+        jobid = analyzer.spill.Histories().next()[0]
+        self.assertEqual(analyzer.GetJob(jobid).events, expected.jobs[jobid].events)
+        analyzer.spill.file.flush()
+        reopened = JobSpill(analyzer.spill.path, 'r')
+        try:
+            self.assertEqual(reopened.Read(jobid), expected.jobs[jobid].events)
+        finally:
+            reopened.Close()
+
+    def testFlushHysteresis(self):
+        analyzer = self.Analyzer()
+        analyzer.ParseFile(self.log)
+
+        # Only the jobs with enough events in memory are flushed
+        self.rss = 2000
+        analyzer.CheckMemory()
+        self.assertTrue(self.flushed)
+        self.assertTrue(min(self.flushed) >= ParseLog.memory_flush_events)
+
+        # Staying above the limit without growing does not flush again
+        del self.flushed[:]
+        analyzer.CheckMemory()
+        self.assertEqual(self.flushed, [])
+
+        # Growing past the margin does
+        self.rss = 2000 * (1 + ParseLog.memory_flush_growth) + 1
+        for job in analyzer.jobs.values():
+            job.events.extend([job.events and job.events[-1] or (0, 0, None)] * ParseLog.memory_flush_events)
+        analyzer.CheckMemory()
+        self.assertTrue(self.flushed)
+
+        # Back under the limit, the next time above it flushes at once
+        del self.flushed[:]
+        self.rss = 500
+        analyzer.CheckMemory()
+        self.assertEqual(analyzer.flush_above, 1000)
+        for job in analyzer.jobs.values():
+            job.events.extend([(0, 0, None)] * ParseLog.memory_flush_events)
+        self.rss = 1001
+        analyzer.CheckMemory()
+        self.assertTrue(self.flushed)
+
+
+if __name__ == "__main__":
+    unittest.main()
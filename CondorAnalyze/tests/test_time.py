@@ -0,0 +1,65 @@
+import os
+import time
+
+from common import unittest
+
+import CondorTime
+from CondorTime import EpochTime, ClassicEpochTime
+
+
+class TimeTest(unittest.TestCase):
+
+    def setUp(self):
+        # A zone with daylight saving time, the cached day and minute
+        # starts only hold for the zone they were computed in
+        self.zone = os.environ.get('TZ')
+        os.environ['TZ'] = 'America/Chicago'
+        time.tzset()
+        CondorTime.day_start.clear()
+        CondorTime.minute_start.clear()
+        if not time.daylight:
+            self.tearDown()
+            self.skipTest("no time zone data for America/Chicago")
+
+    def tearDown(self):
+        if self.zone is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = self.zone
+        time.tzset()
+        CondorTime.day_start.clear()
+        CondorTime.minute_start.clear()
+
+    def assertSameTimes(self, first, last, step):
+        """
+        Compare EpochTime and ClassicEpochTime to mktime(strptime()) for the
+        stamps from 'first' to 'last' ("YYYY-MM-DD HH:MM:SS") every 'step'
+        seconds, twice to also go through the cached minutes.
+        """
+        start = int(time.mktime(time.strptime(first, "%Y-%m-%d %H:%M:%S")))
+        end = int(time.mktime(time.strptime(last, "%Y-%m-%d %H:%M:%S")))
+        for repeat in range(2):
+            for when in range(start, end, step):
+                t = time.localtime(when)
+                stamp = time.strftime('"%Y-%m-%dT%H:%M:%S"', t)
+                expected = int(time.mktime(time.strptime(stamp, '"%Y-%m-%dT%H:%M:%S"')))
+                self.assertEqual(EpochTime(stamp), expected, stamp)
+                clock = time.strftime("%H:%M:%S", t)
+                self.assertEqual(ClassicEpochTime(t[0], t[1], t[2], clock), expected, stamp)
+
+    def testSpringForward(self):
+        self.assertSameTimes("2011-03-12 22:00:00", "2011-03-14 02:00:00", 7)
+
+    def testFallBack(self):
+        self.assertSameTimes("2011-11-05 22:00:00", "2011-11-07 02:00:00", 7)
+
+    def testNewYear(self):
+        self.assertSameTimes("2011-12-31 22:00:00", "2012-01-01 02:00:00", 7)
+
+    def testMalformedStamp(self):
+        self.assertRaises(ValueError, EpochTime, '"2011-13-01T00:00:00"')
+        self.assertRaises(ValueError, EpochTime, '"2011-06-14T02:29"')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import mmap
+
+from common import LogTestCase, unittest
+
+import UserLogReader
+from UserLogReader import ReadBlocks, ReadDecoded, SeekTime, WindowRange
+
+
+class WindowTest(LogTestCase):
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+        self.log = self.WriteLog("g.log", 3000)
+        self.events = list(ReadDecoded(self.log))
+        self.times = [event[1] for event in self.events]
+        # Search down to a few blocks, so the bisection lands inside blocks
+        # and separator lines many times
+        self.granularity = UserLogReader.seek_granularity
+        UserLogReader.seek_granularity = 512
+
+    def tearDown(self):
+        UserLogReader.seek_granularity = self.granularity
+        LogTestCase.tearDown(self)
+
+    def InWindow(self, start, end):
+        """
+        Return the events of the log in [start, end] read through the
+        WindowRange of the window, and all the events in it.
+        """
+        (first, last) = WindowRange(self.log, start, end)
+        read = [event for event in ReadDecoded(self.log, first, last) if start <= event[1] <= end]
+        expected = [event for event in self.events if start <= event[1] <= end]
+        return read, expected
+
+    def testWindowBeforeAndAfterTheLog(self):
+        self.assertEqual(WindowRange(self.log, self.times[0] - 3600, self.times[-1] + 3600), (0, None))
+        self.assertEqual(WindowRange(self.log, self.times[0], self.times[-1]), (0, None))
+        self.assertEqual(WindowRange(self.log, None, None), (0, None))
+        (first, last) = WindowRange(self.log, self.times[-1] + 1, None)
+        self.assertTrue(first > 0)
+        self.assertEqual(last, None)
+        (first, last) = WindowRange(self.log, None, self.times[0] - 1)
+        self.assertEqual(last, 0)
+
+    def testEventsAtTheBoundaries(self):
+        # Windows starting and ending exactly at an event time, including
+        # times shared by several events
+        for index in (1, 17, 500, 1234, len(self.times) / 2, len(self.times) - 2):
+            for other in (index, index + 1, index + 40, index + 1000):
+                other = min(other, len(self.times) - 1)
+                start = self.times[index]
+                end = self.times[other]
+                read, expected = self.InWindow(start, end)
+                self.assertEqual(read, expected)
+                self.assertEqual(read[0][1], start)
+                self.assertEqual(read[-1][1], end)
+
+    def testSeekLandsBeforeTheFirstEvent(self):
+        f = open(self.log)
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                offsets = [0] + [end for block, end in ReadBlocks(buf)]
+                for index in range(0, len(self.times), 97):
+                    when = self.times[index]
+                    pos = SeekTime(buf, when)
+                    # A block start, and every event of 'when' after it
+                    self.assertTrue(pos in offsets)
+                    before = [event[1] for event in ReadDecoded(self.log, 0, pos)]
+                    self.assertTrue(not before or max(before) < when)
+                    self.assertTrue(len(buf[pos:offsets[self.times.index(when)]]) <= 2 * UserLogReader.seek_granularity)
+            finally:
+                buf.close()
+        finally:
+            f.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
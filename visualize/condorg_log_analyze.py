@@ -21,6 +21,7 @@
 #   shex        http://abitibi.sbgrid.org/devel/projects/shex/shex
 #   matplotlib  http://matplotlib.sourceforge.net/
 
+import os
 import sys
 import re
 import matplotlib
@@ -32,6 +33,11 @@ from   matplotlib.pylab  import *
 
 from   shex              import *
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CondorAnalyze"))
+from   CondorTime        import EpochTime
+from   EventCache        import EventCache
+from   UserLogReader     import ReadDecoded
+
 width_in    = 100
 height_in   = 100
 
@@ -157,14 +163,14 @@ def SetSubplot(figure):
 def getTime(ts):
     #12/16 12:32:17
     # EventTime = "2011-06-14T02:29:31"
-    t = strptime(ts, "\"%Y-%m-%dT%H:%M:%S\"")
-    return mktime(t)/3600
+    return EpochTime(ts)/3600.0
 
 jobs = []
 def setEvent(event, time, jobid, site = ""):
+    placeEvent(event, getTime(time), jobid, site)
+
+def placeEvent(event, ts, jobid, site = ""):
     global jobs
-    ts = getTime(time)
-    
 
     if (event != 'local_submit') and (event != 'start'):
         try:
@@ -230,80 +236,45 @@ def setEvent(event, time, jobid, site = ""):
 
     jobslastevent[jobid] = (ts, fmt, figure, yoffset)
 
-def proc_log( log_fp):
-    job_event = {}
-    
-    local_submit = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job submitted from host")
-    grid_submit = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job submitted to Globus") #\s*GridResource: gt2 ([\w|\-|\/|\.]+)")
-    grid_site = re.compile("\s+GridResource: gt2 ([\w|\-|\/|\.]+)")
-    start = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job executing on host")
-    hold = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job was held")
-    release = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job was released")
-    evict = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job was evicted")
-    terminate = re.compile("\((\d+\.\d+).*\)\s+(.*)\s+Job terminated")
-    log_fh = open(log_fp)
-    print "opened %s" % log_fp
-    start_index = 0
-    done = False
-    id = ""
-    re_grid = ""
-    for line in log_fh:
-        if "..." in line:
-            # Do stuff, end of event
-            if job_event.has_key("MyType"):
-               if job_event["MyType"] == "\"ExecuteEvent\"":
-                   setEvent('start', job_event["EventTime"], ".".join([job_event["Cluster"], job_event["Proc"]]) , job_event["GLIDEIN_GatekeeperB"]) 
-               elif job_event["MyType"] == "\"JobTerminatedEvent\"":
-                   setEvent('terminate', job_event["EventTime"], ".".join([job_event["Cluster"], job_event["Proc"]]), job_event["GLIDEIN_GatekeeperB"])
-               elif job_event["MyType"] == "\"JobEvictedEvent\"" or job_event["MyType"] == "\"JobReconnectFailedEvent\"":
-                   setEvent('evict', job_event["EventTime"], ".".join([job_event["Cluster"], job_event["Proc"]]))
-
-
-            job_event = {}
+# Set CONDOR_LOG_CACHE to a directory to cache the decoded events of the logs
+cache = None
+if os.environ.get("CONDOR_LOG_CACHE"):
+    cache = EventCache(os.environ["CONDOR_LOG_CACHE"])
+
+# MyType of a decoded event -> the event placeEvent draws, the same for
+# every log format and whether or not the events come from the cache
+decoded_events = { "\"GridSubmitEvent\"": 'grid_submit',
+                   "\"ExecuteEvent\"": 'start',
+                   "\"JobHeldEvent\"": 'hold',
+                   "\"JobReleaseEvent\"": 'release',
+                   "\"JobTerminatedEvent\"": 'terminate',
+                   "\"JobEvictedEvent\"": 'evict',
+                   "\"JobReconnectFailedEvent\"": 'evict' }
+
+def decoded_lifeline(events):
+    """
+    Yield the (event, hours, jobid, site) placeEvent draws for the decoded
+    'events' of a log.  A classic log only names the site in the
+    GridSubmitEvent, the events after it are drawn at that site.
+    """
+    grid_sites = {}
+    for (mytype, time, jobid, site) in events:
+        if not decoded_events.has_key(mytype):
             continue
-        
-        # Else read in the event
-        try:
-            job_event[line.split('=')[0].strip()] = line.split('=')[1].strip()
-        except:
-            pass
-        continue
-
+        if mytype == "\"GridSubmitEvent\"":
+            grid_sites[jobid] = site
+        elif site is None:
+            site = grid_sites.get(jobid)
+        yield (decoded_events[mytype], time/3600.0, jobid, site)
 
-        #self.setstate("host_submit_ts", "\(%s\..*\)\s+(.*)\s+Job submitted from host"   % self.jobid, line)
-        #self.setstate("grid_submit_ts", "\(%s\..*\)\s+(.*)\s+Job submitted to Globus"   % self.jobid, line)
-        #self.setstate("exec_ts",        "\(%s\..*\)\s+(.*)\s+Job executing on host"     % self.jobid, line)
-        #self.setstate("finish_ts",      "\(%s\..*\)\s+(.*)\s+Job terminated"            % self.jobid, line)
-        #self.setstate("remotehost",     "\(%s\..*\).*Job executing on host:\s+(.*)\s*"  % self.jobid, line)
-
-#        local_submit.search("\(%s\..*\)\s+(.*)\s+Job submitted from host"   % self.jobid, line)
-#        self.getevent("grid_submit",    "\(%s\..*\)\s+(.*)\s+Job submitted to Globus"   % self.jobid, line)
-#        self.getevent("start",          "\(%s\..*\)\s+(.*)\s+Job executing on host"     % self.jobid, line)
-#        self.getevent("hold",           "\(%s\..*\)\s+(.*)\s+Job was held"              % self.jobid, line)
-#        self.getevent("release",        "\(%s\..*\)\s+(.*)\s+Job was released"          % self.jobid, line)
-#        self.getevent("evict",          "\(%s\..*\)\s+(.*)\s+Job was evicted"           % self.jobid, line)
-#        self.getevent("terminate",      "\(%s\..*\)\s+(.*)\s+Job terminated"            % self.jobid, line)
-        if local_submit.search(line):
-            setEvent("local_submit", local_submit.search(line))
-        elif grid_submit.search(line):
-#            print "Grid Submit"
-            re_grid = grid_submit.search(line)
-        elif grid_site.search(line):
-            setEvent("grid_submit", re_grid, grid_site.search(line).group(1))
-#            setEvent("grid_site", grid_site.search(line))
-
-        elif start.search(line):
-            setEvent("start", start.search(line))
-        elif hold.search(line):
-            setEvent("hold", hold.search(line))
-        elif release.search(line):
-            setEvent("release", release.search(line))
-        elif evict.search(line):
-            setEvent("evict", evict.search(line))
-        elif terminate.search(line):
-            setEvent("terminate", terminate.search(line))
-
-    del log_fh
+def proc_log( log_fp):
+    if cache is not None:
+        events = cache.Events(log_fp)
+    else:
+        events = ReadDecoded(log_fp)
+    print "opened %s" % log_fp
+    for (event, hours, jobid, site) in decoded_lifeline(events):
+        placeEvent(event, hours, jobid, site)
 
 targethost  = None
 jobid       = None
@@ -324,8 +295,6 @@ for log_fp in sys.argv[1:]:
         continue
     done = False
     searchIndex = 0
-    fileContents = open(log_fp).read()
-    #print fileContents
 #    start_job = re.compile(".*\((\d+)\.(\d+).*submitted from")
     proc_log(log_fp)
 #    fig.canvas.draw()